@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# Single entry point for every stage: python -m src [--set NAME=VALUE ...] <command> [options]
+
+import os
+import sys
+import types
+import argparse
+import builtins
+import importlib.util
+
+# Command -> (module under src, description). Modules are only imported when
+# their command runs, so listing commands or showing the config stays cheap
+COMMANDS = {
+    "config": (None, "Show the configuration, with any --set overrides applied"),
+    "pipeline": ("pipeline", "Run the stages whose inputs or parameters changed"),
+    "ingest": ("ingest", "Fetch new Hacker News stories and append them to the corpus"),
+    "download-text8": ("download.download_text8", "Download and extract the text8 dataset"),
+    "download-hacker-news": ("download.download_hacker_news", "Extract Hacker News stories to CSV or Parquet"),
+    "titles": ("download.get_hacker_news_titles", "Extract and clean Hacker News titles"),
+    "dedup": ("dedup", "Count the duplicate titles in the Hacker News dump"),
+    "tokenise": ("tokeniser", "Combine and tokenize the datasets"),
+    "vocab": ("vocab", "Convert between vocab.json and the binary vocabulary"),
+    "token-ids": ("token_ids", "Show the header and first ids of the token-id corpus"),
+    "sampling": ("sampling", "Build the sampling tables from the binary vocabulary"),
+    "title-dataset": ("title_dataset", "Build the CSR title dataset and pool title embeddings"),
+    "title-shards": ("title_shards", "Write the title dataset as shuffle-ready shards"),
+    "batches": ("batches", "Benchmark the skip-gram, CBOW and title batch generators"),
+    "train": ("train", "Train word2vec embeddings on the token-id corpus"),
+    "embeddings": ("embeddings", "Export and inspect the memory-mapped embeddings"),
+    "similar": ("embedding_index", "Query the trained embeddings"),
+    "score-model": ("score_model", "Fit the title score regressor"),
+    "serve": ("serve", "Serve Hacker News score predictions over HTTP"),
+    "load-test": ("load_test", "Load-test the score service"),
+    "explore": ("explore.corpus_stats", "Display statistics of any text file"),
+    "explore-text8": ("explore.explore_text8", "Explore the text8 dataset"),
+    "explore-titles": ("explore.explore_hacker_news_titles", "Explore the Hacker News titles"),
+    "explore-combined": ("explore.explore_combined_data", "Explore the combined dataset"),
+    "report": ("instrumentation", "Summarise a run from the JSON lines run report"),
+    "benchmark": ("benchmarks", "Benchmark the pipeline stages on synthetic corpora"),
+    "check-extraction": ("download.fake_hacker_news_db", "Check the extractor against a synthetic database"),
+    "check-download": ("download.fake_text8_server", "Check the text8 downloader against a flaky local server"),
+    "check-ingest": ("ingest_check", "Check incremental ingestion against a full rebuild"),
+    "check-imports": ("import_check", "Check that cheap commands start fast and skip heavy imports"),
+}
+
+def parse_overrides(assignments):
+    """NAME=VALUE strings as a dict."""
+    overrides = {}
+    for assignment in assignments:
+        name, sep, value = assignment.partition("=")
+        if not sep:
+            raise ValueError(f"Expected NAME=VALUE, got {assignment!r}")
+        overrides[name.strip()] = value
+    return overrides
+
+def run_as_main(module_name):
+    """Run a module as __main__, as runpy.run_module(alter_sys=True) does, but keeping sys.argv[0].
+    
+    runpy would set sys.argv[0] to the module's file, so argparse would
+    show that rather than the python -m src command in usage messages.
+    """
+    spec = importlib.util.find_spec(module_name)
+    main_module = types.ModuleType("__main__")
+    main_module.__dict__.update(__file__=spec.origin, __spec__=spec, __loader__=spec.loader,
+                                __package__=spec.parent, __builtins__=builtins)
+    # Registered like runpy's temporary module, so worker processes can pickle its functions
+    sys.modules["__main__"] = main_module
+    exec(spec.loader.get_code(module_name), main_module.__dict__)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m src", description="Run a pipeline stage or tool",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<22}{description}"
+                                        for name, (_, description) in COMMANDS.items()))
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override a setting for this invocation (repeatable)")
+    parser.add_argument("command", choices=COMMANDS, metavar="command", help="One of the commands below")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Options passed to the command")
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        parser.print_help()
+        return
+    args = parser.parse_args(argv)
+    
+    # The environment is the only override mechanism, as settings are bound
+    # when src.config is first imported: overrides are set before that
+    # import, so the command's modules and any worker processes they start
+    # all load the same settings
+    try:
+        overrides = parse_overrides(args.set)
+        os.environ.update(overrides)
+        from src.config import CONFIG, check_overrides
+        check_overrides(overrides)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    module, _ = COMMANDS[args.command]
+    if module is None:
+        for name, value in CONFIG.as_dict().items():
+            print(f"{name}: {value}")
+        return
+    
+    sys.argv = [f"python -m src {args.command}", *args.args]
+    run_as_main(f"src.{module}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# Streaming skip-gram and CBOW batches over the binary token-id corpus, and title batches over the title shards
+
+import time
+import argparse
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, DataLoader, get_worker_info
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        TOKEN_IDS_PATH, SAMPLING_TABLES_PATH, WINDOW_SIZE, TRAIN_BATCH_SIZE,
+        BATCH_BLOCK_TOKENS, LOADER_WORKERS, TITLE_SHARDS_DIR, TITLE_BATCH_SIZE, SHUFFLE_BUFFER_TITLES
+    )
+    from src.token_ids import load_token_ids, read_token_ids_header
+    from src.sampling import load_sampling_tables
+    from src.title_shards import iter_title_batches
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        TOKEN_IDS_PATH, SAMPLING_TABLES_PATH, WINDOW_SIZE, TRAIN_BATCH_SIZE,
+        BATCH_BLOCK_TOKENS, LOADER_WORKERS, TITLE_SHARDS_DIR, TITLE_BATCH_SIZE, SHUFFLE_BUFFER_TITLES
+    )
+    from token_ids import load_token_ids, read_token_ids_header
+    from sampling import load_sampling_tables
+    from title_shards import iter_title_batches
+
+def window_pairs(ids, start, stop, window, rng):
+    """Skip-gram (center, context) pairs for the centers ids[start:stop].
+    
+    Each center gets its own window size drawn from 1..window, as in
+    word2vec, so nearer words are paired more often. Contexts may come from
+    anywhere in ids.
+    """
+    centers = np.arange(start, stop)
+    reach = rng.integers(1, window + 1, size=len(centers))
+    center_parts, context_parts = [], []
+    for distance in range(1, window + 1):
+        for offset in (-distance, distance):
+            context = centers + offset
+            mask = (reach >= distance) & (context >= 0) & (context < len(ids))
+            center_parts.append(ids[centers[mask]])
+            context_parts.append(ids[context[mask]])
+    return np.concatenate(center_parts), np.concatenate(context_parts)
+
+def window_contexts(ids, start, stop, window, rng, pad_id):
+    """CBOW (contexts, target) rows for the targets ids[start:stop].
+    
+    contexts has 2 * window columns; positions outside the drawn window or
+    the corpus hold pad_id.
+    """
+    targets = np.arange(start, stop)
+    reach = rng.integers(1, window + 1, size=len(targets))
+    offsets = np.concatenate([np.arange(-window, 0), np.arange(1, window + 1)])
+    positions = targets[:, None] + offsets[None, :]
+    mask = (np.abs(offsets)[None, :] <= reach[:, None]) & (positions >= 0) & (positions < len(ids))
+    contexts = np.where(mask, ids[np.clip(positions, 0, max(len(ids) - 1, 0))], pad_id)
+    return contexts, ids[targets]
+
+class Word2VecDataset(IterableDataset):
+    """Batches of skip-gram pairs or CBOW windows read from tokens.bin.
+    
+    The corpus is memory-mapped and read in blocks of block_tokens. Each
+    block is subsampled, its windows extracted and shuffled, and batches cut
+    from it, so memory stays flat however large the corpus is. With several
+    DataLoader workers, or with rank and world_size set by separate training
+    processes, each reads its own contiguous slice of the corpus; only
+    windows spanning two slices are lost. start_fraction skips that share of
+    each slice, to resume part way through an epoch. Use
+    DataLoader(batch_size=None) since the dataset yields whole batches.
+    
+    Skip-gram batches are (centers, contexts) and CBOW batches are
+    (contexts of shape (batch, 2 * window), targets), as int64 tensors.
+    """
+    
+    def __init__(self, path=TOKEN_IDS_PATH, sampling_path=SAMPLING_TABLES_PATH, mode="skipgram",
+                 window=WINDOW_SIZE, batch_size=TRAIN_BATCH_SIZE, block_tokens=BATCH_BLOCK_TOKENS,
+                 subsample=True, seed=0, rank=0, world_size=1, start_fraction=0.0):
+        if mode not in ("skipgram", "cbow"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.path = path
+        self.sampling_path = sampling_path
+        self.mode = mode
+        self.window = window
+        self.batch_size = batch_size
+        self.block_tokens = block_tokens
+        self.subsample = subsample
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.start_fraction = start_fraction
+        self.epoch = 0
+        self.tokens_read = 0  # corpus tokens read by this process in the current pass
+        
+        header = read_token_ids_header(path)
+        self.num_tokens = header["num_tokens"]
+        self.unk_id = header["unk_id"]
+    
+    def set_epoch(self, epoch):
+        """Draw different subsamples, windows and shuffles in each epoch."""
+        self.epoch = epoch
+    
+    def _blocks(self, start, stop, keep, rng):
+        """Yield (ids, first, last): the centers are ids[first:last], the rest context."""
+        ids_file = load_token_ids(self.path)
+        window = self.window
+        carry = np.zeros(0, dtype=np.int64)
+        pending = 0  # tokens at the end of carry not yet used as centers
+        
+        for block_start in range(start, stop, self.block_tokens):
+            block = np.asarray(ids_file[block_start:min(block_start + self.block_tokens, stop)], dtype=np.int64)
+            self.tokens_read += len(block)
+            # Out-of-vocabulary tokens are removed before windowing, as in word2vec
+            block = block[block != self.unk_id]
+            if keep is not None:
+                block = block[rng.random(len(block)) < keep[block]]
+            
+            ids = np.concatenate([carry, block])
+            first = len(carry) - pending
+            last = max(len(ids) - window, first)
+            if last > first:
+                yield ids, first, last
+            
+            # Keep the last centers' right context and the next centers' left context
+            carry = ids[max(last - window, 0):]
+            pending = len(ids) - last
+        
+        if pending:
+            yield carry, len(carry) - pending, len(carry)
+    
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        shard = self.rank * num_workers + worker_id
+        num_shards = self.world_size * num_workers
+        start = self.num_tokens * shard // num_shards
+        stop = self.num_tokens * (shard + 1) // num_shards
+        start += int((stop - start) * self.start_fraction)
+        self.tokens_read = 0
+        
+        rng = np.random.default_rng([self.seed, self.epoch, shard])
+        keep = load_sampling_tables(self.sampling_path).keep if self.subsample else None
+        
+        leftover = None
+        for ids, first, last in self._blocks(start, stop, keep, rng):
+            if self.mode == "skipgram":
+                columns = window_pairs(ids, first, last, self.window, rng)
+            else:
+                columns = window_contexts(ids, first, last, self.window, rng, self.unk_id)
+            
+            order = rng.permutation(len(columns[1]))
+            columns = [column[order] for column in columns]
+            if leftover is not None:
+                columns = [np.concatenate([old, new]) for old, new in zip(leftover, columns)]
+            
+            num_full = len(columns[1]) // self.batch_size * self.batch_size
+            for batch_start in range(0, num_full, self.batch_size):
+                yield tuple(torch.from_numpy(column[batch_start:batch_start + self.batch_size])
+                            for column in columns)
+            leftover = [column[num_full:] for column in columns]
+        
+        if leftover is not None and len(leftover[1]):
+            yield tuple(torch.from_numpy(column) for column in leftover)
+
+class TitleBatchDataset(IterableDataset):
+    """Shuffled batches of one split of the title shards, for score regression.
+    
+    Each DataLoader worker, and each training process given rank and
+    world_size, reads its own share of the split's shards, which are dealt
+    out afresh every epoch; see iter_title_batches() for the shuffle buffer.
+    Splits with fewer shards than readers leave some readers idle. Batches
+    are dicts of tensors: offsets (num_titles + 1) and ids in CSR form, as
+    for nn.EmbeddingBag(include_last_offset=True), and item_id, score,
+    time, comment_count and user_karma per title. Use
+    DataLoader(batch_size=None) since the dataset yields whole batches.
+    """
+    
+    def __init__(self, directory=TITLE_SHARDS_DIR, split="train", batch_size=TITLE_BATCH_SIZE,
+                 buffer_titles=SHUFFLE_BUFFER_TITLES, shuffle=True, seed=0, rank=0, world_size=1):
+        self.directory = directory
+        self.split = split
+        self.batch_size = batch_size
+        self.buffer_titles = buffer_titles
+        self.shuffle = shuffle
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+    
+    def set_epoch(self, epoch):
+        """Deal out the shards and shuffle the titles differently in each epoch."""
+        self.epoch = epoch
+    
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        for batch in iter_title_batches(self.directory, self.split, self.batch_size, self.buffer_titles,
+                                        self.shuffle, self.seed, self.epoch,
+                                        part=self.rank * num_workers + worker_id,
+                                        num_parts=self.world_size * num_workers):
+            batch["ids"] = batch["ids"].astype(np.int64)
+            yield {name: torch.from_numpy(values) for name, values in batch.items()}
+
+def make_loader(dataset, num_workers=LOADER_WORKERS):
+    """DataLoader over a Word2VecDataset or TitleBatchDataset, which already yield whole batches."""
+    return DataLoader(dataset, batch_size=None, num_workers=num_workers,
+                      persistent_workers=False, pin_memory=torch.cuda.is_available())
+
+def benchmark(mode="skipgram", num_workers=LOADER_WORKERS, max_batches=None, subsample=True):
+    """Report how many training examples per second the loader produces."""
+    dataset = TitleBatchDataset() if mode == "titles" else Word2VecDataset(mode=mode, subsample=subsample)
+    loader = make_loader(dataset, num_workers)
+    
+    examples = batches = 0
+    start = time.time()
+    for batch in loader:
+        examples += len(batch["score"]) if mode == "titles" else len(batch[1])
+        batches += 1
+        if max_batches and batches >= max_batches:
+            break
+    elapsed = time.time() - start
+    
+    name = {"skipgram": "pairs", "cbow": "windows", "titles": "titles"}[mode]
+    print(f"{mode} with {num_workers} workers: {examples:,} {name} in {batches:,} batches, "
+          f"{elapsed:.2f} seconds, {examples / max(elapsed, 1e-9):,.0f} {name}/sec")
+    return examples / max(elapsed, 1e-9)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the skip-gram, CBOW and title batch generators")
+    parser.add_argument("--mode", choices=["skipgram", "cbow", "titles"], default="skipgram",
+                        help="Batches to generate; titles reads the title shards")
+    parser.add_argument("--workers", type=int, default=LOADER_WORKERS, help="DataLoader worker processes")
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches")
+    parser.add_argument("--no-subsample", action="store_true", help="Keep every in-vocabulary token")
+    args = parser.parse_args()
+    
+    benchmark(args.mode, args.workers, args.max_batches, subsample=not args.no_subsample)
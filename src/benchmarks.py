@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# Benchmark every pipeline stage on synthetic corpora and compare against a baseline
+
+import os
+import sys
+import json
+import logging
+import time
+import platform
+import argparse
+import subprocess
+import contextlib
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import BENCHMARK_DIR, BENCHMARK_BASELINE_PATH, BENCHMARK_TOLERANCE
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import BENCHMARK_DIR, BENCHMARK_BASELINE_PATH, BENCHMARK_TOLERANCE
+
+GENERATE_BLOCK_WORDS = 1 << 20
+SIZE_UNITS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+HN_COLUMNS = ["item_id", "type", "title", "score", "time", "url", "text", "author_id", "comment_count",
+              "user_created", "user_karma", "user_about"]
+
+def parse_size(size):
+    """Bytes in a size such as "10MB" or "1.5GB"."""
+    size = size.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * factor)
+    return int(size)
+
+def synthetic_words(num_words, rng, min_length=1, max_length=12):
+    """Distinct lowercase pseudo-words, shorter ones first so Zipf ranks favour them."""
+    lengths = np.sort(rng.integers(min_length, max_length + 1, size=num_words * 2))
+    letters = rng.integers(ord('a'), ord('z') + 1, size=(len(lengths), max_length), dtype=np.uint8)
+    words = [bytes(row[:length]).decode('ascii') for row, length in zip(letters, lengths)]
+    return list(dict.fromkeys(words))[:num_words]
+
+def zipf_ids(rng, num_words, size, exponent=1.1):
+    """Word ranks drawn from a Zipf distribution truncated to the vocabulary."""
+    ids = rng.zipf(exponent, size=size) - 1
+    return ids[ids < num_words]
+
+def generate_text8_like(path, size_bytes, vocab_size=70000, seed=0):
+    """Write a single line of space-separated Zipf-distributed lowercase words, like text8."""
+    rng = np.random.default_rng(seed)
+    words = np.array(synthetic_words(vocab_size, rng), dtype=object)
+    written = 0
+    with open(path, 'w', encoding='ascii') as f:
+        while written < size_bytes:
+            text = " " + " ".join(words[zipf_ids(rng, len(words), GENERATE_BLOCK_WORDS)])
+            text = text[:size_bytes - written]
+            f.write(text)
+            written += len(text)
+    return path
+
+def generate_hn_like(path, size_bytes, vocab_size=30000, seed=0):
+    """Write a CSV with the columns of the Hacker News dump, sized by its bytes on disk.
+    
+    Titles mix case, punctuation, numbers and URLs so clean_title() has work
+    to do; a few are missing, as in the real dump.
+    """
+    import pandas as pd
+    
+    rng = np.random.default_rng(seed)
+    words = np.array(synthetic_words(vocab_size, rng), dtype=object)
+    extras = np.array(["Show HN:", "Ask HN:", "(2023)", "[pdf]", "C++", "v2.0", "–", "https://example.com/x",
+                       "I'm", "don't", "50%", "$1M", "Rust's", "GPT-4", "www.example.org"], dtype=object)
+    rows_per_block = 50000
+    item_id = 0
+    written = 0
+    first = True
+    while written < size_bytes:
+        num_words = rng.integers(2, 14, size=rows_per_block)
+        ids = zipf_ids(rng, len(words), int(num_words.sum()) * 2)[:num_words.sum()]
+        num_words[-1] -= num_words.sum() - len(ids)
+        tokens = words[ids]
+        replace = rng.random(len(tokens)) < 0.08
+        tokens[replace] = extras[rng.integers(0, len(extras), size=replace.sum())]
+        titles = [" ".join(title).capitalize() for title in np.split(tokens, np.cumsum(num_words)[:-1])]
+        
+        block = pd.DataFrame({
+            "item_id": np.arange(item_id + 1, item_id + rows_per_block + 1),
+            "type": "story",
+            "title": [title if keep else None for title, keep in zip(titles, rng.random(rows_per_block) > 0.01)],
+            "score": rng.zipf(1.8, size=rows_per_block),
+            "time": 1160000000 + np.arange(item_id, item_id + rows_per_block) * 60,
+            "url": [f"https://example.com/{i}" for i in range(item_id, item_id + rows_per_block)],
+            "text": None,
+            "author_id": [f"user{i}" for i in rng.integers(0, 100000, size=rows_per_block)],
+            "comment_count": rng.integers(0, 300, size=rows_per_block),
+            "user_created": 1160000000 + rng.integers(0, 10**8, size=rows_per_block),
+            "user_karma": rng.integers(0, 50000, size=rows_per_block),
+            "user_about": None,
+        }, columns=HN_COLUMNS)
+        block.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+        first = False
+        item_id += rows_per_block
+        written = os.path.getsize(path)
+    return path
+
+def workdir_environment(workdir):
+    """Environment pointing every configured path into workdir."""
+    paths = {
+        "DATA_DIR": "", "TEXT8_DATASET_PATH": "text8", "HACKER_NEWS_DATASET_PATH": "hacker_news.csv",
+        "HACKER_NEWS_TITLES_PATH": "hacker_news_titles.txt", "COMBINED_DATASET_PATH": "combined_data.txt",
+        "TOKENS_PATH": "tokens.txt", "VOCAB_PATH": "vocab.json", "VOCAB_BIN_PATH": "vocab.bin",
+        "TOKEN_IDS_PATH": "tokens.bin", "SAMPLING_TABLES_PATH": "sampling.npz",
+        "PIPELINE_MANIFEST_PATH": "pipeline_manifest.json", "RUN_REPORT_PATH": "run_report.jsonl",
+        "HACKER_NEWS_PARQUET_PATH": "hacker_news.parquet", "INGEST_STATE_PATH": "ingest_state.json",
+        "TOKEN_COUNTS_PATH": "token_counts.bin", "CORPUS_IDS_PATH": "corpus_ids.bin",
+        "VOCAB_CHANGES_PATH": "vocab_changes.json", "TITLE_DEDUP_PATH": "title_dedup.npz",
+        "TITLE_SHARDS_DIR": "title_shards", "TOKEN_POSITIONS_DIR": "token_positions",
+    }
+    env = dict(os.environ, HACKER_NEWS_FORMAT="csv")
+    env.update({name: os.path.join(workdir, path) for name, path in paths.items()})
+    return env
+
+# Each stage runs in a fresh child process, so imports see the workdir paths
+# and its peak RSS is its own. A stage returns (bytes processed, items processed).
+
+def stage_clean_title():
+    import pandas as pd
+    from src.config import HACKER_NEWS_DATASET_PATH
+    from src.download.get_hacker_news_titles import clean_title
+    titles = pd.read_csv(HACKER_NEWS_DATASET_PATH, usecols=['title'])['title'].tolist()
+    start = time.perf_counter()
+    cleaned = [clean_title(title) for title in titles]
+    return sum(len(title) for title in titles if isinstance(title, str)), len(cleaned), time.perf_counter() - start
+
+def stage_get_hacker_news_titles():
+    from src.config import HACKER_NEWS_DATASET_PATH
+    from src.download.get_hacker_news_titles import get_hacker_news_titles
+    get_hacker_news_titles()
+    return os.path.getsize(HACKER_NEWS_DATASET_PATH), None
+
+def stage_combine_datasets():
+    from src.tokeniser import combine_datasets
+    combined = combine_datasets()
+    return len(combined), None
+
+def stage_tokenize_and_build_vocab():
+    from src.config import COMBINED_DATASET_PATH
+    from src.tokeniser import tokenize_and_build_vocab
+    with open(COMBINED_DATASET_PATH, 'r', encoding='utf-8') as f:
+        text = f.read()
+    start = time.perf_counter()
+    tokenize_and_build_vocab(text)
+    return len(text), None, time.perf_counter() - start
+
+def stage_tokeniser_streaming():
+    from src.config import TEXT8_DATASET_PATH, HACKER_NEWS_TITLES_PATH
+    from src.tokeniser import tokeniser
+    tokeniser(streaming=True)
+    return os.path.getsize(TEXT8_DATASET_PATH) + os.path.getsize(HACKER_NEWS_TITLES_PATH), None
+
+def stage_explore():
+    from src.config import COMBINED_DATASET_PATH
+    from src.explore.corpus_stats import explore_file
+    explore_file(COMBINED_DATASET_PATH)
+    return os.path.getsize(COMBINED_DATASET_PATH), None
+
+def stage_fetch_data_in_batches():
+    from src.download.fake_hacker_news_db import create_fake_hacker_news_db, get_fake_db_engine
+    from src.download.download_hacker_news import fetch_data_in_batches
+    workdir = os.environ["DATA_DIR"]
+    num_items = int(os.environ["BENCHMARK_DB_ITEMS"])
+    db_path = create_fake_hacker_news_db(os.path.join(workdir, "fake_hacker_news.db"), num_items=num_items)
+    output = os.path.join(workdir, "extracted.csv")
+    for path in (output, output + ".checkpoint.json"):
+        if os.path.exists(path):
+            os.remove(path)
+    start = time.perf_counter()
+    engine = get_fake_db_engine(db_path)
+    fetch_data_in_batches(output, engine=engine, resume=False)
+    engine.dispose()
+    return os.path.getsize(output), num_items, time.perf_counter() - start
+
+STAGES = {
+    "clean_title": stage_clean_title,
+    "get_hacker_news_titles": stage_get_hacker_news_titles,
+    "combine_datasets": stage_combine_datasets,
+    "tokenize_and_build_vocab": stage_tokenize_and_build_vocab,
+    "tokeniser_streaming": stage_tokeniser_streaming,
+    "explore": stage_explore,
+    "fetch_data_in_batches": stage_fetch_data_in_batches,
+}
+
+def peak_rss_kb():
+    """Peak resident set size of this process since exec, in KB.
+    
+    VmHWM is used rather than getrusage's ru_maxrss, which Linux carries over
+    from the forked parent's memory before exec.
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+def run_stage_in_child(name, result_path):
+    """Entry point of the child process: run one stage quietly and write its timings."""
+    logging.disable(logging.INFO)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = STAGES[name]()
+    elapsed = time.perf_counter() - start
+    # Stages that load their input first report only the timed part
+    num_bytes, num_items = result[:2]
+    seconds = result[2] if len(result) > 2 else elapsed
+    with open(result_path, 'w') as f:
+        json.dump({"seconds": seconds, "bytes": num_bytes, "items": num_items, "peak_rss_kb": peak_rss_kb()}, f)
+
+def measure_stage(name, workdir, db_items):
+    """Run a stage in a child process; return wall time, throughput and peak RSS."""
+    result_path = os.path.join(workdir, f"{name}.result.json")
+    env = workdir_environment(workdir)
+    env["BENCHMARK_DB_ITEMS"] = str(db_items)
+    process = subprocess.run([sys.executable, "-m", "src.benchmarks", "--child-stage", name,
+                              "--child-result", result_path], env=env)
+    if process.returncode != 0:
+        raise RuntimeError(f"Stage {name} failed with exit code {process.returncode}")
+    
+    with open(result_path) as f:
+        result = json.load(f)
+    os.remove(result_path)
+    measurement = {
+        "seconds": round(result["seconds"], 4),
+        "mb_per_sec": round(result["bytes"] / 2**20 / max(result["seconds"], 1e-9), 2),
+        "peak_rss_mb": round(result["peak_rss_kb"] / 1024, 1),
+    }
+    if result["items"] is not None:
+        measurement["items_per_sec"] = round(result["items"] / max(result["seconds"], 1e-9), 1)
+    return measurement
+
+def prepare_corpora(workdir, size_bytes, seed=0):
+    """Generate the synthetic text8 and Hacker News inputs, reusing them if already the right size."""
+    os.makedirs(workdir, exist_ok=True)
+    env = workdir_environment(workdir)
+    marker = os.path.join(workdir, "corpora.json")
+    spec = {"size_bytes": size_bytes, "seed": seed}
+    if os.path.exists(marker):
+        with open(marker) as f:
+            if json.load(f) == spec:
+                return
+    start = time.time()
+    generate_text8_like(env["TEXT8_DATASET_PATH"], size_bytes, seed=seed)
+    generate_hn_like(env["HACKER_NEWS_DATASET_PATH"], size_bytes, seed=seed)
+    with open(marker, 'w') as f:
+        json.dump(spec, f)
+    print(f"Generated {size_bytes / 2**20:,.0f} MB text8-like and Hacker News-like corpora "
+          f"in {time.time() - start:.1f} seconds")
+
+def compare_to_baseline(results, baseline, tolerance=BENCHMARK_TOLERANCE):
+    """Regressions where a stage is slower or uses more memory than the baseline allows."""
+    regressions = []
+    if baseline.get("size_bytes") != results["size_bytes"]:
+        print(f"Baseline was measured at {baseline.get('size_bytes')} bytes, not {results['size_bytes']}; "
+              f"not comparing")
+        return regressions
+    for name, measurement in results["stages"].items():
+        reference = baseline["stages"].get(name)
+        if reference is None:
+            continue
+        for metric in ("seconds", "peak_rss_mb"):
+            limit = reference[metric] * (1 + tolerance)
+            status = "REGRESSION" if measurement[metric] > limit else "ok"
+            print(f"  {name:<26} {metric:<12} {measurement[metric]:>10} vs {reference[metric]:>10} {status}")
+            if measurement[metric] > limit:
+                regressions.append((name, metric, measurement[metric], reference[metric]))
+    return regressions
+
+def run_benchmarks(size="10MB", stages=None, db_items=50000, tolerance=BENCHMARK_TOLERANCE,
+                   save_baseline=False, baseline_path=BENCHMARK_BASELINE_PATH, seed=0):
+    """Benchmark the selected stages, write the results as JSON and compare them to the baseline."""
+    size_bytes = parse_size(size)
+    workdir = os.path.join(BENCHMARK_DIR, f"work-{size_bytes}")
+    prepare_corpora(workdir, size_bytes, seed)
+    
+    results = {
+        "size_bytes": size_bytes,
+        "db_items": db_items,
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stages": {},
+    }
+    # Stages run in pipeline order, each reading the previous one's outputs
+    for name in STAGES:
+        if stages and name not in stages:
+            continue
+        measurement = measure_stage(name, workdir, db_items)
+        results["stages"][name] = measurement
+        print(f"{name:<26} {measurement['seconds']:>9.3f} s {measurement['mb_per_sec']:>9.2f} MB/s "
+              f"{measurement['peak_rss_mb']:>9.1f} MB peak RSS")
+    
+    results_path = os.path.join(BENCHMARK_DIR, f"results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {results_path}")
+    
+    if save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return results, []
+    
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+        return results, []
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"Comparing with {baseline_path} (tolerance {tolerance:.0%}):")
+    regressions = compare_to_baseline(results, baseline, tolerance)
+    print(f"{len(regressions)} regression(s)")
+    return results, regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic corpora")
+    parser.add_argument("--size", default="10MB", help="Size of each synthetic corpus, e.g. 10MB or 10GB")
+    parser.add_argument("--stages", nargs="*", help=f"Stages to run: {', '.join(STAGES)} (default: all)")
+    parser.add_argument("--db-items", type=int, default=50000, help="Items in the fake Hacker News database")
+    parser.add_argument("--tolerance", type=float, default=BENCHMARK_TOLERANCE,
+                        help="Allowed slowdown or memory growth over the baseline, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--child-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--child-result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child_stage:
+        run_stage_in_child(args.child_stage, args.child_result)
+        sys.exit(0)
+    
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    _, regressions = run_benchmarks(args.size, args.stages, args.db_items, args.tolerance, args.save_baseline)
+    if regressions:
+        sys.exit(1)
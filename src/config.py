@@ -2,42 +2,204 @@
 # Load configuration from .env file
 
 import os
-from dotenv import load_dotenv
-import pathlib
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Path variables
-DATA_DIR = os.getenv("DATA_DIR", "data")
-TEXT8_DATASET_PATH = os.getenv("TEXT8_DATASET_PATH", "data/text8")
-TEXT8_DATASET_URL = os.getenv("TEXT8_DATASET_URL", "http://mattmahoney.net/dc/text8.zip")
-HACKER_NEWS_DATASET_PATH = os.getenv("HACKER_NEWS_DATASET_PATH", "data/hacker_news_complete.csv")
-HACKER_NEWS_TITLES_PATH = os.getenv("HACKER_NEWS_TITLES_PATH", "data/hacker_news_titles.txt")
-COMBINED_DATASET_PATH = os.getenv("COMBINED_DATASET_PATH", "data/combined_data.txt")
-TOKENS_PATH = os.getenv("TOKENS_PATH", "data/tokens.txt")
-VOCAB_PATH = os.getenv("VOCAB_PATH", "data/vocab.json")
-
-# Processing parameters
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "50000"))
-MAX_VOCAB_SIZE = int(os.getenv("MAX_VOCAB_SIZE", "50000"))
+
+class Config:
+    """Every setting with its type and default, overridden by environment variables of the same name.
+    
+    Instances are read-only. This is a plain annotated class rather than a
+    dataclass, as generating a dataclass with this many fields costs more
+    than the rest of a cheap command's start-up.
+    
+    Environment variables are the only way to override a setting. CONFIG is
+    loaded once, when this module is first imported, and its values become
+    module constants that other modules bind as default arguments on import.
+    A setting changed after that has no effect in the process, so set the
+    variables before the first import, as python -m src --set does, or start
+    a new process.
+    """
+    
+    # Path variables
+    DATA_DIR: str = "data"
+    TEXT8_DATASET_PATH: str = "data/text8"
+    TEXT8_DATASET_URL: str = "http://mattmahoney.net/dc/text8.zip"
+    TEXT8_SHA256: str = ""  # Expected SHA-256 of text8.zip, "" to skip the check
+    HACKER_NEWS_DATASET_PATH: str = "data/hacker_news_complete.csv"
+    HACKER_NEWS_PARQUET_PATH: str = "data/hacker_news_complete.parquet"
+    HACKER_NEWS_TITLES_PATH: str = "data/hacker_news_titles.txt"
+    COMBINED_DATASET_PATH: str = "data/combined_data.txt"
+    TOKENS_PATH: str = "data/tokens.txt"
+    VOCAB_PATH: str = "data/vocab.json"
+    VOCAB_BIN_PATH: str = "data/vocab.bin"
+    TOKEN_IDS_PATH: str = "data/tokens.bin"
+    SAMPLING_TABLES_PATH: str = "data/sampling.npz"
+    WORD2VEC_CHECKPOINT_PATH: str = "data/word2vec.pt"
+    EMBEDDINGS_PATH: str = "data/embeddings.bin"  # Memory-mappable input embeddings for serving and queries
+    TITLE_DATASET_PATH: str = "data/titles.npz"
+    TITLE_FEATURES_PATH: str = "data/title_features.npy"
+    TITLE_SHARDS_DIR: str = "data/title_shards"  # Memory-mappable title dataset shards for score regression
+    SCORE_MODEL_PATH: str = "data/score_model.npz"
+    PIPELINE_MANIFEST_PATH: str = "data/pipeline_manifest.json"
+    INGEST_STATE_PATH: str = "data/ingest_state.json"  # High-water mark and file sizes of the last ingest
+    TOKEN_COUNTS_PATH: str = "data/token_counts.bin"  # Every token's count, in first-occurrence order
+    CORPUS_IDS_PATH: str = "data/corpus_ids.bin"  # The corpus as ids into the token counts table
+    TOKEN_POSITIONS_DIR: str = "data/token_positions"  # Corpus positions of every token, by ingest
+    VOCAB_CHANGES_PATH: str = "data/vocab_changes.json"  # Tokens that entered or left the vocabulary last ingest
+    TITLE_DEDUP_PATH: str = "data/title_dedup.npz"  # Hash sets of the titles kept by deduplication
+    
+    # Database parameters
+    DB_CONNECTION_STRING: str = ""
+    BATCH_SIZE: int = 10000
+    EXTRACT_PARTITIONS: int = 16  # Id-range partitions for parallel extraction
+    EXTRACT_CONCURRENCY: int = 4  # Partitions fetched at once (and pool size)
+    HACKER_NEWS_FORMAT: str = "csv"  # Dump format: csv or parquet
+    PARQUET_FILE_ROWS: int = 1000000  # Rows per Parquet part file
+    PARQUET_COMPRESSION: str = "zstd"
+    DOWNLOAD_CHUNK_SIZE: int = 1048576  # Bytes per read when downloading
+    DOWNLOAD_RETRIES: int = 10  # Resumed attempts after a dropped connection
+    DOWNLOAD_TIMEOUT: float = 30  # Seconds without data before a retry
+    
+    # Processing parameters
+    CHUNK_SIZE: int = 50000
+    MAX_VOCAB_SIZE: int = 50000
+    CLEAN_WORKERS: int = 1  # Processes used to clean titles
+    # Drop titles identical to an earlier one after cleaning. Being on by default, this changes the
+    # default hacker_news_titles.txt and combined corpus; the title dataset and shards keep reposts.
+    DEDUP_EXACT: bool = True
+    DEDUP_NEAR_THRESHOLD: float = 0  # Word-set Jaccard similarity of near-duplicate titles, 0 to keep them
+    MINHASH_PERMUTATIONS: int = 64  # MinHash signature length for near-duplicate detection
+    STREAM_CHUNK_SIZE: int = 1048576  # Characters per read in streaming mode
+    VOCAB_WORKERS: int = 1  # Processes used to count tokens
+    VOCAB_CAPACITY: int = 0  # Approximate counting capacity, 0 for exact counts
+    VOCAB_MIN_COUNT: int = 1  # Minimum count for a token to enter the vocabulary
+    VOCAB_JSON_EXPORT: bool = True  # Also write vocab.json next to vocab.bin
+    PIPELINE_JOBS: int = 2  # Pipeline stages run at once
+    SUBSAMPLE_THRESHOLD: float = 1e-5  # Frequent-word subsampling threshold t
+    NEGATIVE_POWER: float = 0.75  # Exponent on counts for negative sampling
+    SHARD_TITLES: int = 100000  # Titles per title dataset shard
+    VALIDATION_FRACTION: float = 0.05  # Share of item ids in the validation split
+    TEST_FRACTION: float = 0.05  # Share of item ids in the test split
+    
+    # Training parameters
+    WINDOW_SIZE: int = 5  # Maximum context distance on each side
+    TRAIN_BATCH_SIZE: int = 4096  # Pairs (or CBOW windows) per batch
+    BATCH_BLOCK_TOKENS: int = 65536  # Corpus tokens read and shuffled at once
+    LOADER_WORKERS: int = 2  # DataLoader worker processes
+    EMBEDDING_DIM: int = 100
+    EMBEDDING_DTYPE: str = "float16"  # Precision of the exported embeddings: float16 or float32
+    EMBEDDING_TOP_K: int = 0  # Exported rows, for the most frequent words; 0 for the whole vocabulary
+    NEGATIVES: int = 5  # Negative samples per training example
+    LEARNING_RATE: float = 0.025  # Initial rate, decayed linearly to zero
+    EPOCHS: int = 1
+    TRAIN_WORKERS: int = os.cpu_count() or 1  # Hogwild training processes
+    REPORT_INTERVAL: float = 10  # Seconds between progress reports
+    CHECKPOINT_INTERVAL: float = 600  # Seconds between checkpoints
+    TITLE_BATCH_SIZE: int = 1024  # Titles per score regression batch
+    SHUFFLE_BUFFER_TITLES: int = 100000  # Titles held in memory to shuffle across shards
+    
+    # Query parameters
+    QUERY_BLOCK_SIZE: int = 256  # Queries scored per matrix product
+    RERANK_FACTOR: int = 4  # Int8 candidates re-ranked exactly, per result
+    POOL_BLOCK_TITLES: int = 100000  # Titles pooled per vectorized pass
+    RIDGE_ALPHA: float = 1.0  # Ridge penalty of the score regressor
+    
+    # Serving parameters
+    SERVE_HOST: str = "127.0.0.1"
+    SERVE_PORT: int = 8000
+    SERVE_MAX_BATCH: int = 64  # Most titles per forward pass
+    SERVE_MAX_WAIT_MS: float = 5  # Longest a title waits for its batch
+    SERVE_CACHE_SIZE: int = 100000  # Cached cleaned-title embeddings
+    
+    # Benchmark parameters
+    BENCHMARK_DIR: str = "data/benchmarks"  # Synthetic corpora and results
+    BENCHMARK_BASELINE_PATH: str = "benchmarks_baseline.json"
+    BENCHMARK_TOLERANCE: float = 0.2  # Allowed regression over the baseline
+    
+    # Instrumentation parameters
+    RUN_REPORT_PATH: str = "data/run_report.jsonl"  # JSON lines stage report, "" to disable
+    INSTRUMENT_MEMORY: str = "rss"  # Memory tracking: rss, tracemalloc or off
+    PROFILE_DIR: str = ""  # Directory for cProfile dumps of each stage, "" to disable
+    RSS_SAMPLE_INTERVAL: float = 0.5  # Seconds between RSS samples
+    
+    def __init__(self, **values):
+        for name, value in values.items():
+            if name not in self.__annotations__:
+                raise TypeError(f"Unknown setting: {name}")
+            object.__setattr__(self, name, value)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("Config is read-only; set environment variables before importing src.config")
+    
+    def as_dict(self):
+        """Every setting by name, in declaration order."""
+        return {name: getattr(self, name) for name in self.__annotations__}
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+def parse_setting(name, kind, value):
+    """Convert the string value of a setting to its declared type."""
+    if kind is bool:
+        flag = value.strip().lower()
+        if flag not in TRUE_VALUES + FALSE_VALUES:
+            raise ValueError(f"{name} must be one of {', '.join(TRUE_VALUES + FALSE_VALUES)}, got {value!r}")
+        return flag in TRUE_VALUES
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"{name} must be {kind.__name__}, got {value!r}") from None
+
+def load_dotenv_if_present():
+    """Load the nearest .env file, importing python-dotenv only when there is one.
+    
+    Like dotenv's own search, this looks in this file's directory and its
+    parents; variables already set in the environment win.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+def load_config(environ=None):
+    """Build the config from environ, os.environ by default; values of the wrong type raise ValueError."""
+    environ = os.environ if environ is None else environ
+    values = {}
+    for name, kind in Config.__annotations__.items():
+        value = environ.get(name)
+        if value is not None:
+            values[name] = parse_setting(name, kind, value)
+    return Config(**values)
+
+def check_overrides(overrides):
+    """Raise ValueError for override names (name -> string value) that are not settings, or bad values."""
+    known = Config.__annotations__
+    unknown = sorted(set(overrides) - set(known))
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(unknown)}")
+    for name, value in overrides.items():
+        parse_setting(name, known[name], value)
+
+# Load environment variables from .env file, then every setting, once per process
+load_dotenv_if_present()
+CONFIG = load_config()
+
+# Settings are also module constants, so modules can import just the ones they use
+globals().update(CONFIG.as_dict())
 
 # Ensure directories exist
 def ensure_directories():
     """Ensure required directories exist"""
-    pathlib.Path(DATA_DIR).mkdir(exist_ok=True)
+    os.makedirs(CONFIG.DATA_DIR, exist_ok=True)
 
 # Call ensure_directories if this script is run directly
 if __name__ == "__main__":
     ensure_directories()
     print("Configuration loaded from .env file:")
-    print(f"DATA_DIR: {DATA_DIR}")
-    print(f"TEXT8_DATASET_PATH: {TEXT8_DATASET_PATH}")
-    print(f"TEXT8_DATASET_URL: {TEXT8_DATASET_URL}")
-    print(f"HACKER_NEWS_DATASET_PATH: {HACKER_NEWS_DATASET_PATH}")
-    print(f"HACKER_NEWS_TITLES_PATH: {HACKER_NEWS_TITLES_PATH}")
-    print(f"COMBINED_DATASET_PATH: {COMBINED_DATASET_PATH}")
-    print(f"TOKENS_PATH: {TOKENS_PATH}")
-    print(f"VOCAB_PATH: {VOCAB_PATH}")
-    print(f"CHUNK_SIZE: {CHUNK_SIZE}")
-    print(f"MAX_VOCAB_SIZE: {MAX_VOCAB_SIZE}") 
\ No newline at end of file
+    for name, value in CONFIG.as_dict().items():
+        print(f"{name}: {value}")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# Token counting helpers shared by the tokeniser
+
+import os
+import heapq
+import codecs
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Fix import issue by using relative import path
+try:
+    from src.config import STREAM_CHUNK_SIZE
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import STREAM_CHUNK_SIZE
+
+# ASCII whitespace never appears inside a multi-byte UTF-8 sequence, so these
+# bytes are always safe places to cut a file
+WHITESPACE_BYTES = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+
+# Shards smaller than this are not worth a process round trip
+MIN_SHARD_BYTES = 1024 * 1024
+
+def split_with_carry(carry, chunk):
+    """Split carry + chunk into complete tokens and the possibly unfinished last token."""
+    text = carry + chunk
+    tokens = text.split()
+    carry = tokens.pop() if tokens and not text[-1].isspace() else ""
+    return tokens, carry
+
+def find_whitespace_boundary(f, offset, file_size, block_size=65536):
+    """Return the first position at or after offset that holds a whitespace byte."""
+    f.seek(offset)
+    position = offset
+    while position < file_size:
+        block = f.read(block_size)
+        if not block:
+            break
+        for i, byte in enumerate(block):
+            if byte in WHITESPACE_BYTES:
+                return position + i
+        position += len(block)
+    return file_size
+
+def shard_files(paths, num_shards):
+    """Split the files into (path, start, end) byte ranges that end on whitespace.
+    
+    Shards are returned in file order, then offset order, so counting them in
+    order visits the tokens in the same order as reading the files.
+    """
+    sizes = [os.path.getsize(path) for path in paths]
+    target = max(sum(sizes) // max(num_shards, 1), MIN_SHARD_BYTES)
+    
+    shards = []
+    for path, size in zip(paths, sizes):
+        with open(path, 'rb') as f:
+            start = 0
+            while start < size:
+                end = find_whitespace_boundary(f, min(start + target, size), size)
+                shards.append((path, start, end))
+                start = end
+    return shards
+
+def merge_counts(summary, counts, capacity):
+    """Add counts into a Misra-Gries summary that keeps at most capacity tokens.
+    
+    When the summary overflows, the (capacity + 1)-th largest count is
+    subtracted from every entry and entries that drop to zero are removed.
+    Returns the amount subtracted: estimates are lower bounds, and each true
+    count exceeds its estimate by at most the sum of these amounts, which is
+    itself at most total_tokens / (capacity + 1).
+    """
+    summary.update(counts)
+    if len(summary) <= capacity:
+        return 0
+    
+    threshold = heapq.nlargest(capacity + 1, summary.values())[-1]
+    for token in [token for token, count in summary.items() if count <= threshold]:
+        del summary[token]
+    for token in summary:
+        summary[token] -= threshold
+    
+    return threshold
+
+def count_shard(shard, chunk_size=STREAM_CHUNK_SIZE, capacity=None):
+    """Count the tokens in one byte range of a file.
+    
+    Returns the counts and their error bound, which is 0 unless a capacity is
+    given and the shard is summarised with merge_counts().
+    """
+    path, start, end = shard
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    counts = Counter()
+    error_bound = 0
+    carry = ""
+    
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            
+            tokens, carry = split_with_carry(carry, decoder.decode(data))
+            if capacity:
+                error_bound += merge_counts(counts, Counter(tokens), capacity)
+            else:
+                counts.update(tokens)
+    
+    tokens, carry = split_with_carry(carry, decoder.decode(b"", final=True))
+    if carry:
+        tokens.append(carry)
+    if capacity:
+        error_bound += merge_counts(counts, Counter(tokens), capacity)
+    else:
+        counts.update(tokens)
+    
+    return counts, error_bound
+
+def count_tokens_parallel(paths, workers, chunk_size=STREAM_CHUNK_SIZE, capacity=None):
+    """Count tokens in the files with a process pool over whitespace-aligned shards.
+    
+    Partial counts are merged in shard order, so tokens keep the order of their
+    first occurrence and most_common() breaks ties exactly as a serial Counter would.
+    With a capacity, each shard and the merged result are Misra-Gries summaries
+    and the returned error bound is the sum of their bounds.
+    """
+    shards = shard_files(paths, workers * 4)
+    print(f"Counting {len(shards)} shards with {workers} worker processes")
+    
+    token_counts = Counter()
+    error_bound = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(count_shard, shards, [chunk_size] * len(shards), [capacity] * len(shards))
+        for counts, shard_error in results:
+            error_bound += shard_error
+            if capacity:
+                error_bound += merge_counts(token_counts, counts, capacity)
+            else:
+                token_counts.update(counts)
+    
+    return token_counts, error_bound
+
+def report_approximate_counts(token_counts, error_bound, total_tokens, capacity):
+    """Print the error bounds of approximate counts."""
+    print(f"\nApproximate counting kept {len(token_counts):,} of at most {capacity:,} tokens")
+    print(f"Counts are lower bounds, each at most {error_bound:,} below the true count "
+          f"(worst case {total_tokens // (capacity + 1):,} for {total_tokens:,} tokens)")
+    
+    certain = sum(1 for count in token_counts.values() if count > error_bound)
+    print(f"Tokens whose estimate exceeds the error bound: {certain:,}")
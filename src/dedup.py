@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# Exact and near-duplicate title filtering with bounded-memory hash structures
+
+import os
+import json
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        DEDUP_EXACT, DEDUP_NEAR_THRESHOLD, MINHASH_PERMUTATIONS, TITLE_DEDUP_PATH, CHUNK_SIZE
+    )
+    from src.sketches import hash64, HashSet, MinHash, lsh_parameters, band_keys
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        DEDUP_EXACT, DEDUP_NEAR_THRESHOLD, MINHASH_PERMUTATIONS, TITLE_DEDUP_PATH, CHUNK_SIZE
+    )
+    from sketches import hash64, HashSet, MinHash, lsh_parameters, band_keys
+
+# Titles signed per vectorized MinHash pass, bounding the (tokens, permutations) work array
+MINHASH_BLOCK_TITLES = 4096
+
+class TitleDeduplicator:
+    """Drops cleaned titles that repeat an earlier title exactly or nearly.
+    
+    Exact duplicates are found by a 64-bit hash of the whole title in a
+    HashSet. With a near_threshold, titles whose word sets have a Jaccard
+    similarity above about that threshold with an earlier title are dropped
+    too: each title's MinHash signature is cut into LSH bands, and a title
+    sharing any band key with an earlier one counts as a near duplicate. The
+    band keys of every title are kept, so chains of similar titles collapse
+    to their first. Memory is that of the two hash sets: 16 to 32 bytes per
+    distinct title, plus that per band for near duplicates.
+    """
+    
+    def __init__(self, exact=DEDUP_EXACT, near_threshold=DEDUP_NEAR_THRESHOLD, num_perm=MINHASH_PERMUTATIONS):
+        self.exact = exact
+        self.near_threshold = near_threshold
+        self.num_perm = num_perm
+        self.exact_hashes = HashSet()
+        self.band_hashes = HashSet()
+        if near_threshold > 0:
+            self.minhash = MinHash(num_perm)
+            self.bands, self.rows = lsh_parameters(near_threshold, num_perm)
+        self.kept = 0
+        self.removed = {"exact": 0, "near": 0}
+        self.removed_characters = 0
+    
+    @property
+    def enabled(self):
+        return self.exact or self.near_threshold > 0
+    
+    def params(self):
+        """The settings that decide which titles are dropped."""
+        return {"exact": self.exact, "near_threshold": self.near_threshold, "num_perm": self.num_perm}
+    
+    def _near_duplicates(self, titles):
+        """Mask of titles sharing an LSH band with an earlier title, adding their band keys."""
+        duplicate = np.zeros(len(titles), dtype=bool)
+        for start in range(0, len(titles), MINHASH_BLOCK_TITLES):
+            block = [title.split() for title in titles[start:start + MINHASH_BLOCK_TITLES]]
+            # Word sets, with each distinct word of the block hashed once
+            word_sets = [list(dict.fromkeys(words)) for words in block]
+            distinct = list(dict.fromkeys(word for words in word_sets for word in words))
+            word_hashes = dict(zip(distinct, hash64(distinct).tolist()))
+            token_hashes = np.fromiter((word_hashes[word] for words in word_sets for word in words),
+                                       dtype=np.uint64)
+            set_starts = np.cumsum([0] + [len(words) for words in word_sets[:-1]])
+            
+            keys = band_keys(self.minhash.signatures(token_hashes, set_starts), self.bands, self.rows)
+            new = self.band_hashes.add_hashes(keys.ravel()).reshape(keys.shape)
+            duplicate[start:start + len(block)] = ~new.all(axis=1)
+        return duplicate
+    
+    def filter(self, titles):
+        """The titles, in order, without duplicates of each other or of any title seen before."""
+        if not self.enabled or not titles:
+            self.kept += len(titles)
+            return titles
+        
+        keep = np.ones(len(titles), dtype=bool)
+        if self.exact:
+            keep = self.exact_hashes.add_hashes(hash64(titles))
+            self.removed["exact"] += int(np.count_nonzero(~keep))
+        if self.near_threshold > 0:
+            candidates = np.flatnonzero(keep)
+            near = self._near_duplicates([titles[i] for i in candidates])
+            keep[candidates[near]] = False
+            self.removed["near"] += int(np.count_nonzero(near))
+        
+        kept = [title for title, keep_title in zip(titles, keep) if keep_title]
+        self.kept += len(kept)
+        self.removed_characters += sum(len(title) for title in titles) - sum(len(title) for title in kept)
+        return kept
+    
+    def num_hashes(self):
+        """Hashes held, which grows with the distinct titles seen."""
+        return len(self.exact_hashes) + len(self.band_hashes)
+    
+    def report(self):
+        """One line on how much was removed."""
+        removed = self.removed["exact"] + self.removed["near"]
+        total = self.kept + removed
+        memory = (self.exact_hashes.table.nbytes + self.band_hashes.table.nbytes) / 2**20
+        return (f"Removed {removed:,} duplicate titles of {total:,} ({removed / max(total, 1):.1%}): "
+                f"{self.removed['exact']:,} exact, {self.removed['near']:,} near; "
+                f"{self.removed_characters:,} characters; hash sets {memory:,.1f} MB")
+    
+    def save(self, path=TITLE_DEDUP_PATH):
+        """Atomically save the hash sets, so later titles can be checked against these."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, params=np.array(json.dumps(self.params())),
+                     exact_table=self.exact_hashes.table, exact_size=self.exact_hashes.size,
+                     band_table=self.band_hashes.table, band_size=self.band_hashes.size)
+        os.replace(tmp_path, path)
+        return path
+    
+    @classmethod
+    def load(cls, path=TITLE_DEDUP_PATH):
+        """Load saved hash sets, with the settings they were built with."""
+        with np.load(path) as data:
+            deduplicator = cls(**json.loads(str(data["params"])))
+            deduplicator.exact_hashes = HashSet(data["exact_table"], int(data["exact_size"]))
+            deduplicator.band_hashes = HashSet(data["band_table"], int(data["band_size"]))
+        return deduplicator
+
+def count_duplicates(near_threshold=0.8, num_perm=MINHASH_PERMUTATIONS, chunk_size=CHUNK_SIZE):
+    """Report how many titles of the Hacker News dump deduplication would remove, writing nothing."""
+    try:
+        from src.download.hacker_news_io import iter_hacker_news_chunks
+        from src.download.get_hacker_news_titles import clean_title_chunk
+    except ModuleNotFoundError:
+        from download.hacker_news_io import iter_hacker_news_chunks
+        from download.get_hacker_news_titles import clean_title_chunk
+    
+    deduplicator = TitleDeduplicator(exact=True, near_threshold=near_threshold, num_perm=num_perm)
+    for chunk in iter_hacker_news_chunks(columns=['title'], chunk_size=chunk_size):
+        deduplicator.filter(clean_title_chunk(chunk['title']))
+    print(deduplicator.report())
+    return deduplicator
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the duplicate titles in the Hacker News dump")
+    parser.add_argument("--near-threshold", type=float, default=DEDUP_NEAR_THRESHOLD or 0.8,
+                        help="Word-set Jaccard similarity of near duplicates, 0 for exact duplicates only")
+    parser.add_argument("--permutations", type=int, default=MINHASH_PERMUTATIONS, help="MinHash signature length")
+    args = parser.parse_args()
+    
+    count_duplicates(args.near_threshold, args.permutations)
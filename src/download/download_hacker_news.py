@@ -1,23 +1,33 @@
-import pandas as pd
-from sqlalchemy import create_engine, text, event
 import os
+import json
 import logging
 import time
-import backoff  # You may need to install this: pip install backoff
+import shutil
 import traceback
+import argparse
 
 # Fix import issue by using relative import path
 try:
     from src.config import (
         DATA_DIR, HACKER_NEWS_DATASET_PATH, DB_CONNECTION_STRING, 
-        BATCH_SIZE, ensure_directories
+        BATCH_SIZE, EXTRACT_PARTITIONS, EXTRACT_CONCURRENCY, HACKER_NEWS_FORMAT,
+        PARQUET_FILE_ROWS, ensure_directories
     )
+    from src.download.hacker_news_io import (
+        hacker_news_dataset_path, open_batch_writer, parquet_files, read_hacker_news_columns
+    )
+    from src.instrumentation import instrumented, increment
 except ModuleNotFoundError:
     # When running as a script directly
     from config import (
         DATA_DIR, HACKER_NEWS_DATASET_PATH, DB_CONNECTION_STRING, 
-        BATCH_SIZE, ensure_directories
+        BATCH_SIZE, EXTRACT_PARTITIONS, EXTRACT_CONCURRENCY, HACKER_NEWS_FORMAT,
+        PARQUET_FILE_ROWS, ensure_directories
+    )
+    from hacker_news_io import (
+        hacker_news_dataset_path, open_batch_writer, parquet_files, read_hacker_news_columns
     )
+    from instrumentation import instrumented, increment
 
 # Set up basic logging
 logging.basicConfig(
@@ -27,15 +37,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def get_db_engine():
+def get_db_engine(pool_size=1):
     """Create a database engine with optimized connection settings."""
+    from sqlalchemy import create_engine
+    
     # Database connection string with timeout parameters
     connection_string = DB_CONNECTION_STRING
     
     # Create engine with connection pooling and longer timeouts
     engine = create_engine(
         connection_string,
-        pool_size=1,  # Use single connection for consistency
+        pool_size=pool_size,  # One connection per concurrent worker
+        max_overflow=0,  # Never open more connections than the pool size
         pool_timeout=60,  # Wait up to 60 seconds for a connection
         connect_args={
             "connect_timeout": 120,  # Wait up to 2 minutes when connecting
@@ -45,9 +58,17 @@ def get_db_engine():
     
     return engine
 
-@backoff.on_exception(backoff.expo, Exception, max_tries=5)
 def execute_query(query, engine=None):
     """Execute a query with retry logic."""
+    # Imported here, like pandas and SQLAlchemy, so that importing this module stays cheap
+    import backoff  # You may need to install this: pip install backoff
+    
+    return backoff.on_exception(backoff.expo, Exception, max_tries=5)(_execute_query_once)(query, engine)
+
+def _execute_query_once(query, engine=None):
+    import pandas as pd
+    from sqlalchemy import text
+    
     close_engine = False
     if engine is None:
         engine = get_db_engine()
@@ -66,8 +87,61 @@ def execute_query(query, engine=None):
             engine.dispose()
             logger.info("Database connection closed")
 
-def fetch_data_in_batches(output_file=HACKER_NEWS_DATASET_PATH, batch_size=BATCH_SIZE, max_batches=None):
-    """Fetch the entire joined dataset in batches and write directly to CSV."""
+def checkpoint_path_for(output_file):
+    """Path of the checkpoint file kept next to an output file."""
+    return f"{output_file}.checkpoint.json"
+
+def load_checkpoint(checkpoint_path):
+    """Load an extraction checkpoint, or None if there is none."""
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """Atomically write an extraction checkpoint."""
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def dump_checkpoint(output_file, output_format=HACKER_NEWS_FORMAT):
+    """A checkpoint for an existing dump written without one, such as a merged parallel extraction.
+    
+    It points after the dump's last row, so resuming from it only fetches
+    stories newer than any in the dump. Reads the item_id column once.
+    """
+    ids = read_hacker_news_columns(["item_id"], output_file)["item_id"]
+    checkpoint = {"last_id": int(ids.max()) if len(ids) else -1, "rows_written": len(ids)}
+    if output_format == "parquet":
+        checkpoint["files"] = [os.path.basename(part_file) for part_file in parquet_files(output_file)]
+    else:
+        checkpoint["file_offset"] = os.path.getsize(output_file)
+    return checkpoint
+
+@instrumented()
+def fetch_data_in_batches(output_file=None, batch_size=BATCH_SIZE, max_batches=None,
+                          engine=None, resume=True, pause=0, id_range=None, output_format=HACKER_NEWS_FORMAT,
+                          parquet_file_rows=PARQUET_FILE_ROWS):
+    """Fetch the entire joined dataset in batches and write directly to CSV or Parquet.
+    
+    With id_range set to an inclusive (min_id, max_id) pair, only stories in
+    that range are fetched. output_file defaults to the configured path for
+    output_format; Parquet output is a directory of part files with one row
+    group per batch.
+    
+    Batches are paged by item id (i.id > last_id) rather than OFFSET, so each
+    batch costs the same. Whenever the output is durable (after every CSV
+    batch, after every finished Parquet file) a checkpoint with the last id,
+    rows written and file offset or finished files is saved next to the
+    output; with resume set, a restarted run drops anything written after the
+    checkpoint and appends exactly where it stopped.
+    """
+    import pandas as pd
+    from sqlalchemy import text
+    
+    output_file = output_file or hacker_news_dataset_path(output_format)
+    
     # Base query for the joined tables
     base_query = """
     SELECT 
@@ -91,85 +165,122 @@ def fetch_data_in_batches(output_file=HACKER_NEWS_DATASET_PATH, batch_size=BATCH
         i.type = 'story'
         AND i.title IS NOT NULL
     """
+    range_filter = "" if id_range is None else " AND i.id >= :min_id AND i.id <= :max_id"
+    range_params = {} if id_range is None else {"min_id": id_range[0], "max_id": id_range[1]}
+    batch_query = f"{base_query}{range_filter} AND i.id > :last_id ORDER BY i.id LIMIT :batch_size"
     
     # Ensure directories exist
     ensure_directories()
     
-    engine = get_db_engine()
+    close_engine = engine is None
+    if engine is None:
+        engine = get_db_engine()
+    
+    checkpoint_path = checkpoint_path_for(output_file)
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+    if checkpoint is not None and not os.path.exists(output_file):
+        logger.warning(f"Ignoring checkpoint {checkpoint_path} because {output_file} is missing")
+        checkpoint = None
     
     try:
-        # Get the total number of rows for progress tracking
-        count_query = """
+        if checkpoint is not None:
+            last_id = checkpoint["last_id"]
+            total_rows = checkpoint["rows_written"]
+            logger.info(f"Resuming after item {last_id} with {total_rows} rows already written")
+        else:
+            last_id = -1
+            total_rows = 0
+        start_rows = total_rows
+        
+        # Count only the rows still to fetch, so resuming a large dump stays cheap
+        count_query = f"""
         SELECT COUNT(*) AS count
         FROM 
             hacker_news.items i
         WHERE 
             i.type = 'story'
-            AND i.title IS NOT NULL
+            AND i.title IS NOT NULL{range_filter}
+            AND i.id > :last_id
         """
         try:
-            total_count_df = pd.read_sql_query(text(count_query), engine)
-            total_count = total_count_df['count'].iloc[0]
+            total_count_df = pd.read_sql_query(text(count_query), engine, params={"last_id": last_id, **range_params})
+            total_count = int(total_count_df['count'].iloc[0])
             logger.info(f"Total rows to fetch: approximately {total_count}")
         except Exception as e:
             logger.warning(f"Could not get total count: {str(e)}")
             total_count = "unknown"
         
-        # Start fetching data in batches
-        offset = 0
         batch_num = 0
-        total_rows = 0
-        header = True
+        writer = open_batch_writer(output_file, output_format, checkpoint, parquet_file_rows)
         
-        while max_batches is None or batch_num < max_batches:
-            batch_query = f"{base_query} ORDER BY i.id LIMIT {batch_size} OFFSET {offset}"
+        try:
+            while max_batches is None or batch_num < max_batches:
+                try:
+                    logger.info(f"Fetching batch {batch_num+1} (after item {last_id})...")
+                    batch_start = time.time()
+                    
+                    # Execute the query for this batch
+                    batch_df = pd.read_sql_query(text(batch_query), engine,
+                                                 params={"last_id": last_id, "batch_size": batch_size,
+                                                         **range_params})
+                    
+                    batch_end = time.time()
+                    increment("query_seconds", batch_end - batch_start)
+                    logger.info(f"Batch {batch_num+1} fetched {len(batch_df)} rows in {batch_end - batch_start:.2f} seconds")
+                    
+                    if len(batch_df) == 0:
+                        logger.info("No more rows to fetch. Completed.")
+                        break
+                    
+                    # Write this batch to the output file
+                    durable = writer.write(batch_df)
+                    
+                    total_rows += len(batch_df)
+                    batch_num += 1
+                    increment("rows", len(batch_df))
+                    increment("batches")
+                    last_id = int(batch_df['item_id'].iloc[-1])
+                    
+                    if durable:
+                        save_checkpoint(checkpoint_path, {
+                            "last_id": last_id,
+                            "rows_written": total_rows,
+                            **writer.state(),
+                        })
+                    
+                    logger.info(f"Progress: {total_rows} rows fetched so far " + 
+                               (f"({(total_rows - start_rows)/total_count*100:.2f}%)" if isinstance(total_count, (int, float)) and total_count else ""))
+                    
+                    # Optional pause between batches to avoid overwhelming the server
+                    if pause:
+                        time.sleep(pause)
+                    
+                except Exception as e:
+                    logger.error(f"Error fetching batch {batch_num+1}: {str(e)}")
+                    logger.error(traceback.format_exc())
+                    
+                    # Discard a partially written batch
+                    writer.discard_partial()
+                    
+                    # If we've already fetched some batches, we can continue from where we left off
+                    if batch_num > 0:
+                        logger.info(f"Retrying in 10 seconds after item {last_id}...")
+                        time.sleep(10)
+                        continue
+                    else:
+                        raise
             
-            try:
-                logger.info(f"Fetching batch {batch_num+1} (offset {offset})...")
-                batch_start = time.time()
-                
-                # Execute the query for this batch
-                batch_df = pd.read_sql_query(text(batch_query), engine)
-                
-                batch_end = time.time()
-                logger.info(f"Batch {batch_num+1} fetched {len(batch_df)} rows in {batch_end - batch_start:.2f} seconds")
-                
-                if len(batch_df) == 0:
-                    logger.info("No more rows to fetch. Completed.")
-                    break
-                
-                # Write this batch to the CSV file
-                batch_df.to_csv(
-                    output_file,
-                    mode='w' if header else 'a',
-                    header=header,
-                    index=False
-                )
-                
-                header = False  # Don't write header for subsequent batches
-                total_rows += len(batch_df)
-                batch_num += 1
-                
-                logger.info(f"Progress: {total_rows} rows fetched so far " + 
-                           (f"({total_rows/total_count*100:.2f}%)" if isinstance(total_count, (int, float)) else ""))
-                
-                # Move to the next batch
-                offset += batch_size
-                
-                # Small pause between batches to avoid overwhelming the server
-                time.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Error fetching batch {batch_num+1}: {str(e)}")
-                logger.error(traceback.format_exc())
-                
-                # If we've already fetched some batches, we can continue from where we left off
-                if batch_num > 0:
-                    logger.info(f"Retrying in 10 seconds from offset {offset}...")
-                    time.sleep(10)
-                    continue
-                else:
-                    raise
+            # Finish any open file so everything written so far is durable
+            writer.close()
+            if batch_num > 0:
+                save_checkpoint(checkpoint_path, {
+                    "last_id": last_id,
+                    "rows_written": total_rows,
+                    **writer.state(),
+                })
+        except BaseException:
+            writer.close()
+            raise
         
         logger.info(f"Data extraction completed. Total {total_rows} rows saved to {output_file}")
         return total_rows
@@ -179,17 +290,170 @@ def fetch_data_in_batches(output_file=HACKER_NEWS_DATASET_PATH, batch_size=BATCH
         logger.error(traceback.format_exc())
         raise
     finally:
-        engine.dispose()
-        logger.info("Database connection closed")
+        if close_engine:
+            engine.dispose()
+            logger.info("Database connection closed")
+
+def get_story_id_range(engine):
+    """Return the (min_id, max_id) of stories with a title, or None if there are none."""
+    import pandas as pd
+    from sqlalchemy import text
+    
+    id_range_query = """
+    SELECT MIN(i.id) AS min_id, MAX(i.id) AS max_id
+    FROM 
+        hacker_news.items i
+    WHERE 
+        i.type = 'story'
+        AND i.title IS NOT NULL
+    """
+    id_range_df = pd.read_sql_query(text(id_range_query), engine)
+    if id_range_df['min_id'].isna().iloc[0]:
+        return None
+    return int(id_range_df['min_id'].iloc[0]), int(id_range_df['max_id'].iloc[0])
+
+def split_id_range(min_id, max_id, num_partitions):
+    """Split an inclusive id range into at most num_partitions contiguous ranges."""
+    span = max_id - min_id + 1
+    num_partitions = max(1, min(num_partitions, span))
+    bounds = [min_id + span * k // num_partitions for k in range(num_partitions + 1)]
+    return [(bounds[k], bounds[k + 1] - 1) for k in range(num_partitions)]
+
+def shard_path_for(output_file, partition):
+    """Path of the shard file written by one extraction partition."""
+    root, ext = os.path.splitext(output_file)
+    return f"{root}.part{partition:04d}{ext}"
+
+def manifest_path_for(output_file):
+    """Path of the shard manifest kept next to an output file."""
+    return f"{output_file}.manifest.json"
+
+def merge_shards(shard_files, output_file, output_format=HACKER_NEWS_FORMAT):
+    """Concatenate shards in order into one output.
+    
+    CSV shards are joined into one file with a single header; Parquet shard
+    part files are moved into one dataset directory, named to keep id order.
+    """
+    if output_format == "parquet":
+        if os.path.isdir(output_file):
+            shutil.rmtree(output_file)
+        os.makedirs(output_file)
+        for shard_num, shard_file in enumerate(shard_files):
+            if not os.path.isdir(shard_file):
+                continue
+            for part_file in parquet_files(shard_file):
+                os.replace(part_file, os.path.join(output_file, f"part-{shard_num:04d}-{os.path.basename(part_file)[5:]}"))
+        logger.info(f"Merged {len(shard_files)} shards into {output_file}")
+        return
+    
+    header_written = False
+    with open(output_file, 'wb') as out:
+        for shard_file in shard_files:
+            with open(shard_file, 'rb') as f:
+                header = f.readline()
+                if not header:
+                    continue
+                if not header_written:
+                    out.write(header)
+                    header_written = True
+                shutil.copyfileobj(f, out)
+    logger.info(f"Merged {len(shard_files)} shards into {output_file}")
+
+def fetch_data_in_parallel(output_file=None, batch_size=BATCH_SIZE,
+                           num_partitions=EXTRACT_PARTITIONS, concurrency=EXTRACT_CONCURRENCY,
+                           merge=True, engine=None, resume=True, output_format=HACKER_NEWS_FORMAT):
+    """Fetch the dataset as id-range partitions extracted concurrently.
+    
+    Story ids between MIN(id) and MAX(id) are split into num_partitions ranges,
+    and at most concurrency of them are fetched at once, each by
+    fetch_data_in_batches() into its own shard file with its own checkpoint.
+    The shards are then merged in id order into output_file, or, with merge
+    unset, kept and listed in a JSON manifest next to it.
+    """
+    output_file = output_file or hacker_news_dataset_path(output_format)
+    ensure_directories()
+    
+    close_engine = engine is None
+    if engine is None:
+        engine = get_db_engine(pool_size=concurrency)
+    
+    try:
+        id_range = get_story_id_range(engine)
+        if id_range is None:
+            logger.info("No stories to fetch.")
+            return 0
+        
+        partitions = split_id_range(id_range[0], id_range[1], num_partitions)
+        logger.info(f"Fetching ids {id_range[0]}-{id_range[1]} as {len(partitions)} partitions "
+                    f"with {concurrency} concurrent workers")
+        
+        def fetch_partition(partition):
+            shard_file = shard_path_for(output_file, partition)
+            partition_start = time.time()
+            rows = fetch_data_in_batches(shard_file, batch_size=batch_size, engine=engine,
+                                         resume=resume, id_range=partitions[partition],
+                                         output_format=output_format)
+            elapsed = time.time() - partition_start
+            logger.info(f"Partition {partition} (ids {partitions[partition][0]}-{partitions[partition][1]}): "
+                        f"{rows} rows in {elapsed:.2f} seconds ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+            return {"path": shard_file, "min_id": partitions[partition][0],
+                    "max_id": partitions[partition][1], "rows": rows}
+        
+        from concurrent.futures import ThreadPoolExecutor
+        
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            shards = list(executor.map(fetch_partition, range(len(partitions))))
+        total_rows = sum(shard["rows"] for shard in shards)
+        elapsed = time.time() - start
+        logger.info(f"Fetched {total_rows} rows in {elapsed:.2f} seconds ({total_rows / max(elapsed, 1e-9):.0f} rows/s)")
+        
+        if merge:
+            merge_shards([shard["path"] for shard in shards], output_file, output_format)
+            for shard in shards:
+                if os.path.isdir(shard["path"]):
+                    shutil.rmtree(shard["path"])
+                elif os.path.exists(shard["path"]):
+                    os.remove(shard["path"])
+                # Partitions without stories never write a checkpoint
+                if os.path.exists(checkpoint_path_for(shard["path"])):
+                    os.remove(checkpoint_path_for(shard["path"]))
+        else:
+            with open(manifest_path_for(output_file), 'w', encoding='utf-8') as f:
+                json.dump({"total_rows": total_rows, "shards": shards}, f, indent=2)
+            logger.info(f"Shard manifest saved to {manifest_path_for(output_file)}")
+        
+        return total_rows
+    finally:
+        if close_engine:
+            engine.dispose()
+            logger.info("Database connection closed")
 
-def run_extraction():
+def run_extraction(parallel=False, num_partitions=EXTRACT_PARTITIONS, concurrency=EXTRACT_CONCURRENCY,
+                   merge=True, output_format=HACKER_NEWS_FORMAT):
     try:
-        total_rows = fetch_data_in_batches()
-        logger.info(f"Successfully extracted {total_rows} rows to {HACKER_NEWS_DATASET_PATH}")
+        if parallel:
+            total_rows = fetch_data_in_parallel(num_partitions=num_partitions, concurrency=concurrency,
+                                                merge=merge, output_format=output_format)
+        else:
+            total_rows = fetch_data_in_batches(output_format=output_format)
+        logger.info(f"Successfully extracted {total_rows} rows to {hacker_news_dataset_path(output_format)}")
         return total_rows
     except Exception as e:
         logger.error(f"Extraction failed: {str(e)}")
         return 0
 
 if __name__ == "__main__":
-    run_extraction() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extract Hacker News stories to CSV or Parquet")
+    parser.add_argument("--parallel", action="store_true", help="Fetch id-range partitions concurrently")
+    parser.add_argument("--partitions", type=int, default=EXTRACT_PARTITIONS, help="Number of id-range partitions")
+    parser.add_argument("--concurrency", type=int, default=EXTRACT_CONCURRENCY,
+                        help="Maximum number of partitions fetched at once")
+    parser.add_argument("--manifest", action="store_true",
+                        help="Keep the shard files and write a manifest instead of merging them")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=HACKER_NEWS_FORMAT,
+                        help="Output format of the dump")
+    args = parser.parse_args()
+    
+    run_extraction(parallel=args.parallel, num_partitions=args.partitions,
+                   concurrency=args.concurrency, merge=not args.manifest, output_format=args.format)
@@ -2,23 +2,173 @@
 # Download the text8 dataset
 
 import os
-import urllib.request
-import zipfile
+import time
 import shutil
+import hashlib
+import argparse
 
 # Fix import issue by using relative import path
 try:
-    from src.config import DATA_DIR, TEXT8_DATASET_PATH, TEXT8_DATASET_URL, ensure_directories
+    from src.config import (
+        DATA_DIR, TEXT8_DATASET_PATH, TEXT8_DATASET_URL, TEXT8_SHA256,
+        DOWNLOAD_CHUNK_SIZE, DOWNLOAD_RETRIES, DOWNLOAD_TIMEOUT, ensure_directories
+    )
+    from src.instrumentation import instrumented, increment
 except ModuleNotFoundError:
     # When running as a script directly
-    from config import DATA_DIR, TEXT8_DATASET_PATH, TEXT8_DATASET_URL, ensure_directories
+    from config import (
+        DATA_DIR, TEXT8_DATASET_PATH, TEXT8_DATASET_URL, TEXT8_SHA256,
+        DOWNLOAD_CHUNK_SIZE, DOWNLOAD_RETRIES, DOWNLOAD_TIMEOUT, ensure_directories
+    )
+    from instrumentation import instrumented, increment
 
-def download_text8():
+TEXT8_MEMBER = "text8"  # File name in the zip archive
+PROGRESS_INTERVAL = 5.0  # Seconds between progress lines
+
+def _sha256_of(path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest
+
+def _fetch_into(url, part_path, digest, chunk_size, timeout, progress):
+    """Fetch from the end of part_path onwards, appending to it and updating digest.
+    
+    Returns the expected total size (None if the server did not say) and the
+    digest, which is a new one if the download had to start over.
+    """
+    import urllib.error
+    import urllib.request
+    
+    offset = os.path.getsize(part_path)
+    request = urllib.request.Request(url, headers={"Range": f"bytes={offset}-"} if offset else {})
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        # The partial file already holds everything
+        if e.code == 416 and offset:
+            return offset, digest
+        raise
+    
+    with response:
+        if offset and response.status != 206:
+            # The server ignored the range, so start over
+            print("Server does not support resuming; restarting the download")
+            offset = 0
+            digest = hashlib.sha256()
+            open(part_path, 'wb').close()
+        
+        content_range = response.headers.get("Content-Range")
+        if content_range and "/" in content_range and not content_range.endswith("/*"):
+            total = int(content_range.rsplit("/", 1)[1])
+        elif response.headers.get("Content-Length") is not None:
+            total = offset + int(response.headers["Content-Length"])
+        else:
+            total = None
+        
+        with open(part_path, 'ab') as f:
+            while True:
+                block = response.read(chunk_size)
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                increment("bytes", len(block))
+                progress(f.tell(), total)
+    
+    return total, digest
+
+def download_with_resume(url, path, sha256=None, chunk_size=DOWNLOAD_CHUNK_SIZE, retries=DOWNLOAD_RETRIES,
+                         timeout=DOWNLOAD_TIMEOUT, backoff=1.0):
+    """Download url to path, resuming with HTTP Range requests after dropped connections.
+    
+    Data goes to path + ".part", which survives interruptions so a later
+    call (or the next retry) continues where the last one stopped. The file
+    is hashed as it is written; if sha256 is given and does not match, the
+    partial file is deleted and ValueError raised. The finished file is moved
+    to path. Retries wait backoff seconds, doubling each time up to a minute.
+    """
+    # urllib and http.client are imported here as they are slow to import
+    import http.client
+    import urllib.error
+    
+    # Failures that leave a usable partial file, so the download resumes rather than restarts
+    retryable_errors = (ConnectionError, TimeoutError, http.client.IncompleteRead, urllib.error.URLError)
+    
+    part_path = f"{path}.part"
+    if not os.path.exists(part_path):
+        open(part_path, 'wb').close()
+    digest = _sha256_of(part_path, chunk_size)
+    
+    last_report = [0.0]
+    def progress(done, total):
+        now = time.time()
+        if now - last_report[0] >= PROGRESS_INTERVAL:
+            last_report[0] = now
+            if total:
+                print(f"Downloaded {done / 2**20:,.1f} of {total / 2**20:,.1f} MB ({done / total:.1%})")
+            else:
+                print(f"Downloaded {done / 2**20:,.1f} MB")
+    
+    if os.path.getsize(part_path):
+        print(f"Resuming download of {url} at {os.path.getsize(part_path):,} bytes")
+    else:
+        print(f"Downloading from {url}...")
+    
+    attempt = 0
+    while True:
+        try:
+            total, digest = _fetch_into(url, part_path, digest, chunk_size, timeout, progress)
+            size = os.path.getsize(part_path)
+            if total is not None and size < total:
+                raise http.client.IncompleteRead(b"", total - size)
+            break
+        except retryable_errors as e:
+            # HTTP errors other than dropped connections will not go away on retry
+            if isinstance(e, urllib.error.HTTPError) and e.code < 500:
+                raise
+            attempt += 1
+            if attempt > retries:
+                raise
+            delay = min(backoff * 2 ** (attempt - 1), 60)
+            print(f"Download interrupted at {os.path.getsize(part_path):,} bytes ({e!r}); "
+                  f"retrying in {delay:g} seconds ({attempt}/{retries})")
+            time.sleep(delay)
+    
+    checksum = digest.hexdigest()
+    if sha256 and checksum != sha256.lower():
+        os.remove(part_path)
+        raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {checksum}")
+    print(f"Downloaded {os.path.getsize(part_path):,} bytes, SHA-256 {checksum}")
+    
+    os.replace(part_path, path)
+    return path
+
+def extract_member(zip_path, member, output_path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Stream one zip member straight to output_path.
+    
+    The member is decompressed in chunks into a temporary file next to
+    output_path and renamed into place, so a failed extraction never leaves a
+    truncated dataset. zipfile checks the member's CRC-32 as it is read.
+    """
+    import zipfile
+    
+    tmp_path = f"{output_path}.tmp"
+    with zipfile.ZipFile(zip_path) as archive, archive.open(member) as source, open(tmp_path, 'wb') as target:
+        shutil.copyfileobj(source, target, chunk_size)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+@instrumented()
+def download_text8(url=TEXT8_DATASET_URL, sha256=TEXT8_SHA256):
     """Download the text8 dataset from the web"""
     ensure_directories()
     
     zip_path = os.path.join(DATA_DIR, "text8.zip")
-    original_file = os.path.join(DATA_DIR, "text8")  # File name in the zip archive
     
     # Skip if already downloaded
     if os.path.exists(TEXT8_DATASET_PATH):
@@ -26,19 +176,13 @@ def download_text8():
         print(f"Size: {os.path.getsize(TEXT8_DATASET_PATH) / (1024 * 1024):.2f} MB")
         return TEXT8_DATASET_PATH
     
-    # Download the zip file
+    # Download the zip file, resuming a previous partial download
     if not os.path.exists(zip_path):
-        print(f"Downloading from {TEXT8_DATASET_URL}...")
-        urllib.request.urlretrieve(TEXT8_DATASET_URL, zip_path)
+        download_with_resume(url, zip_path, sha256)
     
-    # Extract the zip file
+    # Decompress the text straight to its final path
     print("Extracting...")
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(DATA_DIR)
-    
-    # Rename the extracted file to have .txt extension
-    if os.path.exists(original_file):
-        shutil.move(original_file, TEXT8_DATASET_PATH)
+    extract_member(zip_path, TEXT8_MEMBER, TEXT8_DATASET_PATH)
     
     # Clean up
     os.remove(zip_path)
@@ -49,4 +193,9 @@ def download_text8():
     return TEXT8_DATASET_PATH
 
 if __name__ == "__main__":
-    download_text8() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download and extract the text8 dataset")
+    parser.add_argument("--url", default=TEXT8_DATASET_URL, help="URL of text8.zip")
+    parser.add_argument("--sha256", default=TEXT8_SHA256, help="Expected SHA-256 of the zip file")
+    args = parser.parse_args()
+    
+    download_text8(args.url, args.sha256)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# Synthetic Hacker News database for exercising the extractor without Postgres
+
+import os
+import sys
+import random
+import sqlite3
+import tempfile
+import argparse
+import subprocess
+
+# Fix import issue by using relative import path
+try:
+    from src.download.download_hacker_news import (
+        fetch_data_in_batches, fetch_data_in_parallel, checkpoint_path_for, manifest_path_for
+    )
+    from src.download.hacker_news_io import read_hacker_news_columns
+except ModuleNotFoundError:
+    # When running as a script directly
+    from download_hacker_news import (
+        fetch_data_in_batches, fetch_data_in_parallel, checkpoint_path_for, manifest_path_for
+    )
+    from hacker_news_io import read_hacker_news_columns
+
+WORDS = ["show", "hn", "ask", "rust", "python", "startup", "database", "the", "a", "of",
+         "launch", "why", "how", "new", "open", "source", "ai", "web", "linux", "release"]
+
+def create_fake_hacker_news_db(path, num_items=5000, num_users=300, seed=0):
+    """Create a SQLite database with synthetic items and users tables.
+    
+    Ids are shuffled and gapped, and the items include comments, jobs and
+    stories without titles, so the extractor's filters and ordering matter.
+    """
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE items (id INTEGER PRIMARY KEY, type TEXT, title TEXT, score INTEGER,
+                    time INTEGER, url TEXT, text TEXT, by TEXT, descendants INTEGER)""")
+    conn.execute("CREATE TABLE users (id TEXT PRIMARY KEY, created INTEGER, karma INTEGER, about TEXT)")
+    
+    users = [f"user{i}" for i in range(num_users)]
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?)", [
+        (user, 1160000000 + rng.randrange(10**8), rng.randrange(50000),
+         rng.choice([None, "hacker, \"builder\"\nand writer", "about me"]))
+        for user in users
+    ])
+    
+    ids = rng.sample(range(1, num_items * 3), num_items)
+    items = []
+    for item_id in ids:
+        item_type = rng.choices(["story", "comment", "job"], weights=[6, 3, 1])[0]
+        title = " ".join(rng.choices(WORDS, k=rng.randint(1, 8))).capitalize()
+        if rng.random() < 0.05:
+            title = None
+        items.append((
+            item_id, item_type, title, rng.randrange(500), 1160000000 + item_id,
+            rng.choice([None, f"https://example.com/{item_id}"]),
+            rng.choice([None, "Some, text with\nnewlines"]),
+            rng.choice(users + ["deleted_user"]), rng.randrange(200),
+        ))
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", items)
+    conn.commit()
+    conn.close()
+    
+    return path
+
+def get_fake_db_engine(path):
+    """Create an engine on which the extractor's hacker_news.* queries run against path."""
+    from sqlalchemy import create_engine, event
+    
+    # Connections are opened by extraction worker threads and closed by the caller
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+    
+    @event.listens_for(engine, "connect")
+    def attach_hacker_news(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"ATTACH DATABASE '{path}' AS hacker_news")
+    
+    return engine
+
+def check_extraction(num_items=5000, batch_size=257, seed=0):
+    """Run the extractor against a fake database, including an interrupted run.
+    
+    A run stopped after a few batches, with a half-written batch left at the
+    end of the file, must resume to exactly the same CSV as an uninterrupted run,
+    and a parallel partitioned run must produce the same rows.
+    """
+    import pandas as pd
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = create_fake_hacker_news_db(os.path.join(tmp_dir, "hn.db"), num_items, seed=seed)
+        engine = get_fake_db_engine(db_path)
+        
+        conn = sqlite3.connect(db_path)
+        expected_rows = conn.execute(
+            "SELECT COUNT(*) FROM items WHERE type = 'story' AND title IS NOT NULL").fetchone()[0]
+        conn.close()
+        
+        full_path = os.path.join(tmp_dir, "full.csv")
+        total_rows = fetch_data_in_batches(full_path, batch_size=batch_size, engine=engine)
+        assert total_rows == expected_rows, f"Fetched {total_rows} rows, expected {expected_rows}"
+        
+        resumed_path = os.path.join(tmp_dir, "resumed.csv")
+        fetch_data_in_batches(resumed_path, batch_size=batch_size, max_batches=3, engine=engine)
+        with open(resumed_path, 'a', encoding='utf-8') as f:
+            f.write("12345,story,Half written")
+        total_rows = fetch_data_in_batches(resumed_path, batch_size=batch_size, engine=engine)
+        assert total_rows == expected_rows, f"Resumed run reported {total_rows} rows, expected {expected_rows}"
+        
+        with open(full_path, 'rb') as full, open(resumed_path, 'rb') as resumed:
+            assert full.read() == resumed.read(), "Resumed output differs from an uninterrupted run"
+        
+        # A finished checkpoint makes a rerun a no-op that only picks up new items
+        assert fetch_data_in_batches(resumed_path, batch_size=batch_size, engine=engine) == expected_rows
+        assert os.path.exists(checkpoint_path_for(resumed_path))
+        
+        # Parallel partitions merged in id order hold the same rows as the serial run
+        parallel_path = os.path.join(tmp_dir, "parallel.csv")
+        total_rows = fetch_data_in_parallel(parallel_path, batch_size=batch_size, num_partitions=7,
+                                            concurrency=3, engine=engine)
+        assert total_rows == expected_rows, f"Parallel run fetched {total_rows} rows, expected {expected_rows}"
+        pd.testing.assert_frame_equal(pd.read_csv(full_path), pd.read_csv(parallel_path))
+        
+        manifest_path = os.path.join(tmp_dir, "manifest.csv")
+        fetch_data_in_parallel(manifest_path, batch_size=batch_size, num_partitions=5,
+                               concurrency=2, merge=False, engine=engine)
+        assert os.path.exists(manifest_path_for(manifest_path))
+        
+        # Parquet output stopped early, with an unfinished part file left behind, resumes to the same rows
+        parquet_path = os.path.join(tmp_dir, "dump.parquet")
+        fetch_data_in_batches(parquet_path, batch_size=batch_size, max_batches=4, engine=engine,
+                              output_format="parquet", parquet_file_rows=batch_size * 3)
+        with open(os.path.join(parquet_path, "part-00099.parquet"), 'wb') as f:
+            f.write(b"PAR1 unfinished")
+        total_rows = fetch_data_in_batches(parquet_path, batch_size=batch_size, engine=engine,
+                                           output_format="parquet")
+        assert total_rows == expected_rows, f"Parquet run fetched {total_rows} rows, expected {expected_rows}"
+        expected = pd.read_csv(full_path)
+        titles = read_hacker_news_columns(["item_id", "title"], parquet_path)
+        assert list(titles.columns) == ["item_id", "title"]
+        assert titles["item_id"].tolist() == expected["item_id"].tolist()
+        assert titles["title"].tolist() == expected["title"].tolist()
+        
+        engine.dispose()
+    
+    print(f"Extraction check passed: {expected_rows} stories, batch size {batch_size}")
+    return expected_rows
+
+def run_check_in_child(argv):
+    """Run this check in a child process whose configured paths, the run report included, are temporary.
+    
+    The extractor is instrumented and creates DATA_DIR, and paths are fixed
+    when the config is first imported, so they are set in the child's
+    environment, as for the benchmarks.
+    """
+    try:
+        from src.benchmarks import workdir_environment
+    except ModuleNotFoundError:
+        from benchmarks import workdir_environment
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = workdir_environment(tmp_dir)
+        process = subprocess.run([sys.executable, "-m", "src.download.fake_hacker_news_db", "--child", *argv],
+                                 env=env)
+    return process.returncode
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the Hacker News extractor against a synthetic database")
+    parser.add_argument("--items", type=int, default=5000, help="Number of synthetic items")
+    parser.add_argument("--batch-size", type=int, default=257, help="Extraction batch size")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if not args.child:
+        sys.exit(run_check_in_child(sys.argv[1:]))
+    check_extraction(args.items, args.batch_size, args.seed)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# Local HTTP stand-in for the text8 host that can drop connections, for exercising the downloader offline
+
+import os
+import random
+import zipfile
+import hashlib
+import tempfile
+import argparse
+import threading
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Fix import issue by using relative import path
+try:
+    from src.download.download_text8 import download_with_resume, extract_member, TEXT8_MEMBER
+except ModuleNotFoundError:
+    # When running as a script directly
+    from download_text8 import download_with_resume, extract_member, TEXT8_MEMBER
+
+class FlakyRangeHandler(BaseHTTPRequestHandler):
+    """Serves the server's payload with Range support, cutting off the first few responses.
+    
+    Each of the first server.drops responses advertises the full length but
+    closes the connection after server.drop_after bytes, as a flaky link
+    would. With server.ranges False, Range headers are ignored.
+    """
+    
+    def do_GET(self):
+        payload = self.server.payload
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.server.ranges:
+            start = int(range_header.split("=", 1)[1].split("-", 1)[0])
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(payload)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(200)
+        body = payload[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "application/zip")
+        self.end_headers()
+        
+        with self.server.lock:
+            self.server.requests += 1
+            drop = self.server.drops > 0
+            self.server.drops -= drop
+        if drop:
+            self.wfile.write(body[:self.server.drop_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_server(payload, drops=0, drop_after=65536, ranges=True):
+    """Serve payload on a free localhost port in a background thread; returns (server, url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyRangeHandler)
+    server.payload = payload
+    server.drops = drops
+    server.drop_after = drop_after
+    server.ranges = ranges
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/text8.zip"
+
+def make_text8_zip(num_words=200000, seed=0):
+    """A zip holding a text8-like member, returned as (zip bytes, member text)."""
+    rng = random.Random(seed)
+    words = ["anarchism", "originated", "as", "a", "term", "of", "abuse", "first", "used", "against",
+             "early", "working", "class", "radicals", "including", "the", "diggers", "english", "revolution"]
+    text = " " + " ".join(rng.choice(words) for _ in range(num_words))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        zip_path = os.path.join(tmp_dir, "text8.zip")
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(TEXT8_MEMBER, text)
+        with open(zip_path, 'rb') as f:
+            return f.read(), text
+
+def check_download(num_words=200000, drops=3, seed=0):
+    """Download through dropped connections and check the result byte for byte.
+    
+    Covers retries within one call, a call that gives up and a later call
+    that resumes its partial file, a server without Range support, and a
+    checksum mismatch.
+    """
+    payload, text = make_text8_zip(num_words, seed)
+    sha256 = hashlib.sha256(payload).hexdigest()
+    drop_after = max(len(payload) // (drops + 2), 1)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        zip_path = os.path.join(tmp_dir, "text8.zip")
+        text_path = os.path.join(tmp_dir, "text8")
+        
+        # Dropped connections are resumed within one call, each from where the last stopped
+        server, url = start_server(payload, drops=drops, drop_after=drop_after)
+        download_with_resume(url, zip_path, sha256, chunk_size=4096, backoff=0)
+        assert server.requests == drops + 1, f"Expected {drops + 1} requests, got {server.requests}"
+        extract_member(zip_path, TEXT8_MEMBER, text_path)
+        with open(text_path, 'r', encoding='utf-8') as f:
+            assert f.read() == text, "Extracted text differs from the archived member"
+        server.shutdown()
+        os.remove(zip_path)
+        
+        # A call that runs out of retries leaves its partial file for the next call
+        server, url = start_server(payload, drops=2, drop_after=drop_after)
+        try:
+            download_with_resume(url, zip_path, sha256, chunk_size=4096, retries=0)
+            raise AssertionError("Download without retries should have failed")
+        except http.client.IncompleteRead:
+            pass
+        partial = os.path.getsize(f"{zip_path}.part")
+        assert 0 < partial < len(payload), f"Partial file has {partial} bytes"
+        download_with_resume(url, zip_path, sha256, chunk_size=4096, backoff=0)
+        with open(zip_path, 'rb') as f:
+            assert f.read() == payload, "Resumed download differs from the payload"
+        server.shutdown()
+        os.remove(zip_path)
+        
+        # Without Range support the download restarts and still ends up whole
+        server, url = start_server(payload, drops=1, drop_after=drop_after, ranges=False)
+        download_with_resume(url, zip_path, sha256, chunk_size=4096, backoff=0)
+        with open(zip_path, 'rb') as f:
+            assert f.read() == payload, "Restarted download differs from the payload"
+        server.shutdown()
+        os.remove(zip_path)
+        
+        # A wrong checksum is an error and the bad file is not kept
+        server, url = start_server(payload)
+        try:
+            download_with_resume(url, zip_path, "0" * 64, chunk_size=4096)
+            raise AssertionError("Checksum mismatch was not detected")
+        except ValueError:
+            pass
+        assert not os.path.exists(zip_path) and not os.path.exists(f"{zip_path}.part")
+        server.shutdown()
+    
+    print(f"Download check passed: {len(payload):,} byte archive, {drops} dropped connections")
+    return len(payload)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the text8 downloader against a flaky local server")
+    parser.add_argument("--words", type=int, default=200000, help="Words in the synthetic text8 member")
+    parser.add_argument("--drops", type=int, default=3, help="Connections dropped before a full response")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    
+    check_download(args.words, args.drops, args.seed)
@@ -2,22 +2,28 @@
 # Extract and concatenate titles from the Hacker News dataset
 
 import os
-import pandas as pd
 import re
 import string
+import argparse
+from collections import deque
+from contextlib import nullcontext
 
 # Fix import issue by using relative import path
 try:
     from src.config import (
-        DATA_DIR, HACKER_NEWS_DATASET_PATH, HACKER_NEWS_TITLES_PATH, 
-        CHUNK_SIZE, ensure_directories
+        DATA_DIR, HACKER_NEWS_TITLES_PATH,
+        TITLE_DEDUP_PATH, CHUNK_SIZE, CLEAN_WORKERS, ensure_directories
     )
+    from src.download.hacker_news_io import hacker_news_dataset_path, iter_hacker_news_chunks
+    from src.instrumentation import instrumented, increment
 except ModuleNotFoundError:
     # When running as a script directly
     from config import (
-        DATA_DIR, HACKER_NEWS_DATASET_PATH, HACKER_NEWS_TITLES_PATH, 
-        CHUNK_SIZE, ensure_directories
+        DATA_DIR, HACKER_NEWS_TITLES_PATH,
+        TITLE_DEDUP_PATH, CHUNK_SIZE, CLEAN_WORKERS, ensure_directories
     )
+    from hacker_news_io import hacker_news_dataset_path, iter_hacker_news_chunks
+    from instrumentation import instrumented, increment
 
 def clean_title(title):
     """Clean and normalize a title string."""
@@ -41,48 +47,116 @@ def clean_title(title):
     
     return title
 
-def get_hacker_news_titles():
-    """Extract and concatenate titles from the Hacker News dataset."""
+# Precompiled patterns for clean_titles(). Replacing punctuation with spaces and
+# then collapsing whitespace runs is the same as collapsing runs of non-word
+# characters, since whitespace is never a word character.
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+NON_WORD_PATTERN = re.compile(r'\W+')
+
+def clean_titles(titles):
+    """Clean a Series of titles in one pass with precompiled patterns.
+    
+    The result matches titles.apply(clean_title) exactly, including "" for
+    non-string values, at about twice the speed.
+    """
+    import pandas as pd
+    
+    cleaned = [NON_WORD_PATTERN.sub(' ', URL_PATTERN.sub('', title.lower())).strip()
+               if isinstance(title, str) else ""
+               for title in titles.tolist()]
+    return pd.Series(cleaned, index=titles.index, dtype=object)
+
+def clean_title_chunk(titles):
+    """Clean one chunk of titles and return the non-empty results as a list."""
+    # Missing titles clean to "" and are dropped with the other empty ones
+    return [title for title in clean_titles(titles).tolist() if title]
+
+def imap_bounded(executor, fn, iterable, max_pending):
+    """Like executor.map, in order, but with at most max_pending tasks in flight."""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+@instrumented()
+def get_hacker_news_titles(workers=CLEAN_WORKERS):
+    """Extract and concatenate titles from the Hacker News dataset.
+    
+    Titles are cleaned chunk by chunk, in a process pool when workers > 1,
+    and streamed straight to the output file in their original order.
+    Duplicates of earlier titles are dropped as configured (DEDUP_EXACT,
+    DEDUP_NEAR_THRESHOLD) in this process, so the result does not depend on
+    the number of workers; the hash sets are then saved for later ingests.
+    """
+    # Imported here as numpy would slow down the start of every titles command
+    try:
+        from src.dedup import TitleDeduplicator
+    except ModuleNotFoundError:
+        from dedup import TitleDeduplicator
+    
     ensure_directories()
     
-    if not os.path.exists(HACKER_NEWS_DATASET_PATH):
-        print(f"Error: Hacker News dataset not found at {HACKER_NEWS_DATASET_PATH}")
+    dataset_path = hacker_news_dataset_path()
+    if not os.path.exists(dataset_path):
+        print(f"Error: Hacker News dataset not found at {dataset_path}")
         return
     
-    print(f"Loading Hacker News dataset from {HACKER_NEWS_DATASET_PATH}")
-    print(f"Processing in chunks of {CHUNK_SIZE:,} rows")
+    print(f"Loading Hacker News dataset from {dataset_path}")
+    print(f"Processing in chunks of {CHUNK_SIZE:,} rows with {workers} worker(s)")
     
-    # Read the CSV file in chunks to handle large files efficiently
-    all_titles = []
+    # Read only the title column in chunks to handle large files efficiently
+    chunks = (chunk['title'] for chunk in
+              iter_hacker_news_chunks(columns=['title'], path=dataset_path, chunk_size=CHUNK_SIZE))
     total_rows = 0
+    total_chars = 0
+    deduplicator = TitleDeduplicator()
     
-    for chunk in pd.read_csv(HACKER_NEWS_DATASET_PATH, chunksize=CHUNK_SIZE):
-        # Filter to keep only rows with a title
-        chunk = chunk[chunk['title'].notna()]
-        
-        # Clean titles
-        chunk['clean_title'] = chunk['title'].apply(clean_title)
-        
-        # Filter out empty titles after cleaning
-        chunk = chunk[chunk['clean_title'].str.len() > 0]
-        
-        all_titles.extend(chunk['clean_title'].tolist())
-        total_rows += len(chunk)
-        print(f"Processed {total_rows:,} titles so far...")
+    if workers > 1:
+        # Imported here as it is slow to import and single-worker runs do not need it
+        from concurrent.futures import ProcessPoolExecutor
     
-    # Join all titles with spaces
-    combined_text = ' '.join(all_titles)
-    
-    # Save to file
-    with open(HACKER_NEWS_TITLES_PATH, 'w', encoding='utf-8') as f:
-        f.write(combined_text)
+    with open(HACKER_NEWS_TITLES_PATH, 'w', encoding='utf-8') as f, \
+            ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+        if executor is None:
+            cleaned_chunks = map(clean_title_chunk, chunks)
+        else:
+            cleaned_chunks = imap_bounded(executor, clean_title_chunk, chunks, workers * 2)
+        
+        for titles in cleaned_chunks:
+            titles = deduplicator.filter(titles)
+            if not titles:
+                continue
+            
+            # Titles are joined with spaces, as one ' '.join over all of them would
+            text = ' '.join(titles)
+            if total_rows:
+                text = ' ' + text
+            f.write(text)
+            
+            total_rows += len(titles)
+            total_chars += len(text)
+            increment("titles", len(titles))
+            increment("characters", len(text))
+            print(f"Processed {total_rows:,} titles so far...")
     
     # Print some statistics
-    print(f"\nExtracted {len(all_titles):,} non-empty titles")
-    print(f"Total characters: {len(combined_text):,}")
+    print(f"\nExtracted {total_rows:,} non-empty titles")
+    print(f"Total characters: {total_chars:,}")
     print(f"Saved concatenated titles to {HACKER_NEWS_TITLES_PATH}")
+    if deduplicator.enabled:
+        print(deduplicator.report())
+        increment("duplicates_removed", deduplicator.removed["exact"] + deduplicator.removed["near"])
+        print(f"Saved title hash sets to {deduplicator.save(TITLE_DEDUP_PATH)}")
     
     return HACKER_NEWS_TITLES_PATH
 
 if __name__ == "__main__":
-    get_hacker_news_titles() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extract and clean Hacker News titles")
+    parser.add_argument("--workers", type=int, default=CLEAN_WORKERS,
+                        help="Number of processes used to clean titles")
+    args = parser.parse_args()
+    
+    get_hacker_news_titles(workers=args.workers)
\ No newline at end of file
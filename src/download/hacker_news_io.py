@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# Writers and column-projecting readers for the Hacker News dump (CSV or Parquet)
+
+import os
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        HACKER_NEWS_DATASET_PATH, HACKER_NEWS_PARQUET_PATH, HACKER_NEWS_FORMAT,
+        PARQUET_FILE_ROWS, PARQUET_COMPRESSION, CHUNK_SIZE
+    )
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        HACKER_NEWS_DATASET_PATH, HACKER_NEWS_PARQUET_PATH, HACKER_NEWS_FORMAT,
+        PARQUET_FILE_ROWS, PARQUET_COMPRESSION, CHUNK_SIZE
+    )
+
+def hacker_news_dataset_path(output_format=HACKER_NEWS_FORMAT):
+    """Path of the Hacker News dump for the configured format."""
+    if output_format == "parquet":
+        return HACKER_NEWS_PARQUET_PATH
+    if output_format == "csv":
+        return HACKER_NEWS_DATASET_PATH
+    raise ValueError(f"Unknown Hacker News dataset format: {output_format}")
+
+class CsvBatchWriter:
+    """Append DataFrame batches to a single CSV file.
+    
+    Every batch is durable once written, and the checkpoint state is the
+    file offset after the last batch.
+    """
+    
+    def __init__(self, path, checkpoint=None):
+        self.path = path
+        if checkpoint is not None:
+            # Drop anything written after the last checkpoint, such as a partial batch
+            with open(path, 'r+b') as f:
+                f.truncate(checkpoint["file_offset"])
+            self.file_offset = checkpoint["file_offset"]
+            self._header = False
+        else:
+            self.file_offset = 0
+            self._header = True
+        self._file = open(path, 'a' if checkpoint is not None else 'w', newline='', encoding='utf-8')
+    
+    def write(self, batch_df):
+        """Write one batch and return True, as it is immediately durable."""
+        batch_df.to_csv(self._file, header=self._header, index=False)
+        self._file.flush()
+        self._header = False  # Don't write header for subsequent batches
+        self.file_offset = self._file.tell()
+        return True
+    
+    def discard_partial(self):
+        """Discard anything written since the last durable batch."""
+        self._file.seek(self.file_offset)
+        self._file.truncate()
+    
+    def state(self):
+        return {"file_offset": self.file_offset}
+    
+    def close(self):
+        self._file.close()
+
+class ParquetBatchWriter:
+    """Write DataFrame batches to a directory of zstd-compressed Parquet files.
+    
+    Each batch becomes one row group, and a new part file is started every
+    rows_per_file rows. A part file is only durable once closed, so the
+    checkpoint state lists completed files; files not listed there, such as
+    the one a crashed run was writing, are removed when resuming.
+    """
+    
+    def __init__(self, path, checkpoint=None, rows_per_file=PARQUET_FILE_ROWS, compression=PARQUET_COMPRESSION):
+        import pyarrow.parquet as pq
+        
+        self.path = path
+        self.rows_per_file = rows_per_file
+        self.compression = compression
+        self.files = list(checkpoint["files"]) if checkpoint is not None else []
+        
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.endswith(".parquet") and name not in self.files:
+                os.remove(os.path.join(path, name))
+        
+        # Later batches are converted to the schema of the first one
+        self.schema = pq.read_schema(os.path.join(path, self.files[0])) if self.files else None
+        self._writer = None
+        self._rows_in_file = 0
+    
+    def _infer_schema(self, batch_df):
+        import pyarrow as pa
+        
+        schema = pa.Schema.from_pandas(batch_df, preserve_index=False)
+        # Columns that are entirely null in the first batch hold text in the dump
+        for i, field in enumerate(schema):
+            if pa.types.is_null(field.type):
+                schema = schema.set(i, field.with_type(pa.string()))
+        return schema
+    
+    def write(self, batch_df):
+        """Write one batch as a row group and return True if it closed a part file."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        if self.schema is None:
+            self.schema = self._infer_schema(batch_df)
+        table = pa.Table.from_pandas(batch_df, schema=self.schema, preserve_index=False)
+        
+        if self._writer is None:
+            self._current_file = f"part-{len(self.files):05d}.parquet"
+            self._writer = pq.ParquetWriter(os.path.join(self.path, self._current_file),
+                                            self.schema, compression=self.compression)
+        self._writer.write_table(table, row_group_size=len(batch_df))
+        self._rows_in_file += len(batch_df)
+        
+        if self._rows_in_file >= self.rows_per_file:
+            self._close_file()
+            return True
+        return False
+    
+    def _close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+            self.files.append(self._current_file)
+            self._writer = None
+            self._rows_in_file = 0
+    
+    def discard_partial(self):
+        """Nothing to do: unfinished part files are dropped when resuming."""
+    
+    def state(self):
+        return {"files": list(self.files)}
+    
+    def close(self):
+        self._close_file()
+
+def open_batch_writer(path, output_format=HACKER_NEWS_FORMAT, checkpoint=None, parquet_file_rows=PARQUET_FILE_ROWS):
+    """Create the batch writer for an output format."""
+    if output_format == "parquet":
+        return ParquetBatchWriter(path, checkpoint, rows_per_file=parquet_file_rows)
+    if output_format == "csv":
+        return CsvBatchWriter(path, checkpoint)
+    raise ValueError(f"Unknown Hacker News dataset format: {output_format}")
+
+def parquet_files(path):
+    """Part files of a Parquet dataset directory in order."""
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".parquet"))
+
+def iter_hacker_news_chunks(columns=None, path=None, chunk_size=CHUNK_SIZE, since=None):
+    """Yield DataFrame chunks of the Hacker News dump holding only the given columns.
+    
+    A directory is read as a Parquet dataset, touching only the requested
+    column chunks; anything else is read as CSV with usecols. With since set
+    to an extraction checkpoint, only rows written after it are read: CSV
+    from its file offset on, Parquet from the part files it does not list.
+    """
+    path = path or hacker_news_dataset_path()
+    
+    if os.path.isdir(path):
+        import pyarrow.parquet as pq
+        
+        done = set(since["files"]) if since is not None else set()
+        for part_file in parquet_files(path):
+            if os.path.basename(part_file) in done:
+                continue
+            for batch in pq.ParquetFile(part_file).iter_batches(batch_size=chunk_size, columns=columns):
+                yield batch.to_pandas()
+    elif since is not None:
+        import pandas as pd
+        
+        with open(path, 'rb') as f:
+            header = pd.read_csv(f, nrows=0).columns.tolist()
+            if since["file_offset"] >= os.path.getsize(path):
+                return
+            # Checkpoint offsets fall between rows, so parsing can start there with the header's names
+            f.seek(since["file_offset"])
+            yield from pd.read_csv(f, header=None, names=header, usecols=columns, chunksize=chunk_size)
+    else:
+        import pandas as pd
+        
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=columns)
+
+def read_hacker_news_columns(columns=None, path=None):
+    """Read the given columns of the whole Hacker News dump into one DataFrame."""
+    import pandas as pd
+    
+    path = path or hacker_news_dataset_path()
+    
+    if os.path.isdir(path):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
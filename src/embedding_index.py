@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# Batched nearest-neighbour and analogy queries over trained embeddings
+
+import os
+import time
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        VOCAB_BIN_PATH, WORD2VEC_CHECKPOINT_PATH, EMBEDDINGS_PATH, QUERY_BLOCK_SIZE, RERANK_FACTOR
+    )
+    from src.vocab import load_vocab
+    from src.embeddings import load_embeddings
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        VOCAB_BIN_PATH, WORD2VEC_CHECKPOINT_PATH, EMBEDDINGS_PATH, QUERY_BLOCK_SIZE, RERANK_FACTOR
+    )
+    from vocab import load_vocab
+    from embeddings import load_embeddings
+
+ROW_BLOCK_SIZE = 16384  # Embedding rows quantised or widened from int8 at once
+
+def normalize_rows(vectors):
+    """Unit-length float32 rows; all-zero rows stay zero."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+def quantize_rows(vectors):
+    """Symmetric per-row int8 quantisation: returns (codes, scales) with vectors ~ codes * scales."""
+    scales = np.abs(vectors).max(axis=1, keepdims=True) / 127.0
+    scales = np.maximum(scales, np.finfo(np.float32).tiny).astype(np.float32)
+    codes = np.round(vectors / scales).astype(np.int8)
+    return codes, scales
+
+def top_k(scores, k):
+    """Column indices and values of each row's k largest scores, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores), 0), dtype=np.int64), np.zeros((len(scores), 0), dtype=scores.dtype)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+class EmbeddingIndex:
+    """Top-k cosine search over a pre-normalised embedding matrix.
+    
+    Queries are answered many at a time, block_size queries per matrix
+    product. With quantized=True the matrix is held as int8 codes with
+    per-row scales, a quarter of the memory; candidates found with the
+    codes are re-ranked exactly, rerank_factor times k of them per query,
+    from the vectors passed in, which may be memory-mapped. row_ids gives
+    the vocab id of each row, for exports of only some words; by default
+    row i is vocab id i. search() works in rows, the word methods in words.
+    """
+    
+    def __init__(self, vectors, vocab=None, quantized=False, block_size=QUERY_BLOCK_SIZE,
+                 rerank_factor=RERANK_FACTOR, row_ids=None):
+        self.vocab = vocab
+        self.row_ids = np.arange(len(vectors)) if row_ids is None else np.asarray(row_ids, dtype=np.int64)
+        self.row_of = {int(token_id): row for row, token_id in enumerate(self.row_ids)}
+        self.quantized = quantized
+        self.block_size = block_size
+        self.rerank_factor = rerank_factor
+        if not quantized:
+            self.vectors = normalize_rows(vectors)
+            return
+        
+        # Quantise a block of rows at a time, and re-rank from the source rows
+        # (which may be memory-mapped), so no full float32 copy is ever held
+        self.source = vectors
+        self.norms = np.empty(len(vectors), dtype=np.float32)
+        self.codes = np.empty(vectors.shape, dtype=np.int8)
+        self.scales = np.empty((len(vectors), 1), dtype=np.float32)
+        for start in range(0, len(vectors), ROW_BLOCK_SIZE):
+            rows = np.asarray(vectors[start:start + ROW_BLOCK_SIZE], dtype=np.float32)
+            self.norms[start:start + len(rows)] = np.linalg.norm(rows, axis=1)
+            self.codes[start:start + len(rows)], self.scales[start:start + len(rows)] = \
+                quantize_rows(normalize_rows(rows))
+    
+    @classmethod
+    def from_checkpoint(cls, checkpoint_path=WORD2VEC_CHECKPOINT_PATH, vocab_path=VOCAB_BIN_PATH, **kwargs):
+        """Index the input embeddings of a trained word2vec checkpoint, without the unk row."""
+        import torch
+        checkpoint = torch.load(checkpoint_path, map_location="cpu")
+        vocab = load_vocab(vocab_path)
+        vectors = checkpoint["in_embed"][:len(vocab)].numpy()
+        return cls(vectors, vocab, **kwargs)
+    
+    @classmethod
+    def from_embeddings(cls, path=EMBEDDINGS_PATH, vocab_path=VOCAB_BIN_PATH, **kwargs):
+        """Index an exported embeddings file; quantized indexes re-rank from its memory-mapped rows."""
+        vocab = load_vocab(vocab_path)
+        embeddings = load_embeddings(path, vocab)
+        return cls(embeddings.matrix, vocab, row_ids=embeddings.row_ids, **kwargs)
+    
+    def __len__(self):
+        return len(self.codes) if self.quantized else len(self.vectors)
+    
+    @property
+    def dim(self):
+        return (self.codes if self.quantized else self.vectors).shape[1]
+    
+    def rows(self, ids):
+        """Unit-length float32 vectors of the given rows."""
+        if not self.quantized:
+            return self.vectors[ids]
+        rows = np.asarray(self.source[ids], dtype=np.float32)
+        return rows / np.maximum(self.norms[ids], np.finfo(np.float32).tiny)[..., None]
+    
+    def _ids(self, words):
+        """Rows of the given words."""
+        rows = np.array([self.row_of.get(self.vocab.token_to_id(word), -1) for word in words], dtype=np.int64)
+        missing = [word for word, row in zip(words, rows) if row < 0]
+        if missing:
+            raise KeyError(f"Not in the vocabulary: {', '.join(missing)}")
+        return rows
+    
+    def _words(self, rows, scores):
+        """(word, score) lists for search() results."""
+        return [[(self.vocab.id_to_token(int(self.row_ids[row])), float(score))
+                 for row, score in zip(query_rows, query_scores)]
+                for query_rows, query_scores in zip(rows, scores)]
+    
+    def _scores(self, queries):
+        """Approximate (int8) or exact cosine scores of a block of unit queries against every row."""
+        if not self.quantized:
+            return queries @ self.vectors.T
+        # NumPy has no int8 matrix product, so widen the codes a block of rows at a time
+        scores = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), ROW_BLOCK_SIZE):
+            codes = self.codes[start:start + ROW_BLOCK_SIZE]
+            scores[:, start:start + len(codes)] = \
+                (queries @ codes.T.astype(np.float32)) * self.scales[start:start + len(codes)].T
+        return scores
+    
+    def search(self, queries, k=10, exclude=None):
+        """Top-k rows and cosine scores for each query vector.
+        
+        exclude is an optional (num_queries, m) row array to leave out of each
+        query's results, such as the query words themselves; -1 entries are
+        ignored.
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        num_extra = 0 if exclude is None else exclude.shape[1]
+        candidates_k = k + num_extra
+        if self.quantized:
+            candidates_k = candidates_k * self.rerank_factor
+        
+        ids = np.zeros((len(queries), min(k, len(self))), dtype=np.int64)
+        scores = np.zeros(ids.shape, dtype=np.float32)
+        for start in range(0, len(queries), self.block_size):
+            block = queries[start:start + self.block_size]
+            block_ids, block_scores = top_k(self._scores(block), candidates_k)
+            
+            if self.quantized:
+                # Re-rank the int8 candidates with exact dot products
+                block_scores = np.einsum('qd,qkd->qk', block, self.rows(block_ids))
+                order = np.argsort(-block_scores, axis=1, kind='stable')
+                block_ids = np.take_along_axis(block_ids, order, axis=1)
+                block_scores = np.take_along_axis(block_scores, order, axis=1)
+            
+            if exclude is not None:
+                excluded = (block_ids[:, :, None] == exclude[start:start + self.block_size, None, :]).any(axis=2)
+                # Stable sort moves excluded candidates to the end, keeping score order
+                order = np.argsort(excluded, axis=1, kind='stable')
+                block_ids = np.take_along_axis(block_ids, order, axis=1)
+                block_scores = np.take_along_axis(block_scores, order, axis=1)
+            
+            ids[start:start + len(block)] = block_ids[:, :ids.shape[1]]
+            scores[start:start + len(block)] = block_scores[:, :ids.shape[1]]
+        return ids, scores
+    
+    def most_similar(self, words, k=10):
+        """The k nearest words to each of a list of words, as lists of (word, score)."""
+        ids = self._ids(words)
+        neighbour_ids, scores = self.search(self.rows(ids), k, exclude=ids[:, None])
+        return self._words(neighbour_ids, scores)
+    
+    def analogy(self, questions, k=1):
+        """Answer "a is to b as c is to ?" for a list of (a, b, c) with 3CosAdd, excluding a, b and c."""
+        ids = self._ids([word for question in questions for word in question]).reshape(-1, 3)
+        queries = self.rows(ids[:, 1]) - self.rows(ids[:, 0]) + self.rows(ids[:, 2])
+        answer_ids, scores = self.search(queries, k, exclude=ids)
+        return self._words(answer_ids, scores)
+
+def benchmark(index, num_queries=1000, k=10, rerank_factors=(1, 2, 4, 8), seed=0):
+    """Compare recall@k and latency of int8 search against exact search on random vocabulary queries."""
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(index), size=min(num_queries, len(index)), replace=False)
+    source = index.source if index.quantized else index.vectors
+    queries = index.rows(query_ids)
+    exclude = query_ids[:, None]
+    
+    exact = EmbeddingIndex(source, index.vocab, block_size=index.block_size, row_ids=index.row_ids)
+    start = time.time()
+    exact_ids, _ = exact.search(queries, k, exclude)
+    exact_seconds = time.time() - start
+    print(f"{len(queries):,} queries, top {k}, {len(index):,} x {index.dim} matrix")
+    print(f"exact float32: recall 1.0000, {exact_seconds / len(queries) * 1000:.3f} ms/query, "
+          f"{exact.vectors.nbytes / 2**20:.1f} MB")
+    
+    quantized = EmbeddingIndex(source, index.vocab, quantized=True, block_size=index.block_size,
+                               row_ids=index.row_ids)
+    results = {"exact": (1.0, exact_seconds / len(queries))}
+    for factor in rerank_factors:
+        quantized.rerank_factor = factor
+        start = time.time()
+        ids, _ = quantized.search(queries, k, exclude)
+        seconds = time.time() - start
+        recall = np.mean([len(set(row) & set(exact_row)) / k for row, exact_row in zip(ids, exact_ids)])
+        print(f"int8 rerank x{factor}: recall {recall:.4f}, {seconds / len(queries) * 1000:.3f} ms/query, "
+              f"{(quantized.codes.nbytes + quantized.scales.nbytes) / 2**20:.1f} MB")
+        results[f"int8 x{factor}"] = (recall, seconds / len(queries))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the trained embeddings")
+    parser.add_argument("words", nargs="*", help="Words to find neighbours for")
+    parser.add_argument("--analogy", nargs=3, metavar=("A", "B", "C"), help="Solve A is to B as C is to ?")
+    parser.add_argument("-k", type=int, default=10, help="Number of results per query")
+    parser.add_argument("--quantized", action="store_true", help="Search int8 codes with exact re-ranking")
+    parser.add_argument("--benchmark", action="store_true", help="Report recall and latency of int8 against exact search")
+    args = parser.parse_args()
+    
+    if os.path.exists(EMBEDDINGS_PATH):
+        index = EmbeddingIndex.from_embeddings(quantized=args.quantized)
+    else:
+        index = EmbeddingIndex.from_checkpoint(quantized=args.quantized)
+    
+    for word, neighbours in zip(args.words, index.most_similar(args.words, args.k) if args.words else []):
+        print(f"{word}: " + ", ".join(f"{neighbour} ({score:.3f})" for neighbour, score in neighbours))
+    
+    if args.analogy:
+        answers = index.analogy([tuple(args.analogy)], args.k)[0]
+        print(f"{args.analogy[0]} : {args.analogy[1]} :: {args.analogy[2]} : "
+              + ", ".join(f"{answer} ({score:.3f})" for answer, score in answers))
+    
+    if args.benchmark:
+        benchmark(index, k=args.k)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# Memory-mapped, half-precision embedding matrix tied to the binary vocabulary
+
+import os
+import mmap
+import struct
+import hashlib
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        VOCAB_BIN_PATH, WORD2VEC_CHECKPOINT_PATH, EMBEDDINGS_PATH, EMBEDDING_DTYPE, EMBEDDING_TOP_K
+    )
+    from src.vocab import load_vocab
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        VOCAB_BIN_PATH, WORD2VEC_CHECKPOINT_PATH, EMBEDDINGS_PATH, EMBEDDING_DTYPE, EMBEDDING_TOP_K
+    )
+    from vocab import load_vocab
+
+# Header: magic, version, value item size, dimensions, rows, vocab size, vocab token hash
+HEADER_FORMAT = "<8sIIIIIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b"EMBEDBIN"
+VERSION = 2
+DTYPES = {2: np.dtype(np.float16), 4: np.dtype(np.float32)}
+
+# The matrix starts on a cache line, after the header; the vocab id of each row follows it
+MATRIX_START = 64
+ROW_BLOCK_SIZE = 16384  # Rows converted and written at once
+
+def _row_ids_start(num_rows, dim, itemsize):
+    return (MATRIX_START + num_rows * dim * itemsize + 7) // 8 * 8
+
+def top_k_ids(vocab, top_k=EMBEDDING_TOP_K):
+    """Ids of the top_k most frequent words by their counts, in id order; every id for 0.
+    
+    Ingestion keeps vocab ids stable, so ids are not always in count order
+    and the most frequent words are picked by count rather than by id.
+    """
+    if not top_k or top_k >= len(vocab):
+        return np.arange(len(vocab), dtype=np.uint32)
+    return np.sort(np.argsort(-vocab.counts.astype(np.int64), kind='stable')[:top_k]).astype(np.uint32)
+
+def save_embeddings(vectors, vocab, path=EMBEDDINGS_PATH, dtype=EMBEDDING_DTYPE, top_k=EMBEDDING_TOP_K):
+    """Save the vectors of vocab ids as a row-major matrix readable in place, with the vocab id of each row.
+    
+    Rows after the vocabulary, such as a checkpoint's unk row, are left out.
+    top_k keeps the rows of the k most frequent words; 0 keeps them all.
+    The header records the vocabulary's size and token hash for
+    load_embeddings() to check. The file is written next to path and
+    renamed into place, so replicas that have the old one mapped keep
+    reading it undisturbed.
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in DTYPES.values():
+        raise ValueError(f"Embeddings are stored as float16 or float32, not {dtype.name}")
+    if len(vectors) < len(vocab):
+        raise ValueError(f"{len(vectors):,} embedding rows for a vocabulary of {len(vocab):,} tokens")
+    row_ids = top_k_ids(vocab, top_k)
+    num_rows = len(row_ids)
+    dim = vectors.shape[1]
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, dtype.itemsize, dim, num_rows, len(vocab),
+                            vocab.token_hash()))
+        f.write(b"\0" * (MATRIX_START - HEADER_SIZE))
+        for start in range(0, num_rows, ROW_BLOCK_SIZE):
+            block = vectors[row_ids[start:start + ROW_BLOCK_SIZE]]
+            f.write(np.ascontiguousarray(block, dtype=dtype).tobytes())
+        f.write(b"\0" * (_row_ids_start(num_rows, dim, dtype.itemsize) - f.tell()))
+        f.write(row_ids.tobytes())
+    os.replace(tmp_path, path)
+    
+    print(f"Embeddings saved to {path} ({num_rows:,} x {dim}, {dtype.name})")
+    return path
+
+class Embeddings:
+    """Read-only embedding matrix backed by a memory-mapped embeddings file.
+    
+    matrix is the (rows, dim) float16 or float32 array, mapped straight
+    from the file, so every process serving the same file shares one copy
+    in the page cache and opening it reads only the header and row ids.
+    row_ids holds the vocab id of each row; other ids, including unk_id,
+    have no row.
+    """
+    
+    def __init__(self, path=EMBEDDINGS_PATH, vocab=None):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        if len(self._mmap) < MATRIX_START:
+            raise ValueError(f"{path} is too short to be an embeddings file")
+        magic, version, itemsize, dim, num_rows, vocab_size, vocab_hash = \
+            struct.unpack_from(HEADER_FORMAT, self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} embeddings file")
+        
+        self.dtype = DTYPES[itemsize]
+        self.matrix = np.frombuffer(self._mmap, dtype=self.dtype, count=num_rows * dim,
+                                    offset=MATRIX_START).reshape(num_rows, dim)
+        self.row_ids = np.frombuffer(self._mmap, dtype=np.uint32, count=num_rows,
+                                     offset=_row_ids_start(num_rows, dim, itemsize))
+        # Vocab id -> row, -1 for ids without one; the entry past the vocabulary is unk_id's
+        self._row_of = np.full(vocab_size + 1, -1, dtype=np.int64)
+        self._row_of[self.row_ids] = np.arange(num_rows)
+        self.vocab_size = vocab_size
+        self.vocab_hash = vocab_hash
+        if vocab is not None:
+            self.check_vocab(vocab)
+    
+    def __len__(self):
+        return len(self.matrix)
+    
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+    
+    def check_vocab(self, vocab):
+        """Raise ValueError unless the embeddings were saved for this vocabulary's ids."""
+        if len(vocab) != self.vocab_size or vocab.token_hash() != self.vocab_hash:
+            raise ValueError(f"{self.path} was saved for a different vocabulary than {vocab.path}; "
+                             f"export the embeddings again")
+    
+    def row_hash(self):
+        """64-bit hash of the vocabulary's token hash and the row ids, which changes whenever any row's word would."""
+        digest = hashlib.blake2b(struct.pack("<Q", self.vocab_hash), digest_size=8)
+        digest.update(self.row_ids.tobytes())
+        return int.from_bytes(digest.digest(), 'little')
+    
+    def row_index(self, ids):
+        """Row of each of the given vocab ids, -1 for ids without one."""
+        ids = np.asarray(ids, dtype=np.int64)
+        index = np.full(ids.shape, -1, dtype=np.int64)
+        inside = (ids >= 0) & (ids < len(self._row_of))
+        index[inside] = self._row_of[ids[inside]]
+        return index
+    
+    def has_rows(self, ids):
+        """Mask of the given vocab ids that have a row."""
+        return self.row_index(ids) >= 0
+    
+    def rows(self, ids):
+        """float32 rows of the given vocab ids, zero for ids without a row."""
+        index = self.row_index(ids)
+        rows = np.zeros((*index.shape, self.dim), dtype=np.float32)
+        known = index >= 0
+        rows[known] = self.matrix[index[known]]
+        return rows
+
+def load_embeddings(path=EMBEDDINGS_PATH, vocab=None):
+    """Open an embeddings file, checking it against vocab if given."""
+    return Embeddings(path, vocab)
+
+def export_checkpoint(checkpoint_path=WORD2VEC_CHECKPOINT_PATH, vocab_path=VOCAB_BIN_PATH, path=EMBEDDINGS_PATH,
+                      dtype=EMBEDDING_DTYPE, top_k=EMBEDDING_TOP_K):
+    """Save the input embeddings of a word2vec training checkpoint as an embeddings file."""
+    import torch
+    
+    checkpoint = torch.load(checkpoint_path, map_location="cpu")
+    return save_embeddings(checkpoint["in_embed"].numpy(), load_vocab(vocab_path), path, dtype, top_k)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and inspect the memory-mapped embeddings")
+    parser.add_argument("--export", action="store_true",
+                        help=f"Export the input embeddings of {WORD2VEC_CHECKPOINT_PATH} first")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default=EMBEDDING_DTYPE,
+                        help="Precision of the exported matrix")
+    parser.add_argument("--top-k", type=int, default=EMBEDDING_TOP_K,
+                        help="Only export the rows of the most frequent words by count; 0 for all")
+    args = parser.parse_args()
+    
+    if args.export:
+        export_checkpoint(dtype=args.dtype, top_k=args.top_k)
+    
+    embeddings = load_embeddings(EMBEDDINGS_PATH, load_vocab(VOCAB_BIN_PATH))
+    print(f"Embeddings at {EMBEDDINGS_PATH}: {len(embeddings):,} of {embeddings.vocab_size:,} words, "
+          f"{embeddings.dim} dimensions, {embeddings.dtype.name}, {os.path.getsize(EMBEDDINGS_PATH):,} bytes")
+    print(f"Matches the vocabulary at {VOCAB_BIN_PATH} (token hash {embeddings.vocab_hash:016x})")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# Single-pass streaming statistics shared by the explore scripts
+
+import os
+import heapq
+import argparse
+import numpy as np
+from collections import Counter
+
+# Fix import issue by using relative import path
+try:
+    from src.config import STREAM_CHUNK_SIZE
+    from src.counting import split_with_carry
+    from src.sketches import hash64, HyperLogLog, CountMinSketch
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import STREAM_CHUNK_SIZE
+    from counting import split_with_carry
+    from sketches import hash64, HyperLogLog, CountMinSketch
+
+PREVIEW_CHARS = 500
+TOP_K = 20
+LONG_WORD_LENGTH = 10
+LONG_WORD_SAMPLES = 10
+
+def iter_chunks(path, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield (raw text, complete words) for each read of a text file."""
+    carry = ""
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            words, carry = split_with_carry(carry, chunk)
+            yield chunk, words
+    if carry:
+        yield "", [carry]
+
+def compute_stats(path, approximate=False, chunk_size=STREAM_CHUNK_SIZE, top_k=TOP_K,
+                  sketch_width=1 << 20, hll_precision=14):
+    """Compute corpus statistics in one chunked pass over a text file.
+    
+    Exact mode keeps a Counter of every distinct word. Approximate mode keeps
+    memory fixed instead: unique words come from a HyperLogLog, frequencies
+    from a Count-Min sketch with a candidate set for the top-k, and the
+    least common words are not available.
+    """
+    stats = {
+        "path": path,
+        "size_mb": os.path.getsize(path) / (1024 * 1024),
+        "approximate": approximate,
+        "total_chars": 0,
+        "total_words": 0,
+        "preview": "",
+        "length_distribution": Counter(),
+    }
+    
+    word_counts = Counter()
+    hll = HyperLogLog(hll_precision) if approximate else None
+    long_hll = HyperLogLog(hll_precision) if approximate else None
+    sketch = CountMinSketch(sketch_width) if approximate else None
+    candidates = {}  # approximate top-k candidates: word -> hash
+    longest = []  # approximate long word samples: heap of (length, word)
+    
+    for chunk, words in iter_chunks(path, chunk_size):
+        if len(stats["preview"]) < PREVIEW_CHARS:
+            stats["preview"] += chunk[:PREVIEW_CHARS - len(stats["preview"])]
+        stats["total_chars"] += len(chunk)
+        stats["total_words"] += len(words)
+        
+        chunk_counts = Counter(words)
+        for word, count in chunk_counts.items():
+            stats["length_distribution"][len(word)] += count
+        
+        if not approximate:
+            word_counts.update(chunk_counts)
+            continue
+        
+        chunk_words = list(chunk_counts)
+        hashes = hash64(chunk_words)
+        hll.add_hashes(hashes)
+        sketch.add_hashes(hashes, list(chunk_counts.values()))
+        
+        long_words = [(word, h) for word, h in zip(chunk_words, hashes) if len(word) > LONG_WORD_LENGTH]
+        long_hll.add_hashes(np.array([h for _, h in long_words], dtype=np.uint64))
+        for word, _ in long_words:
+            if (len(word), word) not in longest:
+                if len(longest) < LONG_WORD_SAMPLES:
+                    heapq.heappush(longest, (len(word), word))
+                elif len(word) > longest[0][0]:
+                    heapq.heapreplace(longest, (len(word), word))
+        
+        # Keep the words most likely to be in the top-k, re-estimated with this chunk
+        candidates.update(zip(chunk_words, hashes))
+        if len(candidates) > top_k * 4:
+            estimates = sketch.estimate_hashes(np.array(list(candidates.values()), dtype=np.uint64))
+            keep = np.argsort(-estimates, kind='stable')[:top_k * 4]
+            candidate_items = list(candidates.items())
+            candidates = dict(candidate_items[i] for i in sorted(keep))
+    
+    if approximate:
+        candidate_words = list(candidates)
+        estimates = sketch.estimate_hashes(np.array(list(candidates.values()), dtype=np.uint64))
+        stats["unique_words"] = hll.estimate()
+        stats["avg_word_length"] = (sum(length * count for length, count in stats["length_distribution"].items())
+                                    / max(stats["total_words"], 1))
+        stats["most_common"] = sorted(zip(candidate_words, estimates.tolist()), key=lambda item: -item[1])[:top_k]
+        stats["least_common"] = None
+        stats["long_words_total"] = long_hll.estimate()
+        samples = sorted(longest, reverse=True)
+        sample_estimates = sketch.estimate_hashes(hash64([word for _, word in samples]))
+        stats["long_words"] = [(word, count) for (_, word), count in zip(samples, sample_estimates.tolist())]
+        stats["frequency_error"] = 2 * sketch.total / sketch.width
+        return stats
+    
+    stats["unique_words"] = len(word_counts)
+    stats["avg_word_length"] = (sum(len(word) for word in word_counts) / len(word_counts)) if word_counts else 0.0
+    stats["most_common"] = word_counts.most_common(top_k)
+    # Same order as most_common()[:-top_k-1:-1]: rarest first, later-seen first among ties
+    stats["least_common"] = [item for _, item in heapq.nsmallest(
+        top_k, enumerate(word_counts.items()), key=lambda entry: (entry[1][1], -entry[0]))]
+    long_words = [word for word in word_counts if len(word) > LONG_WORD_LENGTH]
+    stats["long_words_total"] = len(long_words)
+    stats["long_words"] = [(word, word_counts[word])
+                           for word in heapq.nlargest(LONG_WORD_SAMPLES, long_words, key=len)]
+    return stats
+
+def print_stats(stats, top_k=TOP_K):
+    """Print statistics in the format of the original explore scripts."""
+    approx = "~" if stats["approximate"] else ""
+    
+    print(f"Dataset size: {stats['size_mb']:.2f} MB")
+    print(f"Total characters: {stats['total_chars']:,}")
+    print(f"Total words: {stats['total_words']:,}")
+    print(f"Unique words: {approx}{stats['unique_words']:,}")
+    if stats["total_words"]:
+        print(f"Vocabulary size as percentage of total words: "
+              f"{approx}{stats['unique_words']/stats['total_words']*100:.2f}%")
+    
+    # Preview the beginning of the text
+    print("\nPreview of the first", PREVIEW_CHARS, "characters:")
+    print("-" * 50)
+    print(stats["preview"])
+    print("-" * 50)
+    
+    if stats["approximate"]:
+        print(f"\nAverage word length (per occurrence): {stats['avg_word_length']:.2f} characters")
+    else:
+        print(f"\nAverage word length: {stats['avg_word_length']:.2f} characters")
+    
+    print("\nWord length distribution (occurrences):")
+    for length, count in sorted(stats["length_distribution"].items()):
+        print(f"{length:>3}: {count:,}")
+    
+    if stats["approximate"]:
+        print(f"\nCounts below are estimates, at most about {stats['frequency_error']:,.0f} too high")
+    
+    print(f"\nTop {top_k} most common words:")
+    for word, count in stats["most_common"]:
+        print(f"{word}: {approx}{count:,}")
+    
+    if stats["least_common"] is not None:
+        print(f"\nTop {top_k} least common words:")
+        for word, count in stats["least_common"]:
+            print(f"{word}: {count:,}")
+    
+    print(f"\nSample of long words (>{LONG_WORD_LENGTH} chars, {approx}{stats['long_words_total']} total):")
+    for word, count in stats["long_words"]:
+        print(f"{word} ({len(word)} chars): {approx}{count:,} occurrences")
+
+def explore_file(data_path, approximate=False):
+    """Display basic statistics and preview of a text dataset."""
+    if not os.path.exists(data_path):
+        print(f"Error: File not found at {data_path}")
+        return
+    
+    stats = compute_stats(data_path, approximate=approximate)
+    print_stats(stats)
+    return stats
+
+def parse_args(description):
+    """Command line options shared by the explore scripts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--approximate", action="store_true",
+                        help="Use fixed-memory sketches for corpora that don't fit in RAM")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Display statistics of any text file")
+    parser.add_argument("path", help="Text file to explore")
+    parser.add_argument("--approximate", action="store_true",
+                        help="Use fixed-memory sketches for corpora that don't fit in RAM")
+    args = parser.parse_args()
+    
+    explore_file(args.path, approximate=args.approximate)
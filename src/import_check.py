@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# Start-up time and heavy-import regression check for the command line
+
+import sys
+import time
+import argparse
+import subprocess
+
+# Commands orchestration calls often, which must start well under the budget
+CHEAP_COMMANDS = [
+    ["--help"],
+    ["config"],
+    ["pipeline", "--help"],
+    ["pipeline", "--dry-run"],
+    ["download-text8", "--help"],
+    ["download-hacker-news", "--help"],
+    ["titles", "--help"],
+    ["report", "--help"],
+]
+
+# Modules that must import without pulling in these libraries; batches and
+# train are built on torch, so they are not listed
+LIGHT_MODULES = [
+    "src.config", "src.pipeline", "src.instrumentation", "src.tokeniser", "src.dedup", "src.ingest",
+    "src.title_dataset", "src.title_shards", "src.embeddings", "src.embedding_index", "src.score_model",
+    "src.serve", "src.benchmarks", "src.load_test",
+    "src.explore.corpus_stats", "src.download.download_text8", "src.download.download_hacker_news",
+    "src.download.get_hacker_news_titles", "src.download.hacker_news_io", "src.download.fake_hacker_news_db",
+    "src.download.fake_text8_server",
+]
+HEAVY_MODULES = ["pandas", "sqlalchemy", "torch", "pyarrow"]
+
+def best_seconds(args, repeats=5):
+    """Best wall time of repeats cold runs of a command, output discarded."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def heavy_imports(module):
+    """Heavy libraries loaded by importing module in a fresh interpreter."""
+    code = (f"import sys, {module}; "
+            f"print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+def check_imports(budget_ms=100.0, repeats=5):
+    """Check that cheap commands start within budget_ms and light modules avoid heavy imports.
+    
+    Times are the best of several runs, including interpreter start-up, so
+    they measure import cost rather than noise. Returns the failures.
+    """
+    failures = []
+    interpreter = best_seconds([sys.executable, "-c", "pass"], repeats)
+    print(f"Interpreter start-up: {interpreter * 1000:.0f} ms")
+    
+    for command in CHEAP_COMMANDS:
+        seconds = best_seconds([sys.executable, "-m", "src", *command], repeats)
+        status = "ok" if seconds * 1000 <= budget_ms else "SLOW"
+        print(f"  python -m src {' '.join(command):<28} {seconds * 1000:6.0f} ms {status}")
+        if status != "ok":
+            failures.append(f"python -m src {' '.join(command)} took {seconds * 1000:.0f} ms")
+    
+    for module in LIGHT_MODULES:
+        loaded = heavy_imports(module)
+        if loaded:
+            print(f"  import {module:<40} loads {', '.join(loaded)}")
+            failures.append(f"import {module} loads {', '.join(loaded)}")
+    
+    print(f"{len(failures)} failure(s) with a {budget_ms:.0f} ms budget")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that cheap commands start fast and skip heavy imports")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Slowest allowed start-up per command")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per command; the best one counts")
+    args = parser.parse_args()
+    
+    if check_imports(args.budget_ms, args.repeats):
+        sys.exit(1)
@@ -0,0 +1,567 @@
+#!/usr/bin/env python
+# Incremental ingestion of new Hacker News stories into the titles, tokens and vocabulary
+
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        TEXT8_DATASET_PATH, HACKER_NEWS_TITLES_PATH, COMBINED_DATASET_PATH, TOKENS_PATH,
+        VOCAB_BIN_PATH, TOKEN_IDS_PATH, INGEST_STATE_PATH, TOKEN_COUNTS_PATH, CORPUS_IDS_PATH,
+        VOCAB_CHANGES_PATH, PIPELINE_MANIFEST_PATH, HACKER_NEWS_FORMAT, MAX_VOCAB_SIZE, VOCAB_CAPACITY,
+        VOCAB_MIN_COUNT, VOCAB_JSON_EXPORT, STREAM_CHUNK_SIZE, CHUNK_SIZE, CLEAN_WORKERS, TITLE_DEDUP_PATH,
+        TOKEN_POSITIONS_DIR, ensure_directories
+    )
+    from src.dedup import TitleDeduplicator
+    from src.download.download_hacker_news import (
+        fetch_data_in_batches, checkpoint_path_for, load_checkpoint, save_checkpoint, dump_checkpoint
+    )
+    from src.download.hacker_news_io import hacker_news_dataset_path, iter_hacker_news_chunks
+    from src.download.get_hacker_news_titles import get_hacker_news_titles, clean_title_chunk
+    from src.tokeniser import iter_token_chunks, save_vocab
+    from src.sampling import save_sampling_tables
+    from src.vocab import save_vocab_binary, extend_vocab_binary, set_vocab_counts, load_vocab
+    from src.token_ids import (
+        token_id_dtype, write_id_chunks, append_token_ids, patch_token_ids, truncate_token_ids,
+        read_token_ids_header, load_token_ids
+    )
+    from src.pipeline import get_stages, load_manifest, save_manifest, record_stage
+    from src.instrumentation import instrumented, increment
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        TEXT8_DATASET_PATH, HACKER_NEWS_TITLES_PATH, COMBINED_DATASET_PATH, TOKENS_PATH,
+        VOCAB_BIN_PATH, TOKEN_IDS_PATH, INGEST_STATE_PATH, TOKEN_COUNTS_PATH, CORPUS_IDS_PATH,
+        VOCAB_CHANGES_PATH, PIPELINE_MANIFEST_PATH, HACKER_NEWS_FORMAT, MAX_VOCAB_SIZE, VOCAB_CAPACITY,
+        VOCAB_MIN_COUNT, VOCAB_JSON_EXPORT, STREAM_CHUNK_SIZE, CHUNK_SIZE, CLEAN_WORKERS, TITLE_DEDUP_PATH,
+        TOKEN_POSITIONS_DIR, ensure_directories
+    )
+    from dedup import TitleDeduplicator
+    from download.download_hacker_news import (
+        fetch_data_in_batches, checkpoint_path_for, load_checkpoint, save_checkpoint, dump_checkpoint
+    )
+    from download.hacker_news_io import hacker_news_dataset_path, iter_hacker_news_chunks
+    from download.get_hacker_news_titles import get_hacker_news_titles, clean_title_chunk
+    from tokeniser import iter_token_chunks, save_vocab
+    from sampling import save_sampling_tables
+    from vocab import save_vocab_binary, extend_vocab_binary, set_vocab_counts, load_vocab
+    from token_ids import (
+        token_id_dtype, write_id_chunks, append_token_ids, patch_token_ids, truncate_token_ids,
+        read_token_ids_header, load_token_ids
+    )
+    from pipeline import get_stages, load_manifest, save_manifest, record_stage
+    from instrumentation import instrumented, increment
+
+# Corpus ids remapped into tokens.bin per pass when it is re-encoded
+REMAP_BLOCK_TOKENS = 1 << 24
+
+# Corpus ids sorted per token positions segment, bounding the sort's memory to about 80 MB
+POSITIONS_BLOCK_TOKENS = 1 << 22
+
+# Text outputs that ingestion appends to, by their name in the ingest state
+APPENDED_FILES = {
+    "titles": HACKER_NEWS_TITLES_PATH,
+    "combined": COMBINED_DATASET_PATH,
+    "tokens": TOKENS_PATH,
+}
+
+def load_state(path=INGEST_STATE_PATH):
+    """Load the ingest state, or None if nothing was ingested yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(state, path=INGEST_STATE_PATH):
+    """Atomically write the ingest state."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def save_token_counts(tokens, counts, path=TOKEN_COUNTS_PATH):
+    """Save every token's count in the binary vocabulary format, with ids in first-occurrence order."""
+    return save_vocab_binary({token: {"id": token_id, "count": int(count)}
+                              for token_id, (token, count) in enumerate(zip(tokens, counts))}, path)
+
+def update_token_counts(new_tokens, counts, path=TOKEN_COUNTS_PATH):
+    """Bring the token table up to date after a delta: new_tokens go after its own, counts replace its counts.
+    
+    Without new tokens the counts are overwritten in place; otherwise the
+    table is copied with the tokens added and renamed into place. Neither
+    goes through every token in Python.
+    """
+    if not new_tokens:
+        return set_vocab_counts(counts, path)
+    tmp_path = f"{path}.tmp"
+    extend_vocab_binary(path, new_tokens, counts, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+def token_position_segments(directory=TOKEN_POSITIONS_DIR):
+    """(first corpus position, file prefix) of each saved positions segment, in corpus order."""
+    prefixes = [path[:-len(".table_ids.npy")] for path in glob.glob(os.path.join(directory, "*.table_ids.npy"))]
+    return sorted((int(os.path.basename(prefix)), prefix) for prefix in prefixes)
+
+def save_token_positions(ids, start, directory=TOKEN_POSITIONS_DIR, block_tokens=POSITIONS_BLOCK_TOKENS):
+    """Save where each table id occurs in a run of corpus ids that starts at corpus position start.
+    
+    Each block of block_tokens ids becomes one segment, holding its distinct
+    table ids, sorted, with offsets into its positions grouped by table id.
+    Blocks are read one at a time, so ids may be the memory-mapped corpus.
+    The table ids are written last, so a segment interrupted part way is
+    not listed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for block_start in range(0, len(ids), block_tokens):
+        block = np.asarray(ids[block_start:block_start + block_tokens])
+        order = np.argsort(block, kind='stable')
+        sorted_ids = block[order]
+        first = np.flatnonzero(np.concatenate([[True], sorted_ids[1:] != sorted_ids[:-1]]))
+        segment_start = start + block_start
+        position_dtype = np.uint32 if segment_start + len(block) <= np.iinfo(np.uint32).max else np.uint64
+        positions = order.astype(position_dtype)
+        positions += position_dtype(segment_start)
+        del order
+        
+        prefix = os.path.join(directory, f"{segment_start:012d}")
+        np.save(f"{prefix}.positions.npy", positions)
+        np.save(f"{prefix}.offsets.npy", np.append(first, len(block)).astype(np.uint64))
+        np.save(f"{prefix}.table_ids.npy", sorted_ids[first].astype(np.uint32))
+
+def token_positions(table_ids, directory=TOKEN_POSITIONS_DIR):
+    """Corpus positions of the given table ids, and the table id at each of them.
+    
+    Only the entries of those ids are read from each segment, so the cost
+    follows how often they occur rather than the size of the corpus.
+    """
+    table_ids = np.unique(np.asarray(table_ids, dtype=np.uint32))
+    positions, position_ids = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.uint32)]
+    for _, prefix in token_position_segments(directory):
+        segment_ids = np.load(f"{prefix}.table_ids.npy", mmap_mode='r')
+        offsets = np.load(f"{prefix}.offsets.npy", mmap_mode='r')
+        segment_positions = np.load(f"{prefix}.positions.npy", mmap_mode='r')
+        where = np.minimum(np.searchsorted(segment_ids, table_ids), max(len(segment_ids) - 1, 0))
+        found = (segment_ids[where] == table_ids) if len(segment_ids) else np.zeros(len(table_ids), dtype=bool)
+        for table_id, index in zip(table_ids[found], where[found]):
+            run = segment_positions[int(offsets[index]):int(offsets[index + 1])].astype(np.int64)
+            positions.append(run)
+            position_ids.append(np.full(len(run), table_id, dtype=np.uint32))
+    return np.concatenate(positions), np.concatenate(position_ids)
+
+def truncate_token_positions(num_tokens, directory=TOKEN_POSITIONS_DIR):
+    """Remove the segments from corpus position num_tokens on; returns the positions the rest cover."""
+    covered = 0
+    for start, prefix in token_position_segments(directory):
+        if start >= num_tokens:
+            for name in ("table_ids", "offsets", "positions"):
+                os.remove(f"{prefix}.{name}.npy")
+        else:
+            covered = max(covered, start + int(np.load(f"{prefix}.offsets.npy", mmap_mode='r')[-1]))
+    return covered
+
+def dedup_state(path=TITLE_DEDUP_PATH):
+    """Deduplication settings and the number of hashes saved with them, as kept in the ingest state."""
+    deduplicator = TitleDeduplicator()
+    if not deduplicator.enabled:
+        return {**deduplicator.params(), "hashes": 0}
+    # Only the small arrays are read from the archive
+    with np.load(path) as data:
+        return {**json.loads(str(data["params"])), "hashes": int(data["exact_size"]) + int(data["band_size"])}
+
+def load_deduplicator(state):
+    """The title deduplicator as of the last ingest, checked against the current settings."""
+    deduplicator = TitleDeduplicator()
+    saved = dict(state.get("dedup", {}))
+    hashes = saved.pop("hashes", None)
+    if saved != deduplicator.params():
+        raise ValueError("Title deduplication settings changed since the last ingest; run with --rebuild")
+    if not deduplicator.enabled:
+        return deduplicator
+    
+    deduplicator = TitleDeduplicator.load(TITLE_DEDUP_PATH)
+    if deduplicator.num_hashes() != hashes:
+        raise ValueError(f"{TITLE_DEDUP_PATH} is out of step with {INGEST_STATE_PATH}; run with --rebuild")
+    return deduplicator
+
+def fetch_new_stories(engine=None, fetch=True):
+    """Bring the dump up to date and return its extraction checkpoint.
+    
+    The extractor resumes after the checkpoint's last item id, so only
+    stories newer than the dump are fetched. A dump without a checkpoint,
+    such as a merged parallel extraction, gets one pointing at its end first.
+    """
+    dump_path = hacker_news_dataset_path()
+    checkpoint_path = checkpoint_path_for(dump_path)
+    if os.path.exists(dump_path) and load_checkpoint(checkpoint_path) is None:
+        save_checkpoint(checkpoint_path, dump_checkpoint(dump_path, HACKER_NEWS_FORMAT))
+    
+    if fetch:
+        fetch_data_in_batches(dump_path, engine=engine, resume=True, output_format=HACKER_NEWS_FORMAT)
+    
+    if not os.path.exists(dump_path):
+        raise FileNotFoundError(f"Hacker News dataset not found at {dump_path}")
+    return load_checkpoint(checkpoint_path) or dump_checkpoint(dump_path, HACKER_NEWS_FORMAT)
+
+def select_vocab(counts, min_count=VOCAB_MIN_COUNT, max_vocab_size=MAX_VOCAB_SIZE):
+    """Table ids of the vocabulary in descending count order.
+    
+    A stable sort by descending count keeps ties in first-occurrence order,
+    which is how build_vocab() breaks them, so the result matches a full
+    rebuild from the same corpus.
+    """
+    order = np.argsort(-counts, kind='stable')
+    return order[counts[order] >= min_count][:max_vocab_size]
+
+def assign_vocab_ids(members, old_members, table_size):
+    """Table id of each vocab id, keeping the ids of tokens that stay in the vocabulary.
+    
+    members are the table ids of the new vocabulary in count order and
+    old_members those of the old one by vocab id. Tokens entering the
+    vocabulary take the ids of those leaving it, lowest id first and in
+    count order, then any ids past the old vocabulary's end. Returns None
+    if the vocabulary shrank, as it then cannot keep its ids.
+    """
+    if len(members) < len(old_members):
+        return None
+    in_old = np.zeros(table_size, dtype=bool)
+    in_old[old_members] = True
+    in_new = np.zeros(table_size, dtype=bool)
+    in_new[members] = True
+    
+    free_ids = np.concatenate([np.flatnonzero(~in_new[old_members]),
+                               np.arange(len(old_members), len(members))])
+    table_ids = np.empty(len(members), dtype=np.int64)
+    table_ids[:len(old_members)] = old_members
+    table_ids[free_ids] = members[~in_old[members]]
+    return table_ids
+
+def vocab_changes(old_tokens, new_tokens):
+    """Tokens that entered or left the vocabulary, or kept their place under a new id."""
+    old_ids = {token: token_id for token_id, token in enumerate(old_tokens)}
+    new_ids = {token: token_id for token_id, token in enumerate(new_tokens)}
+    return {
+        "vocab_size": [len(old_tokens), len(new_tokens)],
+        "entered": {token: token_id for token, token_id in new_ids.items() if token not in old_ids},
+        "left": {token: token_id for token, token_id in old_ids.items() if token not in new_ids},
+        "moved": {token: [old_ids[token], token_id] for token, token_id in new_ids.items()
+                  if token in old_ids and old_ids[token] != token_id},
+    }
+
+def save_vocab_counts(counts, json_export=VOCAB_JSON_EXPORT):
+    """Replace the counts of the saved vocabulary, whose tokens and ids stay, and rebuild its sampling tables."""
+    tmp_path = f"{VOCAB_BIN_PATH}.tmp"
+    shutil.copyfile(VOCAB_BIN_PATH, tmp_path)
+    set_vocab_counts(counts, tmp_path)
+    os.replace(tmp_path, VOCAB_BIN_PATH)
+    print(f"Binary vocabulary counts updated in {VOCAB_BIN_PATH}")
+    
+    save_sampling_tables(counts)
+    if json_export:
+        load_vocab(VOCAB_BIN_PATH).export_json()
+
+def update_vocabulary(counts, token_at, delta_ids, table=None, rewrite=False, min_count=VOCAB_MIN_COUNT,
+                      json_export=VOCAB_JSON_EXPORT, max_vocab_size=MAX_VOCAB_SIZE):
+    """Recompute the vocabulary from the token table counts and bring tokens.bin in line with it.
+    
+    With the token table of the last ingest, vocab ids are kept and only the
+    positions of entering and leaving tokens are patched; otherwise ids follow
+    descending counts and tokens.bin is re-encoded. Returns whether vocab ids
+    are in count order.
+    """
+    members = select_vocab(counts, min_count, max_vocab_size)
+    old_vocab = load_vocab(VOCAB_BIN_PATH) if os.path.exists(VOCAB_BIN_PATH) else None
+    old_tokens = old_vocab.tokens() if old_vocab is not None else []
+    
+    table_ids = old_members = None
+    if table is not None and old_vocab is not None:
+        old_members = table.encode(old_tokens, dtype=np.int64)
+        if np.any(old_members == table.unk_id):
+            raise ValueError(f"{VOCAB_BIN_PATH} holds tokens missing from {TOKEN_COUNTS_PATH}; run with --rebuild")
+        table_ids = assign_vocab_ids(members, old_members, len(counts))
+        if table_ids is None:
+            print("The vocabulary shrank, so its ids are reassigned in count order")
+            old_members = None
+    if table_ids is None:
+        table_ids = members
+    
+    tokens = [token_at(int(table_id)) for table_id in table_ids]
+    changes = vocab_changes(old_tokens, tokens)
+    changed = any(changes[kind] for kind in ("entered", "left", "moved"))
+    print(f"Vocabulary ids changed: {len(changes['moved']):,} moved, {len(changes['entered']):,} entered, "
+          f"{len(changes['left']):,} left")
+    increment("ids_changed", len(changes["moved"]) + len(changes["entered"]) + len(changes["left"]))
+    
+    vocab_counts = counts[table_ids]
+    if changed or old_vocab is None:
+        save_vocab({token: {"id": token_id, "count": int(count)}
+                    for token_id, (token, count) in enumerate(zip(tokens, vocab_counts))}, json_export)
+    else:
+        save_vocab_counts(vocab_counts, json_export)
+    
+    # Table id -> vocab id, with every token outside the vocabulary on the UNK id
+    dtype = token_id_dtype(max_vocab_size)
+    lookup = np.full(len(counts), len(table_ids), dtype=dtype)
+    lookup[table_ids] = np.arange(len(table_ids), dtype=dtype)
+    
+    corpus_tokens = read_token_ids_header(CORPUS_IDS_PATH)["num_tokens"]
+    header = read_token_ids_header(TOKEN_IDS_PATH) if os.path.exists(TOKEN_IDS_PATH) else None
+    if (rewrite or old_members is None or header is None or header["vocab_size"] != len(table_ids)
+            or header["num_tokens"] + len(delta_ids) != corpus_tokens):
+        corpus_ids = load_token_ids(CORPUS_IDS_PATH)
+        tmp_path = f"{TOKEN_IDS_PATH}.tmp"
+        write_id_chunks((lookup[corpus_ids[start:start + REMAP_BLOCK_TOKENS]]
+                         for start in range(0, len(corpus_ids), REMAP_BLOCK_TOKENS)),
+                        tmp_path, dtype, len(table_ids), len(table_ids))
+        os.replace(tmp_path, TOKEN_IDS_PATH)
+        print(f"Token ids re-encoded to {TOKEN_IDS_PATH} ({len(corpus_ids):,} tokens, {dtype.name})")
+    else:
+        # Only the positions of tokens that entered or left the vocabulary hold a different id
+        swapped = [table_ids[token_id] for token_id in changes["entered"].values()] + \
+                  [old_members[token_id] for token_id in changes["left"].values()]
+        positions, position_table_ids = token_positions(swapped)
+        old_positions = positions < header["num_tokens"]
+        patched = patch_token_ids(positions[old_positions], lookup[position_table_ids[old_positions]],
+                                  TOKEN_IDS_PATH)
+        if swapped:
+            print(f"Token ids patched in {TOKEN_IDS_PATH} at {patched:,} positions of {len(swapped):,} tokens")
+        increment("ids_patched", patched)
+        append_token_ids(lookup[delta_ids], TOKEN_IDS_PATH)
+        print(f"Token ids appended to {TOKEN_IDS_PATH} ({len(delta_ids):,} tokens, {dtype.name})")
+    
+    with open(VOCAB_CHANGES_PATH, 'w', encoding='utf-8') as f:
+        json.dump(changes, f, indent=2)
+    
+    return bool(np.array_equal(table_ids, members))
+
+@instrumented()
+def bootstrap_ingest(min_count=VOCAB_MIN_COUNT, json_export=VOCAB_JSON_EXPORT, workers=CLEAN_WORKERS):
+    """Build the titles, tokeniser outputs, token table, corpus ids and token positions from the whole dump.
+    
+    This is the one full pass; later ingests only process new stories.
+    Vocab ids are in descending count order, as from the tokeniser.
+    Returns the number of corpus tokens and of distinct tokens, and
+    whether vocab ids are in count order.
+    """
+    get_hacker_news_titles(workers=workers)
+    
+    # Table ids are assigned in first-occurrence order, as a Counter over the corpus would list them
+    table = {}
+    with open(COMBINED_DATASET_PATH, 'w', encoding='utf-8') as combined_file, \
+            open(TOKENS_PATH, 'w', encoding='utf-8') as tokens_file:
+        def table_id_chunks():
+            total_tokens = 0
+            for tokens in iter_token_chunks([TEXT8_DATASET_PATH, HACKER_NEWS_TITLES_PATH], STREAM_CHUNK_SIZE,
+                                            combined_file):
+                if total_tokens:
+                    tokens_file.write("\n")
+                tokens_file.write("\n".join(tokens))
+                total_tokens += len(tokens)
+                yield np.fromiter((table.setdefault(token, len(table)) for token in tokens),
+                                  dtype=np.uint32, count=len(tokens))
+        
+        num_tokens = write_id_chunks(table_id_chunks(), CORPUS_IDS_PATH)
+    
+    print(f"Counted {num_tokens:,} tokens, {len(table):,} distinct")
+    increment("tokens", num_tokens)
+    
+    tokens = list(table)
+    corpus_ids = load_token_ids(CORPUS_IDS_PATH)
+    counts = np.bincount(corpus_ids, minlength=len(tokens)).astype(np.int64)
+    shutil.rmtree(TOKEN_POSITIONS_DIR, ignore_errors=True)
+    save_token_positions(corpus_ids, 0)
+    del corpus_ids
+    
+    count_order = update_vocabulary(counts, tokens.__getitem__, np.zeros(0, dtype=np.uint32), rewrite=True,
+                                    min_count=min_count, json_export=json_export)
+    save_token_counts(tokens, counts)
+    
+    return num_tokens, len(tokens), count_order
+
+def restore_outputs(state):
+    """Cut the appended files back to their sizes at the last ingest; True if any had grown.
+    
+    A run interrupted part way leaves appended titles, tokens, corpus ids or
+    token positions behind, which the next run would otherwise ingest twice.
+    """
+    restored = False
+    for name, path in APPENDED_FILES.items():
+        size = os.path.getsize(path) if os.path.exists(path) else -1
+        if size < state["files"][name]:
+            raise ValueError(f"{path} is shorter than at the last ingest; run with --rebuild")
+        if size > state["files"][name]:
+            with open(path, 'r+b') as f:
+                f.truncate(state["files"][name])
+            restored = True
+    
+    if read_token_ids_header(CORPUS_IDS_PATH)["num_tokens"] > state["corpus_tokens"]:
+        truncate_token_ids(CORPUS_IDS_PATH, state["corpus_tokens"], state["unique_tokens"], state["unique_tokens"])
+        restored = True
+    if truncate_token_positions(state["corpus_tokens"]) != state["corpus_tokens"]:
+        raise ValueError(f"{TOKEN_POSITIONS_DIR} is out of step with {INGEST_STATE_PATH}; run with --rebuild")
+    if restored:
+        print("Discarded output left by an interrupted ingest")
+    return restored
+
+@instrumented()
+def ingest_delta(state, min_count=VOCAB_MIN_COUNT, json_export=VOCAB_JSON_EXPORT):
+    """Append the stories written to the dump since the last ingest and update the vocabulary.
+    
+    Vocab ids stay stable; ids in count order need --rebuild. Returns the
+    number of corpus tokens and of distinct tokens, and whether vocab ids
+    are in count order.
+    """
+    table = load_vocab(TOKEN_COUNTS_PATH)
+    if len(table) != state["unique_tokens"] or int(table.counts.sum()) != state["corpus_tokens"]:
+        raise ValueError(f"{TOKEN_COUNTS_PATH} is out of step with {INGEST_STATE_PATH}; run with --rebuild")
+    if os.path.getsize(TEXT8_DATASET_PATH) != state["files"]["text8"]:
+        raise ValueError(f"{TEXT8_DATASET_PATH} changed since the last ingest; run with --rebuild")
+    deduplicator = load_deduplicator(state)
+    restored = restore_outputs(state)
+    
+    new_tokens = {}
+    delta_chunks = []
+    stories = 0
+    has_titles = state["files"]["titles"] > 0
+    has_tokens = state["files"]["tokens"] > 0
+    
+    with open(HACKER_NEWS_TITLES_PATH, 'a', encoding='utf-8') as titles_file, \
+            open(COMBINED_DATASET_PATH, 'a', encoding='utf-8') as combined_file, \
+            open(TOKENS_PATH, 'a', encoding='utf-8') as tokens_file:
+        for chunk in iter_hacker_news_chunks(columns=['title'], chunk_size=CHUNK_SIZE, since=state["position"]):
+            titles = deduplicator.filter(clean_title_chunk(chunk['title']))
+            stories += len(chunk)
+            if not titles:
+                continue
+            
+            # The combined file ends with the titles file, so both get the same text
+            text = ' '.join(titles)
+            if has_titles:
+                text = ' ' + text
+            titles_file.write(text)
+            combined_file.write(text)
+            has_titles = True
+            
+            tokens = text.split()
+            if has_tokens:
+                tokens_file.write("\n")
+            tokens_file.write("\n".join(tokens))
+            has_tokens = True
+            
+            # Each distinct token is looked up in the table once; unseen ones are added at its end
+            table_ids = {}
+            for token in dict.fromkeys(tokens):
+                table_id = table.token_to_id(token)
+                if table_id == table.unk_id:
+                    table_id = new_tokens.setdefault(token, len(table) + len(new_tokens))
+                table_ids[token] = table_id
+            ids = np.fromiter((table_ids[token] for token in tokens), dtype=np.uint32, count=len(tokens))
+            table_size = len(table) + len(new_tokens)
+            append_token_ids(ids, CORPUS_IDS_PATH, vocab_size=table_size, unk_id=table_size)
+            delta_chunks.append(ids)
+            increment("titles", len(titles))
+            increment("tokens", len(tokens))
+    
+    delta_ids = np.concatenate(delta_chunks) if delta_chunks else np.zeros(0, dtype=np.uint32)
+    if len(delta_ids):
+        save_token_positions(delta_ids, state["corpus_tokens"])
+    print(f"Ingested {stories:,} stories: {len(delta_ids):,} tokens, {len(new_tokens):,} of them new")
+    increment("stories", stories)
+    increment("new_tokens", len(new_tokens))
+    
+    if deduplicator.enabled and deduplicator.kept + sum(deduplicator.removed.values()):
+        print(deduplicator.report())
+        increment("duplicates_removed", deduplicator.removed["exact"] + deduplicator.removed["near"])
+        if deduplicator.num_hashes() != state["dedup"]["hashes"]:
+            deduplicator.save(TITLE_DEDUP_PATH)
+    
+    count_order = state.get("count_order", False)
+    if len(delta_ids) or restored or not os.path.exists(VOCAB_BIN_PATH):
+        new_token_list = list(new_tokens)
+        counts = np.zeros(len(table) + len(new_tokens), dtype=np.int64)
+        counts[:len(table)] = table.counts
+        counts += np.bincount(delta_ids, minlength=len(counts))
+        
+        def token_at(table_id):
+            return table.id_to_token(table_id) if table_id < len(table) else new_token_list[table_id - len(table)]
+        
+        count_order = update_vocabulary(counts, token_at, delta_ids, table, rewrite=restored, min_count=min_count,
+                                        json_export=json_export)
+        update_token_counts(new_token_list, counts)
+    
+    return state["corpus_tokens"] + len(delta_ids), len(table) + len(new_tokens), count_order
+
+def record_pipeline_stages(names=("download_hacker_news", "get_hacker_news_titles", "tokeniser")):
+    """Record the stages whose outputs ingestion updated, so the pipeline treats them as up to date."""
+    if not os.path.exists(PIPELINE_MANIFEST_PATH):
+        return
+    stages = get_stages()
+    manifest = load_manifest()
+    for name in names:
+        record_stage(name, stages[name], manifest)
+    save_manifest(manifest)
+
+def ingest(engine=None, fetch=True, rebuild=False, min_count=VOCAB_MIN_COUNT, json_export=VOCAB_JSON_EXPORT,
+           workers=CLEAN_WORKERS):
+    """Fetch stories above the high-water mark and fold them into the titles, tokens and vocabulary.
+    
+    The high-water mark is the extraction checkpoint's last item id. The
+    first run, or one with rebuild set, processes the whole dump once and
+    saves every token's count and positions, with vocab ids in count order;
+    later runs only process the new stories and keep vocab ids stable. The
+    pipeline's tokeniser stage is only recorded as up to date while ids are
+    in count order.
+    """
+    if VOCAB_CAPACITY:
+        raise ValueError("Incremental ingestion keeps exact counts; unset VOCAB_CAPACITY")
+    ensure_directories()
+    
+    state = None if rebuild else load_state()
+    position = fetch_new_stories(engine, fetch)
+    
+    if state is None:
+        print("Building the titles, tokens and vocabulary from the whole dump")
+        corpus_tokens, unique_tokens, count_order = bootstrap_ingest(min_count, json_export, workers)
+    else:
+        print(f"Ingesting stories after item {state['high_water_id']}")
+        corpus_tokens, unique_tokens, count_order = ingest_delta(state, min_count, json_export)
+    
+    save_state({
+        "high_water_id": position["last_id"],
+        "position": position,
+        "files": {"text8": os.path.getsize(TEXT8_DATASET_PATH),
+                  **{name: os.path.getsize(path) for name, path in APPENDED_FILES.items()}},
+        "corpus_tokens": corpus_tokens,
+        "unique_tokens": unique_tokens,
+        "count_order": count_order,
+        "dedup": dedup_state(),
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    stages = ("download_hacker_news", "get_hacker_news_titles") + (("tokeniser",) if count_order else ())
+    record_pipeline_stages(stages)
+    
+    print(f"Ingested up to item {position['last_id']}: {corpus_tokens:,} tokens, {unique_tokens:,} distinct")
+    return position["last_id"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch new Hacker News stories and append them to the corpus")
+    parser.add_argument("--no-fetch", action="store_true",
+                        help="Only ingest stories already in the dump, without querying the database")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Forget the ingest state and rebuild everything from the whole dump, "
+                             "with vocab ids in count order")
+    parser.add_argument("--min-count", type=int, default=VOCAB_MIN_COUNT,
+                        help="Drop tokens that occur fewer times than this from the vocabulary")
+    parser.add_argument("--no-json", action="store_true", help="Only write the binary vocabulary, not vocab.json")
+    parser.add_argument("--workers", type=int, default=CLEAN_WORKERS,
+                        help="Number of processes used to clean titles when rebuilding")
+    args = parser.parse_args()
+    
+    ingest(fetch=not args.no_fetch, rebuild=args.rebuild, min_count=args.min_count,
+           json_export=VOCAB_JSON_EXPORT and not args.no_json, workers=args.workers)
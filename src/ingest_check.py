@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# Check that incremental ingestion produces the same outputs as a full rebuild
+
+import os
+import sys
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import argparse
+import subprocess
+
+# Fix import issue by using relative import path
+try:
+    from src.benchmarks import workdir_environment
+    from src.download.fake_hacker_news_db import create_fake_hacker_news_db
+except ModuleNotFoundError:
+    # When running as a script directly
+    from benchmarks import workdir_environment
+    from download.fake_hacker_news_db import create_fake_hacker_news_db
+
+# Text files a full rebuild writes, compared byte for byte with the ingested ones
+TEXT_PATHS = ["HACKER_NEWS_TITLES_PATH", "COMBINED_DATASET_PATH", "TOKENS_PATH"]
+
+# Files whose ids ingestion keeps stable, so they only match a rebuild's after ingest --rebuild
+ID_PATHS = ["VOCAB_PATH", "VOCAB_BIN_PATH", "TOKEN_IDS_PATH"]
+COMPARED_PATHS = TEXT_PATHS + ID_PATHS
+
+# Settings shared by the ingesting and the rebuilding runs
+SETTINGS = ["HACKER_NEWS_FORMAT", "MAX_VOCAB_SIZE", "VOCAB_CAPACITY", "DEDUP_EXACT", "DEDUP_NEAR_THRESHOLD"]
+
+def run_command(command, env):
+    """Run a python -m src command with env, raising with its output if it fails."""
+    process = subprocess.run([sys.executable, "-m", "src", *command], env=env, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{process.stdout[-2000:]}{process.stderr[-2000:]}")
+    return process.stdout
+
+def run_ingest_child(db_path, env, rebuild=False):
+    """Ingest from the fake database in a child process, so config reads env's paths."""
+    command = [sys.executable, "-m", "src.ingest_check", "--child-db", db_path] + (["--child-rebuild"] * rebuild)
+    process = subprocess.run(command, env=env, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"Ingest failed:\n{process.stdout[-2000:]}{process.stderr[-2000:]}")
+    with open(env["VOCAB_CHANGES_PATH"], 'r', encoding='utf-8') as f:
+        return json.load(f), process.stdout
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def decoded_corpus(env):
+    """The vocabulary as {token: count} and tokens.bin as tokens, with None for unknown ones."""
+    from src.vocab import Vocab
+    from src.token_ids import load_token_ids
+    
+    vocab = Vocab(env["VOCAB_BIN_PATH"])
+    tokens = vocab.tokens() + [None]
+    return (dict(zip(tokens, vocab.counts.tolist())),
+            [tokens[token_id] for token_id in load_token_ids(env["TOKEN_IDS_PATH"]).tolist()])
+
+def write_text8_like(path, num_words=30000, seed=0):
+    """A text8-like file whose most frequent word, "the", stays on top after any delta."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(60)] + ["of", "a"]
+    text = " ".join("the" if rng.random() < 0.15 else rng.choice(words) for _ in range(num_words))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(" " + text)
+
+def check_ingest_format(output_format, num_items=3000, seed=0, near_threshold=0):
+    """Ingest a dump in three steps and compare every output with a full rebuild.
+    
+    The database first holds two thirds of the items. The rest then arrive
+    with a word the vocabulary has never seen, which must enter it under
+    the id of a word it pushes out, with every other id kept and tokens.bin
+    patched rather than re-encoded; then a single story adding to the top
+    token and a rare one, which must leave the vocabulary alone. An
+    interrupted append is also simulated. The ingested vocabulary must hold
+    the rebuild's tokens and counts and tokens.bin the same tokens, and
+    after ingest --rebuild every file must match byte for byte. Exact
+    duplicate titles are dropped throughout, and near duplicates too with a
+    near_threshold.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = create_fake_hacker_news_db(os.path.join(tmp_dir, "hn.db"), num_items, seed=seed)
+        conn = sqlite3.connect(db_path)
+        cut = conn.execute("SELECT id FROM items ORDER BY id LIMIT 1 OFFSET ?", (num_items * 2 // 3,)).fetchone()[0]
+        late_items = conn.execute("SELECT * FROM items WHERE id > ? ORDER BY id", (cut,)).fetchall()
+        conn.execute("DELETE FROM items WHERE id > ?", (cut,))
+        conn.commit()
+        
+        workdir = os.path.join(tmp_dir, "ingest")
+        os.makedirs(workdir)
+        env = workdir_environment(workdir)
+        env.update(HACKER_NEWS_FORMAT=output_format, MAX_VOCAB_SIZE="24", VOCAB_CAPACITY="0", DEDUP_EXACT="1",
+                   DEDUP_NEAR_THRESHOLD=str(near_threshold))
+        write_text8_like(env["TEXT8_DATASET_PATH"], seed=seed)
+        
+        # The first run builds everything from the dump
+        run_ingest_child(db_path, env)
+        old_tokens = list(decoded_corpus(env)[0])
+        
+        # New stories with an unseen, frequent word bring it into the vocabulary in place of another
+        conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            item[:2] + (None if item[2] is None else f"{item[2]} kubernetes kubernetes",) + item[3:]
+            for item in late_items
+        ])
+        conn.commit()
+        changes, output = run_ingest_child(db_path, env)
+        assert "kubernetes" in changes["entered"], f"Expected kubernetes to enter the vocabulary: {changes}"
+        assert changes["left"] and not changes["moved"], f"Expected ids to stay but for the entered: {changes}"
+        assert "re-encoded" not in output and "Token ids patched" in output, "tokens.bin was re-encoded"
+        new_tokens = list(decoded_corpus(env)[0])
+        assert all(token == old_tokens[token_id] for token_id, token in enumerate(new_tokens)
+                   if token not in changes["entered"]), "Tokens staying in the vocabulary changed ids"
+        
+        # More "the" and a word too rare for the vocabulary leave every id in place, so token ids are
+        # only appended; the title is unlike any other, so deduplication keeps it
+        last_id = conn.execute("SELECT MAX(id) FROM items").fetchone()[0]
+        conn.execute("INSERT INTO items VALUES (?, 'story', 'The the the the the the the zyxwvut', 1, 1, NULL, "
+                     "NULL, 'user0', 0)", (last_id + 1,))
+        conn.commit()
+        changes, output = run_ingest_child(db_path, env)
+        assert not (changes["entered"] or changes["left"] or changes["moved"]), f"Expected no id changes: {changes}"
+        assert "Token ids appended" in output, "Token ids were re-encoded although no id changed"
+        
+        # With nothing new, ingesting again leaves the outputs alone
+        before = {name: read_file(env[name]) for name in COMPARED_PATHS}
+        run_ingest_child(db_path, env)
+        assert before == {name: read_file(env[name]) for name in COMPARED_PATHS}, "A no-op ingest changed outputs"
+        
+        # Output appended by an interrupted run is discarded rather than ingested twice
+        for name in ("HACKER_NEWS_TITLES_PATH", "COMBINED_DATASET_PATH", "TOKENS_PATH"):
+            with open(env[name], 'a', encoding='utf-8') as f:
+                f.write(" interrupted")
+        run_ingest_child(db_path, env)
+        conn.close()
+        
+        # A full rebuild from the same text8 and dump
+        reference_dir = os.path.join(tmp_dir, "reference")
+        os.makedirs(reference_dir)
+        reference_env = workdir_environment(reference_dir)
+        reference_env.update({name: env[name] for name in SETTINGS})
+        shutil.copy(env["TEXT8_DATASET_PATH"], reference_env["TEXT8_DATASET_PATH"])
+        dump_name = "HACKER_NEWS_PARQUET_PATH" if output_format == "parquet" else "HACKER_NEWS_DATASET_PATH"
+        if output_format == "parquet":
+            shutil.copytree(env[dump_name], reference_env[dump_name])
+        else:
+            shutil.copy(env[dump_name], reference_env[dump_name])
+        run_command(["titles"], reference_env)
+        run_command(["tokenise"], reference_env)
+        
+        for name in TEXT_PATHS:
+            assert read_file(env[name]) == read_file(reference_env[name]), \
+                f"{os.path.basename(env[name])} differs from a full rebuild ({output_format} dump)"
+        vocab, corpus = decoded_corpus(env)
+        reference_vocab, reference_corpus = decoded_corpus(reference_env)
+        assert vocab == reference_vocab, f"The vocabulary differs from a full rebuild's ({output_format} dump)"
+        assert corpus == reference_corpus, \
+            f"tokens.bin decodes differently from a full rebuild's ({output_format} dump)"
+        
+        with open(env["INGEST_STATE_PATH"], 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        assert state["high_water_id"] == last_id + 1, f"High-water mark {state['high_water_id']}, expected {last_id + 1}"
+        assert not state["count_order"], "Vocab ids kept stable are recorded as in count order"
+        
+        # Rebuilding puts vocab ids back in count order, as the tokeniser assigns them
+        run_ingest_child(db_path, env, rebuild=True)
+        for name in COMPARED_PATHS:
+            assert read_file(env[name]) == read_file(reference_env[name]), \
+                f"{os.path.basename(env[name])} differs from a full rebuild after --rebuild ({output_format} dump)"
+        with open(env["INGEST_STATE_PATH"], 'r', encoding='utf-8') as f:
+            assert json.load(f)["count_order"], "Vocab ids after --rebuild are not recorded as in count order"
+    
+    dedup = f"near duplicates above {near_threshold}" if near_threshold else "exact duplicates"
+    print(f"Ingest check passed for a {output_format} dump without {dedup}: "
+          f"{len(late_items) + 1} new items in two deltas")
+
+def check_ingest(num_items=3000, seed=0, formats=("csv", "parquet")):
+    """Run the ingest check for each dump format, dropping near duplicates from the Parquet one."""
+    for output_format in formats:
+        near_threshold = 0.9 if output_format == "parquet" else 0
+        check_ingest_format(output_format, num_items, seed, near_threshold)
+
+def ingest_from_fake_db(db_path, rebuild=False):
+    """Entry point of the child process: ingest from the fake database."""
+    from src.ingest import ingest
+    from src.download.fake_hacker_news_db import get_fake_db_engine
+    
+    engine = get_fake_db_engine(db_path)
+    try:
+        ingest(engine=engine, rebuild=rebuild)
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check incremental ingestion against a full rebuild")
+    parser.add_argument("--items", type=int, default=3000, help="Number of synthetic items")
+    parser.add_argument("--formats", nargs="*", default=["csv", "parquet"], help="Dump formats to check")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--child-db", help=argparse.SUPPRESS)
+    parser.add_argument("--child-rebuild", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child_db:
+        ingest_from_fake_db(args.child_db, args.child_rebuild)
+        sys.exit(0)
+    
+    check_ingest(args.items, args.seed, args.formats)
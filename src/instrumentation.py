@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# Stage timers, counters, memory peaks and opt-in profiling, written as a JSON lines run report
+
+import os
+import json
+import time
+import argparse
+import functools
+import threading
+
+# Fix import issue by using relative import path
+try:
+    from src.config import RUN_REPORT_PATH, INSTRUMENT_MEMORY, PROFILE_DIR, RSS_SAMPLE_INTERVAL
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import RUN_REPORT_PATH, INSTRUMENT_MEMORY, PROFILE_DIR, RSS_SAMPLE_INTERVAL
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_local = threading.local()
+_records = []
+
+def run_id():
+    """Id shared by every stage of a run, inherited by worker processes through the environment."""
+    if "RUN_ID" not in os.environ:
+        os.environ["RUN_ID"] = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}"
+    return os.environ["RUN_ID"]
+
+def current_rss():
+    """Resident set size of this process in bytes, or 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+class RSSSampler:
+    """One daemon thread per process that raises the peak RSS of every open stage.
+    
+    Sampling costs one small /proc read per interval however many stages are
+    open, so it can stay on; a stage's peak is also taken at its start and end.
+    """
+    
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stages = set()
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def watch(self, stage):
+        with self.lock:
+            self.stages.add(stage)
+            # A forked worker inherits the object but not the thread
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self.thread.start()
+    
+    def unwatch(self, stage):
+        with self.lock:
+            self.stages.discard(stage)
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            rss = current_rss()
+            with self.lock:
+                for stage in self.stages:
+                    stage.peak_rss = max(stage.peak_rss, rss)
+
+_sampler = RSSSampler()
+if hasattr(os, "register_at_fork"):
+    # The sampler thread may hold the lock at fork time; workers start afresh
+    os.register_at_fork(after_in_child=lambda: _sampler.__init__(_sampler.interval))
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+class Stage:
+    """A timed region of work with counters, reported as one JSON line when it ends.
+    
+    Stages nest: a stage opened inside another records it as its parent.
+    Counters are free-form numbers such as rows, tokens or bytes, and each
+    gets a per-second rate in the report. Memory is the process RSS peak
+    (INSTRUMENT_MEMORY=rss), plus the Python allocation peak from tracemalloc
+    with INSTRUMENT_MEMORY=tracemalloc, which slows allocation-heavy code
+    noticeably. With PROFILE_DIR set, outermost stages are run under
+    cProfile and dumped there as <stage>-<pid>.prof.
+    """
+    
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.counters = {}
+        self.parent = None
+        self.peak_rss = 0
+        self.python_peak = 0
+        self.profiler = None
+        self.owns_tracemalloc = False
+    
+    def count(self, counter, amount=1):
+        """Add amount to a counter of this stage."""
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+    
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        
+        if INSTRUMENT_MEMORY in ("rss", "tracemalloc"):
+            self.start_rss = self.peak_rss = current_rss()
+            _sampler.watch(self)
+        if INSTRUMENT_MEMORY == "tracemalloc":
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.owns_tracemalloc = True
+            # Fold the peak so far into the enclosing stage before measuring this one
+            if self.parent is not None:
+                self.parent.python_peak = max(self.parent.python_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        if PROFILE_DIR and self.parent is None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Only one profiler can be active per process, so concurrent stages in threads go unprofiled
+                self.profiler = None
+        
+        stack.append(self)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.start_cpu = time.process_time()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        cpu_seconds = time.process_time() - self.start_cpu
+        _stack().pop()
+        
+        record = {
+            "run_id": run_id(),
+            "stage": self.name,
+            "parent": self.parent.name if self.parent is not None else None,
+            "pid": os.getpid(),
+            "started_at": round(self.started_at, 3),
+            "seconds": round(seconds, 4),
+            "cpu_seconds": round(cpu_seconds, 4),
+            "status": "ok" if exc_type is None else "error",
+        }
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        record["counters"] = self.counters
+        record["rates"] = {f"{counter}_per_sec": round(value / seconds, 1)
+                           for counter, value in self.counters.items() if seconds > 0}
+        
+        if INSTRUMENT_MEMORY in ("rss", "tracemalloc"):
+            _sampler.unwatch(self)
+            self.peak_rss = max(self.peak_rss, current_rss())
+            record["rss_start_mb"] = round(self.start_rss / 2**20, 1)
+            record["peak_rss_mb"] = round(self.peak_rss / 2**20, 1)
+            if self.parent is not None:
+                self.parent.peak_rss = max(self.parent.peak_rss, self.peak_rss)
+        if INSTRUMENT_MEMORY == "tracemalloc":
+            import tracemalloc
+            self.python_peak = max(self.python_peak, tracemalloc.get_traced_memory()[1])
+            record["python_peak_mb"] = round(self.python_peak / 2**20, 1)
+            if self.parent is not None:
+                self.parent.python_peak = max(self.parent.python_peak, self.python_peak)
+            if self.owns_tracemalloc:
+                tracemalloc.stop()
+        if self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            record["profile"] = os.path.join(PROFILE_DIR, f"{self.name}-{os.getpid()}.prof")
+            self.profiler.dump_stats(record["profile"])
+        
+        record.update(self.fields)
+        _records.append(record)
+        write_record(record)
+        return False
+
+def stage(name, **fields):
+    """Context manager timing a stage; extra fields are copied into its report line."""
+    return Stage(name, **fields)
+
+def instrumented(name=None):
+    """Decorator running a function as a stage named after it."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Stage(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def increment(counter, amount=1):
+    """Add amount to a counter of the innermost open stage of this thread, if any."""
+    stack = _stack()
+    if stack:
+        stack[-1].count(counter, amount)
+
+def write_record(record, path=RUN_REPORT_PATH):
+    """Append one record to the JSON lines report; an empty path disables the report."""
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # One append of a whole line, so records from concurrent stage processes do not interleave
+    line = json.dumps(record, default=str) + "\n"
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+def read_report(path=RUN_REPORT_PATH, run=None):
+    """Records of one run from the report: run_id, or the latest run if None."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run is None and records:
+        run = records[-1]["run_id"]
+    return [record for record in records if record["run_id"] == run]
+
+def summary_table(records):
+    """A plain-text table of stage timings, memory peaks and counter rates."""
+    if not records:
+        return "No stages recorded"
+    # Each stage is listed under its parent, which is in the same process
+    children = {}
+    for record in sorted(records, key=lambda record: record["started_at"]):
+        children.setdefault((record["pid"], record["parent"]) if record["parent"] else None, []).append(record)
+    
+    def in_order(record, depth):
+        yield record, depth
+        for child in children.pop((record["pid"], record["stage"]), []):
+            yield from in_order(child, depth + 1)
+    
+    rows = [("stage", "status", "seconds", "cpu s", "peak RSS MB", "counters")]
+    ordered = [item for record in children.pop(None, []) for item in in_order(record, 0)]
+    # Stages whose parent never finished (a killed run) are listed last
+    ordered += [(record, 1) for orphans in children.values() for record in orphans]
+    for record, depth in ordered:
+        name = "  " * depth + record["stage"]
+        counters = ", ".join(f"{counter} {value:,.0f} ({record['rates'].get(counter + '_per_sec', 0):,.0f}/s)"
+                             for counter, value in record["counters"].items())
+        rows.append((name, record["status"], f"{record['seconds']:.2f}", f"{record['cpu_seconds']:.2f}",
+                     f"{record['peak_rss_mb']:.1f}" if "peak_rss_mb" in record else "-", counters))
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]) - 1)]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)) + "  " + row[-1]
+                     for row in rows)
+
+def print_summary(records=None):
+    """Print the summary table of the given records, or of the stages run in this process."""
+    print(f"\nRun {run_id()} summary:")
+    print(summary_table(_records if records is None else records))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise a run from the JSON lines run report")
+    parser.add_argument("--report", default=RUN_REPORT_PATH, help="Run report to read")
+    parser.add_argument("--run", help="Run id to summarise (default: the latest run)")
+    parser.add_argument("--list", action="store_true", help="List the run ids in the report")
+    args = parser.parse_args()
+    
+    if args.list:
+        with open(args.report, 'r', encoding='utf-8') as f:
+            runs = dict.fromkeys(json.loads(line)["run_id"] for line in f if line.strip())
+        print("\n".join(runs))
+    else:
+        records = read_report(args.report, args.run)
+        if records:
+            print(f"Run {records[0]['run_id']}:")
+        print(summary_table(records))
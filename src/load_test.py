@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# Load-test the score service on localhost
+
+import time
+import json
+import random
+import asyncio
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import SERVE_HOST, SERVE_PORT, HACKER_NEWS_TITLES_PATH
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import SERVE_HOST, SERVE_PORT, HACKER_NEWS_TITLES_PATH
+
+async def request(reader, writer, method, path, payload=None):
+    """Send one request on a keep-alive connection and return (status, parsed JSON body)."""
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+async def wait_until_ready(host, port, timeout=120):
+    """Poll /ready until the service has warmed up."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            status, body = await request(reader, writer, "GET", "/ready")
+            writer.close()
+            if status == 200:
+                return body
+            if body["warmup"]["status"] == "failed":
+                raise RuntimeError(f"Service warm-up failed: {body['warmup']['error']}")
+        except (ConnectionError, OSError):
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"Service at {host}:{port} not ready after {timeout} seconds")
+
+async def client(host, port, titles, deadline, latencies, failures, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.time() < deadline:
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", "/predict", {"title": rng.choice(titles)})
+            latencies.append(time.perf_counter() - start)
+            failures[0] += status != 200
+    finally:
+        writer.close()
+
+def sample_titles(path=HACKER_NEWS_TITLES_PATH, count=1000, seed=0):
+    """Pseudo-titles of 4-10 words drawn from the titles corpus, or fixed ones if it is missing."""
+    rng = random.Random(seed)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            words = f.read(10_000_000).split()
+    except FileNotFoundError:
+        words = []
+    if not words:
+        words = "show hn a new way to build fast python services with numpy".split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(4, 10))) for _ in range(count)]
+
+async def load_test(host=SERVE_HOST, port=SERVE_PORT, concurrency=32, duration=10.0, num_titles=1000):
+    """Run concurrent keep-alive clients for duration seconds and report QPS and latency."""
+    ready = await wait_until_ready(host, port)
+    print(f"Service ready (warm-up {ready['warmup']['seconds']} seconds)")
+    
+    titles = sample_titles(count=num_titles)
+    latencies, failures = [], [0]
+    deadline = time.time() + duration
+    start = time.time()
+    await asyncio.gather(*(client(host, port, titles, deadline, latencies, failures, random.Random(i))
+                           for i in range(concurrency)))
+    elapsed = time.time() - start
+    
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{len(latencies):,} requests from {concurrency} clients in {elapsed:.1f} seconds: "
+          f"{len(latencies) / elapsed:,.0f} QPS, {failures[0]} failed")
+    print(f"Client latency: p50 {np.percentile(latencies_ms, 50):.2f} ms, "
+          f"p99 {np.percentile(latencies_ms, 99):.2f} ms")
+    
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metrics = await request(reader, writer, "GET", "/metrics")
+    writer.close()
+    print(f"Server metrics: {json.dumps(metrics)}")
+    return metrics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the score service")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent keep-alive clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--titles", type=int, default=1000, help="Distinct titles to draw requests from")
+    args = parser.parse_args()
+    
+    asyncio.run(load_test(args.host, args.port, args.concurrency, args.duration, args.titles))
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# Incremental pipeline runner that only re-runs stages whose inputs or parameters changed
+
+import os
+import json
+import time
+import hashlib
+import argparse
+import importlib
+from contextlib import nullcontext
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        TEXT8_DATASET_PATH, TEXT8_DATASET_URL, HACKER_NEWS_TITLES_PATH,
+        COMBINED_DATASET_PATH, TOKENS_PATH, VOCAB_PATH, VOCAB_BIN_PATH, TOKEN_IDS_PATH,
+        SAMPLING_TABLES_PATH, SUBSAMPLE_THRESHOLD, NEGATIVE_POWER, TITLE_DATASET_PATH,
+        TITLE_SHARDS_DIR, SHARD_TITLES, VALIDATION_FRACTION, TEST_FRACTION,
+        HACKER_NEWS_FORMAT, MAX_VOCAB_SIZE, VOCAB_CAPACITY, VOCAB_MIN_COUNT, VOCAB_JSON_EXPORT,
+        DEDUP_EXACT, DEDUP_NEAR_THRESHOLD, MINHASH_PERMUTATIONS, TITLE_DEDUP_PATH,
+        PIPELINE_MANIFEST_PATH, PIPELINE_JOBS, ensure_directories
+    )
+    from src.download.hacker_news_io import hacker_news_dataset_path
+    from src.instrumentation import stage as instrument_stage, run_id, read_report, print_summary
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        TEXT8_DATASET_PATH, TEXT8_DATASET_URL, HACKER_NEWS_TITLES_PATH,
+        COMBINED_DATASET_PATH, TOKENS_PATH, VOCAB_PATH, VOCAB_BIN_PATH, TOKEN_IDS_PATH,
+        SAMPLING_TABLES_PATH, SUBSAMPLE_THRESHOLD, NEGATIVE_POWER, TITLE_DATASET_PATH,
+        TITLE_SHARDS_DIR, SHARD_TITLES, VALIDATION_FRACTION, TEST_FRACTION,
+        HACKER_NEWS_FORMAT, MAX_VOCAB_SIZE, VOCAB_CAPACITY, VOCAB_MIN_COUNT, VOCAB_JSON_EXPORT,
+        DEDUP_EXACT, DEDUP_NEAR_THRESHOLD, MINHASH_PERMUTATIONS, TITLE_DEDUP_PATH,
+        PIPELINE_MANIFEST_PATH, PIPELINE_JOBS, ensure_directories
+    )
+    from download.hacker_news_io import hacker_news_dataset_path
+    from instrumentation import stage as instrument_stage, run_id, read_report, print_summary
+
+def get_stages():
+    """Declare every stage with its function, inputs, outputs and parameters.
+    
+    Parameters are only those that change a stage's output; settings such as
+    CHUNK_SIZE or worker counts only change how the work is done. The
+    Hacker News extraction has no file inputs, so it re-runs only when its
+    output is missing or it is forced.
+    """
+    return {
+        "download_text8": {
+            "function": ("download.download_text8", "download_text8"),
+            "inputs": [],
+            "outputs": [TEXT8_DATASET_PATH],
+            "params": {"TEXT8_DATASET_URL": TEXT8_DATASET_URL},
+        },
+        "download_hacker_news": {
+            "function": ("download.download_hacker_news", "run_extraction"),
+            "inputs": [],
+            "outputs": [hacker_news_dataset_path()],
+            "params": {"HACKER_NEWS_FORMAT": HACKER_NEWS_FORMAT},
+        },
+        "get_hacker_news_titles": {
+            "function": ("download.get_hacker_news_titles", "get_hacker_news_titles"),
+            "inputs": [hacker_news_dataset_path()],
+            "outputs": [HACKER_NEWS_TITLES_PATH]
+                       + ([TITLE_DEDUP_PATH] if DEDUP_EXACT or DEDUP_NEAR_THRESHOLD > 0 else []),
+            "params": {
+                "DEDUP_EXACT": DEDUP_EXACT,
+                "DEDUP_NEAR_THRESHOLD": DEDUP_NEAR_THRESHOLD,
+                "MINHASH_PERMUTATIONS": MINHASH_PERMUTATIONS,
+            },
+        },
+        "tokeniser": {
+            "function": ("tokeniser", "tokeniser"),
+            "inputs": [TEXT8_DATASET_PATH, HACKER_NEWS_TITLES_PATH],
+            "outputs": [COMBINED_DATASET_PATH, TOKENS_PATH, VOCAB_BIN_PATH, TOKEN_IDS_PATH, SAMPLING_TABLES_PATH]
+                       + ([VOCAB_PATH] if VOCAB_JSON_EXPORT else []),
+            "params": {
+                "MAX_VOCAB_SIZE": MAX_VOCAB_SIZE,
+                "VOCAB_CAPACITY": VOCAB_CAPACITY,
+                "VOCAB_MIN_COUNT": VOCAB_MIN_COUNT,
+                "VOCAB_JSON_EXPORT": VOCAB_JSON_EXPORT,
+                "SUBSAMPLE_THRESHOLD": SUBSAMPLE_THRESHOLD,
+                "NEGATIVE_POWER": NEGATIVE_POWER,
+            },
+        },
+        "title_dataset": {
+            "function": ("title_dataset", "build_title_dataset"),
+            "inputs": [hacker_news_dataset_path(), VOCAB_BIN_PATH],
+            "outputs": [TITLE_DATASET_PATH],
+            "params": {},
+        },
+        "title_shards": {
+            "function": ("title_shards", "build_title_shards"),
+            "inputs": [hacker_news_dataset_path(), VOCAB_BIN_PATH],
+            "outputs": [TITLE_SHARDS_DIR],
+            "params": {
+                "SHARD_TITLES": SHARD_TITLES,
+                "VALIDATION_FRACTION": VALIDATION_FRACTION,
+                "TEST_FRACTION": TEST_FRACTION,
+            },
+        },
+    }
+
+def stage_dependencies(stages):
+    """Map each stage to the stages producing its inputs."""
+    producers = {output: name for name, stage in stages.items() for output in stage["outputs"]}
+    return {name: sorted({producers[path] for path in stage["inputs"] if path in producers})
+            for name, stage in stages.items()}
+
+def load_manifest(path=PIPELINE_MANIFEST_PATH):
+    """Load the pipeline manifest, or an empty one."""
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=PIPELINE_MANIFEST_PATH):
+    """Atomically write the pipeline manifest."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _hash_file(path, digest, block_size=1024 * 1024):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+
+def content_hash(path, file_cache):
+    """SHA-256 of a file, or of every file in a directory, or None if missing.
+    
+    Hashes are cached by path, size and modification time, so unchanged
+    multi-gigabyte files are not re-read on every run.
+    """
+    if not os.path.exists(path):
+        return None
+    
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    stats = [(os.path.relpath(file, path) if file != path else "", os.stat(file)) for file in files]
+    signature = [[name, stat.st_size, stat.st_mtime_ns] for name, stat in stats]
+    
+    cached = file_cache.get(path)
+    if cached is not None and cached["signature"] == signature:
+        return cached["sha256"]
+    
+    digest = hashlib.sha256()
+    for file, (name, _) in zip(files, stats):
+        digest.update(name.encode('utf-8'))
+        _hash_file(file, digest)
+    
+    file_cache[path] = {"signature": signature, "sha256": digest.hexdigest()}
+    return file_cache[path]["sha256"]
+
+def stale_reason(name, stage, manifest):
+    """Why a stage needs to run, or None if it is up to date.
+    
+    Source stages without inputs whose outputs already exist are up to date
+    even if never recorded, as download_text8 itself assumes.
+    """
+    record = manifest["stages"].get(name)
+    if record is None:
+        if not stage["inputs"] and all(os.path.exists(path) for path in stage["outputs"]):
+            return None
+        return "never run"
+    
+    for path in stage["outputs"]:
+        current = content_hash(path, manifest["files"])
+        if current is None:
+            return f"missing output {path}"
+        if record["outputs"].get(path) != current:
+            return f"output {path} changed"
+    
+    if record["params"] != stage["params"]:
+        changed = sorted(key for key in set(record["params"]) | set(stage["params"])
+                         if record["params"].get(key) != stage["params"].get(key))
+        return f"parameters changed: {', '.join(changed)}"
+    
+    for path in stage["inputs"]:
+        if record["inputs"].get(path) != content_hash(path, manifest["files"]):
+            return f"input {path} changed"
+    
+    return None
+
+def record_stage(name, stage, manifest, elapsed=None):
+    """Record a stage's current input and output hashes and parameters."""
+    manifest["stages"][name] = {
+        "inputs": {path: content_hash(path, manifest["files"]) for path in stage["inputs"]},
+        "outputs": {path: content_hash(path, manifest["files"]) for path in stage["outputs"]},
+        "params": stage["params"],
+        "elapsed_seconds": None if elapsed is None else round(elapsed, 3),
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def run_stage(name, function):
+    """Import and run a stage function; runs in a worker process."""
+    module_name, function_name = function
+    try:
+        module = importlib.import_module(f"src.{module_name}")
+    except ModuleNotFoundError:
+        # When running as a script directly
+        module = importlib.import_module(module_name)
+    
+    start = time.time()
+    with instrument_stage(name):
+        getattr(module, function_name)()
+    return time.time() - start
+
+def run_pipeline(targets=None, force=False, dry_run=False, jobs=PIPELINE_JOBS):
+    """Run the requested stages and their dependencies, skipping up-to-date ones.
+    
+    A stage runs if it was never recorded, an output is missing or modified,
+    its parameters changed, or an input's content hash differs from the one
+    recorded when it last ran (which also covers upstream stages that just
+    re-ran). Independent stages run in parallel, up to jobs at a time.
+    """
+    ensure_directories()
+    
+    stages = get_stages()
+    dependencies = stage_dependencies(stages)
+    
+    # Requested stages plus everything upstream of them
+    selected = set()
+    pending_targets = list(targets or stages)
+    while pending_targets:
+        name = pending_targets.pop()
+        if name not in stages:
+            raise ValueError(f"Unknown stage: {name}")
+        if name not in selected:
+            selected.add(name)
+            pending_targets.extend(dependencies[name])
+    
+    manifest = load_manifest()
+    done, failed, running = set(), set(), {}
+    # Set before the workers start so every stage of this run reports under one id
+    current_run = run_id()
+    would_run = set()
+    results = {}
+    
+    if dry_run:
+        executor = nullcontext()
+    else:
+        # A dry run starts no processes, so it skips the multiprocessing imports too
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=jobs)
+    
+    with executor:
+        while len(done) + len(failed) < len(selected):
+            # Decide on every stage whose dependencies have all finished
+            decided = False
+            for name in sorted(selected - done - failed - set(running.values())):
+                if any(dependency in failed for dependency in dependencies[name]):
+                    print(f"[{name}] skipped: an upstream stage failed")
+                    failed.add(name)
+                    decided = True
+                    continue
+                if not all(dependency in done for dependency in dependencies[name]):
+                    continue
+                
+                decided = True
+                if force:
+                    reason = "forced"
+                elif any(dependency in would_run for dependency in dependencies[name]):
+                    reason = "an upstream stage would run"
+                else:
+                    reason = stale_reason(name, stages[name], manifest)
+                if reason is None:
+                    print(f"[{name}] up to date")
+                    if name not in manifest["stages"] and not dry_run:
+                        record_stage(name, stages[name], manifest)
+                    results[name] = "up to date"
+                    done.add(name)
+                elif dry_run:
+                    print(f"[{name}] would run: {reason}")
+                    results[name] = "would run"
+                    would_run.add(name)
+                    done.add(name)
+                else:
+                    print(f"[{name}] running: {reason}")
+                    running[executor.submit(run_stage, name, stages[name]["function"])] = name
+            
+            if not running:
+                if not decided:
+                    raise RuntimeError(f"Stages cannot be scheduled: {sorted(selected - done - failed)}")
+                continue
+            
+            from concurrent.futures import wait, FIRST_COMPLETED
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                stage = stages[name]
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    print(f"[{name}] failed: {e}")
+                    failed.add(name)
+                    continue
+                
+                missing = [path for path in stage["outputs"] if not os.path.exists(path)]
+                if missing:
+                    print(f"[{name}] failed: did not produce {', '.join(missing)}")
+                    failed.add(name)
+                    continue
+                
+                record_stage(name, stage, manifest, elapsed)
+                save_manifest(manifest)
+                print(f"[{name}] finished in {elapsed:.2f} seconds")
+                results[name] = "ran"
+                done.add(name)
+    
+    if not dry_run:
+        save_manifest(manifest)
+    
+    if "ran" in results.values() or failed:
+        print_summary(read_report(run=current_run))
+    
+    for name in sorted(failed):
+        results[name] = "failed"
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline stages whose inputs or parameters changed")
+    parser.add_argument("stages", nargs="*",
+                        help=f"Stages to bring up to date, with their dependencies: {', '.join(get_stages())} (default: all)")
+    parser.add_argument("--force", action="store_true", help="Run the selected stages even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages would run")
+    parser.add_argument("--jobs", type=int, default=PIPELINE_JOBS, help="Maximum number of stages run at once")
+    args = parser.parse_args()
+    
+    results = run_pipeline(args.stages, force=args.force, dry_run=args.dry_run, jobs=args.jobs)
+    if "failed" in results.values():
+        raise SystemExit(1)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# Subsampling and negative-sampling tables for word2vec training
+
+import os
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import VOCAB_BIN_PATH, SAMPLING_TABLES_PATH, SUBSAMPLE_THRESHOLD, NEGATIVE_POWER
+    from src.vocab import load_vocab
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import VOCAB_BIN_PATH, SAMPLING_TABLES_PATH, SUBSAMPLE_THRESHOLD, NEGATIVE_POWER
+    from vocab import load_vocab
+
+def keep_probabilities(counts, threshold=SUBSAMPLE_THRESHOLD):
+    """Probability of keeping each token id under frequent-word subsampling.
+    
+    Uses the word2vec formula (sqrt(f / t) + 1) * t / f for a token with
+    corpus frequency f, capped at 1. The array has one extra entry for
+    unk_id, which is always kept, so it can be indexed with tokens.bin ids.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    keep = np.ones(len(counts) + 1, dtype=np.float32)
+    total = counts.sum()
+    if threshold <= 0 or total == 0:
+        return keep
+    
+    frequency = counts / total
+    with np.errstate(divide='ignore'):
+        keep[:-1] = np.minimum((np.sqrt(frequency / threshold) + 1) * threshold / frequency, 1.0)
+    return keep
+
+def build_alias_table(weights):
+    """Build Vose's alias table for drawing ids in proportion to weights.
+    
+    Returns (prob, alias): draw a column i uniformly, then keep i with
+    probability prob[i], otherwise take alias[i].
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(weights)
+    if n == 0 or weights.sum() <= 0:
+        raise ValueError("Cannot build an alias table without positive weights")
+    
+    scaled = weights * (n / weights.sum())
+    prob = np.ones(n, dtype=np.float64)
+    alias = np.arange(n, dtype=np.int64)
+    small = np.flatnonzero(scaled < 1.0).tolist()
+    large = np.flatnonzero(scaled >= 1.0).tolist()
+    
+    while small and large:
+        less, more = small.pop(), large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        if scaled[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+    
+    # Whatever remains is 1 up to rounding error
+    return prob, alias
+
+def sample_alias(prob, alias, size, rng=None):
+    """Draw size ids from an alias table in O(1) per draw, without Python loops."""
+    rng = np.random.default_rng() if rng is None else rng
+    columns = rng.integers(0, len(prob), size=size)
+    return np.where(rng.random(size=size) < prob[columns], columns, alias[columns])
+
+class SamplingTables:
+    """Keep probabilities and the unigram^power alias table for one vocabulary."""
+    
+    def __init__(self, keep, alias_prob, alias_index, threshold=SUBSAMPLE_THRESHOLD, power=NEGATIVE_POWER):
+        self.keep = keep
+        self.alias_prob = alias_prob
+        self.alias_index = alias_index
+        self.threshold = threshold
+        self.power = power
+    
+    @classmethod
+    def from_counts(cls, counts, threshold=SUBSAMPLE_THRESHOLD, power=NEGATIVE_POWER):
+        """Build the tables from vocabulary counts in id order."""
+        counts = np.asarray(counts, dtype=np.float64)
+        alias_prob, alias_index = build_alias_table(counts ** power)
+        return cls(keep_probabilities(counts, threshold), alias_prob, alias_index, threshold, power)
+    
+    def subsample(self, token_ids, rng=None):
+        """Drop frequent tokens from an id array, keeping each with its keep probability."""
+        rng = np.random.default_rng() if rng is None else rng
+        return token_ids[rng.random(len(token_ids)) < self.keep[token_ids]]
+    
+    def sample_negatives(self, size, rng=None):
+        """Draw negative ids from unigram^power; size may be a shape such as (batch, k)."""
+        return sample_alias(self.alias_prob, self.alias_index, size, rng)
+    
+    def save(self, path=SAMPLING_TABLES_PATH):
+        np.savez(path, keep=self.keep, alias_prob=self.alias_prob, alias_index=self.alias_index,
+                 threshold=self.threshold, power=self.power)
+        print(f"Sampling tables saved to {path}")
+        return path
+
+def save_sampling_tables(counts, path=SAMPLING_TABLES_PATH, threshold=SUBSAMPLE_THRESHOLD, power=NEGATIVE_POWER):
+    """Build the sampling tables from vocabulary counts and save them, if the vocabulary is not empty."""
+    if len(counts) == 0:
+        print("Empty vocabulary, no sampling tables saved")
+        return None
+    return SamplingTables.from_counts(counts, threshold, power).save(path)
+
+def load_sampling_tables(path=SAMPLING_TABLES_PATH):
+    """Load sampling tables saved by save_sampling_tables."""
+    with np.load(path) as data:
+        return SamplingTables(data["keep"], data["alias_prob"], data["alias_index"],
+                              float(data["threshold"]), float(data["power"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the sampling tables from the binary vocabulary")
+    parser.add_argument("--threshold", type=float, default=SUBSAMPLE_THRESHOLD,
+                        help="Subsampling threshold t, 0 to keep every token")
+    parser.add_argument("--power", type=float, default=NEGATIVE_POWER,
+                        help="Exponent applied to counts for negative sampling")
+    args = parser.parse_args()
+    
+    vocab = load_vocab(VOCAB_BIN_PATH)
+    save_sampling_tables(vocab.counts, threshold=args.threshold, power=args.power)
+    
+    tables = load_sampling_tables()
+    print(f"Sampling tables at {SAMPLING_TABLES_PATH}: {os.path.getsize(SAMPLING_TABLES_PATH):,} bytes")
+    for token_id in range(min(len(vocab), 5)):
+        print(f"{vocab.id_to_token(token_id)}: keep probability {tables.keep[token_id]:.4f}")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# Linear score regressor on pooled title embeddings
+
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        TITLE_DATASET_PATH, VOCAB_BIN_PATH, EMBEDDINGS_PATH, SCORE_MODEL_PATH, RIDGE_ALPHA
+    )
+    from src.vocab import load_vocab
+    from src.embeddings import load_embeddings
+    from src.title_dataset import load_title_dataset, pool_titles
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        TITLE_DATASET_PATH, VOCAB_BIN_PATH, EMBEDDINGS_PATH, SCORE_MODEL_PATH, RIDGE_ALPHA
+    )
+    from vocab import load_vocab
+    from embeddings import load_embeddings
+    from title_dataset import load_title_dataset, pool_titles
+
+class ScoreModel:
+    """Ridge regression from a pooled title embedding to log1p(score).
+    
+    embedding_rows and row_hash record the embeddings file the features
+    were pooled from, so a predictor can refuse to pool from another one.
+    """
+    
+    def __init__(self, weights, bias, embedding_rows=None, row_hash=None):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.embedding_rows = embedding_rows
+        self.row_hash = row_hash
+    
+    @classmethod
+    def fit(cls, features, scores, alpha=RIDGE_ALPHA):
+        """Fit in closed form; rows with a missing score are skipped."""
+        known = ~np.isnan(scores)
+        features = features[known].astype(np.float64)
+        targets = np.log1p(np.maximum(scores[known].astype(np.float64), 0))
+        mean_features, mean_target = features.mean(axis=0), targets.mean()
+        centered = features - mean_features
+        # The bias is not penalised, so solve on centred data
+        gram = centered.T @ centered + alpha * np.eye(features.shape[1])
+        weights = np.linalg.solve(gram, centered.T @ (targets - mean_target))
+        return cls(weights, mean_target - mean_features @ weights)
+    
+    def predict(self, features):
+        """Predicted scores for a (batch, dim) array of pooled title embeddings."""
+        return np.expm1(features @ self.weights + self.bias)
+    
+    def check_embeddings(self, embeddings):
+        """Raise ValueError unless embeddings pool the same features the model was fit on."""
+        if self.embedding_rows is None:
+            return
+        if len(embeddings) != self.embedding_rows or embeddings.row_hash() != self.row_hash:
+            raise ValueError(f"The score model was fit on another embeddings export than {embeddings.path} "
+                             f"({self.embedding_rows:,} rows, not {len(embeddings):,}); train it again")
+    
+    def save(self, path=SCORE_MODEL_PATH):
+        embedding = {} if self.embedding_rows is None else {"embedding_rows": self.embedding_rows,
+                                                           "row_hash": np.uint64(self.row_hash)}
+        np.savez(path, weights=self.weights, bias=self.bias, **embedding)
+        print(f"Score model saved to {path}")
+        return path
+
+def load_score_model(path=SCORE_MODEL_PATH):
+    """Load a model saved by ScoreModel.save."""
+    with np.load(path) as data:
+        if "row_hash" not in data:
+            return ScoreModel(data["weights"], float(data["bias"]))
+        return ScoreModel(data["weights"], float(data["bias"]), int(data["embedding_rows"]),
+                          int(data["row_hash"]))
+
+def pool_embeddings(dataset, embeddings):
+    """Mean-pooled title features as ScorePredictor computes them from an embeddings file.
+    
+    Tokens without an exported row, such as words beyond the file's top_k
+    and unknown words, are left out of the mean rather than counted as zero.
+    """
+    ids = np.arange(dataset.unk_id + 1)
+    matrix = embeddings.rows(ids)
+    weights = embeddings.has_rows(ids).astype(np.float32)
+    return pool_titles(dataset.offsets, dataset.ids, matrix, weights, dataset.unk_id)
+
+def train_score_model(alpha=RIDGE_ALPHA, validation_fraction=0.1, seed=0):
+    """Fit the model on mean-pooled title embeddings and report validation RMSE in log1p space.
+    
+    Features are pooled from the exported embeddings file that serving
+    loads, at its precision and with its rows, so both see the same ones.
+    """
+    dataset = load_title_dataset(TITLE_DATASET_PATH)
+    vocab = load_vocab(VOCAB_BIN_PATH)
+    if dataset.unk_id != len(vocab):
+        raise ValueError(f"{TITLE_DATASET_PATH} was encoded with another vocabulary than {VOCAB_BIN_PATH}")
+    embeddings = load_embeddings(EMBEDDINGS_PATH, vocab)
+    features = pool_embeddings(dataset, embeddings)
+    
+    validation = np.random.default_rng(seed).random(len(dataset)) < validation_fraction
+    model = ScoreModel.fit(features[~validation], dataset.score[~validation], alpha)
+    model.embedding_rows, model.row_hash = len(embeddings), embeddings.row_hash()
+    
+    known = validation & ~np.isnan(dataset.score)
+    if known.any():
+        targets = np.log1p(np.maximum(dataset.score[known], 0))
+        train_mean = np.nanmean(np.log1p(np.maximum(dataset.score[~validation], 0)))
+        rmse = np.sqrt(np.mean((np.log1p(model.predict(features[known])) - targets) ** 2))
+        baseline = np.sqrt(np.mean((train_mean - targets) ** 2))
+        print(f"Validation RMSE (log1p score): {rmse:.4f} on {known.sum():,} titles, "
+              f"{baseline:.4f} predicting the mean")
+    
+    model.save()
+    return model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the title score regressor")
+    parser.add_argument("--alpha", type=float, default=RIDGE_ALPHA, help="Ridge penalty")
+    args = parser.parse_args()
+    
+    train_score_model(alpha=args.alpha)
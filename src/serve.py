@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# Asyncio HTTP service predicting Hacker News scores for titles, with micro-batching
+
+import time
+import json
+import asyncio
+import argparse
+from collections import OrderedDict, deque
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        VOCAB_BIN_PATH, EMBEDDINGS_PATH, SCORE_MODEL_PATH, SERVE_HOST, SERVE_PORT,
+        SERVE_MAX_BATCH, SERVE_MAX_WAIT_MS, SERVE_CACHE_SIZE
+    )
+    from src.vocab import load_vocab
+    from src.embeddings import load_embeddings
+    from src.score_model import load_score_model
+    from src.download.get_hacker_news_titles import clean_title
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        VOCAB_BIN_PATH, EMBEDDINGS_PATH, SCORE_MODEL_PATH, SERVE_HOST, SERVE_PORT,
+        SERVE_MAX_BATCH, SERVE_MAX_WAIT_MS, SERVE_CACHE_SIZE
+    )
+    from vocab import load_vocab
+    from embeddings import load_embeddings
+    from score_model import load_score_model
+    from download.get_hacker_news_titles import clean_title
+
+LATENCY_WINDOW = 10000  # Recent requests kept for the latency percentiles
+QPS_WINDOW = 10.0  # Seconds of recent requests the QPS is measured over
+MAX_BODY_BYTES = 1 << 20
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class EmbeddingCache:
+    """Bounded LRU cache from cleaned title to pooled embedding."""
+    
+    def __init__(self, max_size=SERVE_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        vector = self.entries.get(key)
+        if vector is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return vector
+    
+    def put(self, key, vector):
+        self.entries[key] = vector
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+class ScorePredictor:
+    """Cleans, embeds and scores batches of titles with the trained embeddings and regressor.
+    
+    The embeddings are memory-mapped and checked against the vocabulary, so
+    replicas start without torch and share one copy in the page cache. The
+    model must have been fit on features pooled from the same file.
+    """
+    
+    def __init__(self, vocab_path=VOCAB_BIN_PATH, embeddings_path=EMBEDDINGS_PATH,
+                 model_path=SCORE_MODEL_PATH, cache_size=SERVE_CACHE_SIZE):
+        self.vocab = load_vocab(vocab_path)
+        self.embeddings = load_embeddings(embeddings_path, self.vocab)
+        self.model = load_score_model(model_path)
+        self.model.check_embeddings(self.embeddings)
+        self.cache = EmbeddingCache(cache_size)
+    
+    def embed(self, cleaned):
+        """Mean embedding of a cleaned title's in-vocabulary tokens, zero if it has none."""
+        vector = self.cache.get(cleaned)
+        if vector is None:
+            # Tokens outside the vocabulary, or beyond the exported rows, are skipped
+            ids = np.array([self.vocab.token_to_id(token) for token in cleaned.split()], dtype=np.int64)
+            ids = ids[self.embeddings.has_rows(ids)]
+            vector = (self.embeddings.rows(ids).mean(axis=0) if len(ids)
+                      else np.zeros(self.embeddings.dim, dtype=np.float32))
+            self.cache.put(cleaned, vector)
+        return vector
+    
+    def predict(self, titles):
+        """Predicted scores for a list of raw titles, in one matrix product."""
+        features = np.stack([self.embed(clean_title(title)) for title in titles])
+        return self.model.predict(features).tolist()
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for one forward pass each.
+    
+    A batch is sent as soon as it holds max_batch titles or max_wait seconds
+    after its first title arrived, whichever comes first. Forward passes run
+    in a worker thread so the event loop keeps accepting requests.
+    """
+    
+    def __init__(self, predict, max_batch=SERVE_MAX_BATCH, max_wait=SERVE_MAX_WAIT_MS / 1000):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.batched_titles = 0
+    
+    async def submit(self, title):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((title, future))
+        return await future
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            titles = [title for title, _ in batch]
+            try:
+                scores = await loop.run_in_executor(None, self.predict, titles)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            self.batches += 1
+            self.batched_titles += len(batch)
+            for (_, future), score in zip(batch, scores):
+                if not future.done():
+                    future.set_result(score)
+
+class ScoreService:
+    """HTTP/1.1 endpoints over a micro-batched ScorePredictor.
+    
+    POST /predict takes {"title": ...} or {"titles": [...]}; GET /ready
+    reports warm-up status (503 until warm); GET /metrics reports QPS,
+    latency percentiles, batching and cache counters.
+    """
+    
+    def __init__(self, max_batch=SERVE_MAX_BATCH, max_wait_ms=SERVE_MAX_WAIT_MS, cache_size=SERVE_CACHE_SIZE,
+                 predictor_factory=None):
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.cache_size = cache_size
+        self.predictor_factory = predictor_factory or (lambda: ScorePredictor(cache_size=cache_size))
+        self.predictor = None
+        self.batcher = None
+        self.warmup = {"status": "starting", "seconds": None, "error": None}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.completions = deque()  # finish times of the requests in the last QPS_WINDOW seconds
+        self.requests = 0
+        self.errors = 0
+        self.started = time.time()
+    
+    async def warm_up(self):
+        """Load the artifacts and run a first batch off the event loop, then start batching."""
+        start = time.time()
+        self.warmup["status"] = "loading"
+        loop = asyncio.get_running_loop()
+        try:
+            self.predictor = await loop.run_in_executor(None, self.predictor_factory)
+            # The first forward pass pays for lazy allocations; keep it off real requests
+            await loop.run_in_executor(None, self.predictor.predict, ["warm up"])
+        except Exception as e:
+            self.warmup.update(status="failed", error=str(e))
+            print(f"Warm-up failed: {e}")
+            return
+        
+        self.batcher = MicroBatcher(self.predictor.predict, self.max_batch, self.max_wait_ms / 1000)
+        self.batch_task = asyncio.create_task(self.batcher.run())
+        self.warmup.update(status="ready", seconds=round(time.time() - start, 3))
+        print(f"Ready after {self.warmup['seconds']:.2f} seconds")
+    
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        now = time.perf_counter()
+        while self.completions and self.completions[0] < now - QPS_WINDOW:
+            self.completions.popleft()
+        window = min(QPS_WINDOW, time.time() - self.started)
+        cache = self.predictor.cache if self.predictor else None
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "qps": round(len(self.completions) / max(window, 1e-9), 2),
+            "latency_ms": {"p50": round(float(np.percentile(latencies, 50)), 3),
+                           "p99": round(float(np.percentile(latencies, 99)), 3),
+                           "window": len(self.latencies)},
+            "batches": self.batcher.batches if self.batcher else 0,
+            "mean_batch_size": round(self.batcher.batched_titles / max(self.batcher.batches, 1), 2)
+                               if self.batcher else 0,
+            "cache": {"size": len(cache.entries), "hits": cache.hits, "misses": cache.misses} if cache else None,
+        }
+    
+    async def handle_predict(self, body):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "Body must be JSON"}
+        if not isinstance(payload, dict):
+            return 400, {"error": 'Expected {"title": str} or {"titles": [str, ...]}'}
+        titles = payload.get("titles", [payload["title"]] if "title" in payload else None)
+        if not isinstance(titles, list) or not all(isinstance(title, str) for title in titles):
+            return 400, {"error": 'Expected {"title": str} or {"titles": [str, ...]}'}
+        
+        scores = await asyncio.gather(*(self.batcher.submit(title) for title in titles))
+        if "titles" in payload:
+            return 200, {"scores": scores}
+        return 200, {"score": scores[0]}
+    
+    async def route(self, method, path, body):
+        if path == "/ready":
+            return (200 if self.batcher else 503), {"ready": self.batcher is not None, "warmup": self.warmup}
+        if path == "/metrics":
+            return 200, self.metrics()
+        if path == "/predict":
+            if method != "POST":
+                return 405, {"error": "Use POST"}
+            if self.batcher is None:
+                return 503, {"error": "Not ready", "warmup": self.warmup}
+            return await self.handle_predict(body)
+        return 404, {"error": f"No route for {path}"}
+    
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode('latin-1').split(maxsplit=2)
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, response = 413, {"error": "Body too large"}
+                    body = None
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                
+                start = time.perf_counter()
+                if body is not None:
+                    try:
+                        status, response = await self.route(method, path.split("?")[0], body)
+                    except Exception as e:
+                        status, response = 500, {"error": str(e)}
+                if path.startswith("/predict"):
+                    self.requests += 1
+                    self.errors += status != 200
+                    self.completions.append(time.perf_counter())
+                    self.latencies.append(self.completions[-1] - start)
+                
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and not version.strip().upper().endswith("1.0"))
+                data = json.dumps(response).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                             + data)
+                await writer.drain()
+                if not keep_alive or status == 413:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host=SERVE_HOST, port=SERVE_PORT, max_batch=SERVE_MAX_BATCH, max_wait_ms=SERVE_MAX_WAIT_MS,
+                cache_size=SERVE_CACHE_SIZE):
+    """Run the service until cancelled; it accepts connections while warming up."""
+    service = ScoreService(max_batch, max_wait_ms, cache_size)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Serving on http://{host}:{port} (max batch {max_batch}, max wait {max_wait_ms} ms)")
+    # Keep a reference so the task is not garbage collected while it runs
+    service.warmup_task = asyncio.create_task(service.warm_up())
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Hacker News score predictions over HTTP")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--max-batch", type=int, default=SERVE_MAX_BATCH, help="Most titles per forward pass")
+    parser.add_argument("--max-wait-ms", type=float, default=SERVE_MAX_WAIT_MS,
+                        help="Longest a title waits for its batch to fill")
+    parser.add_argument("--cache-size", type=int, default=SERVE_CACHE_SIZE, help="Cached title embeddings")
+    args = parser.parse_args()
+    
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_wait_ms, args.cache_size))
+    except KeyboardInterrupt:
+        pass
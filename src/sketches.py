@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# Probabilistic sketches for corpora that don't fit in memory
+
+import hashlib
+import numpy as np
+
+def hash64(tokens):
+    """Stable 64-bit hashes of a list of strings as a uint64 array."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+         for token in tokens),
+        dtype=np.uint64, count=len(tokens))
+
+class HyperLogLog:
+    """Cardinality estimate in 2**precision one-byte registers.
+    
+    The relative standard error is about 1.04 / sqrt(2**precision), so 0.8%
+    with the default precision of 14 (16 KB).
+    """
+    
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+    
+    def add_hashes(self, hashes):
+        """Add items by their 64-bit hashes."""
+        if len(hashes) == 0:
+            return
+        value_bits = 64 - self.precision
+        index = (hashes >> np.uint64(value_bits)).astype(np.intp)
+        # The remaining bits fit in a float64 exactly, so frexp gives their bit length
+        rest = (hashes & np.uint64((1 << value_bits) - 1)).astype(np.float64)
+        _, bit_length = np.frexp(rest)
+        rank = (value_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+    
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+    
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate while many registers are still empty
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+class CountMinSketch:
+    """Frequency estimates that never undercount, in depth x width counters.
+    
+    Each estimate exceeds the true count by at most 2 * total / width with
+    probability 1 - 0.5**depth.
+    """
+    
+    def __init__(self, width=1 << 20, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+    
+    def _columns(self, hashes):
+        # Double hashing: row i uses h1 + i * h2
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        with np.errstate(over='ignore'):
+            return [((h1 + np.uint64(row) * h2) % np.uint64(self.width)).astype(np.intp)
+                    for row in range(self.depth)]
+    
+    def add_hashes(self, hashes, counts):
+        """Add counts for items given by their 64-bit hashes."""
+        if len(hashes) == 0:
+            return
+        counts = np.asarray(counts, dtype=np.int64)
+        for row, columns in enumerate(self._columns(hashes)):
+            self.table[row] += np.bincount(columns, weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+    
+    def estimate_hashes(self, hashes):
+        """Estimated counts for items given by their 64-bit hashes."""
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.min([self.table[row, columns] for row, columns in enumerate(self._columns(hashes))], axis=0)
+
+def splitmix64(values):
+    """The splitmix64 finalizer, spreading uint64 values into well-mixed 64-bit hashes."""
+    with np.errstate(over='ignore'):
+        z = np.asarray(values, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+class HashSet:
+    """Set of 64-bit hashes in an open-addressing uint64 table.
+    
+    The table doubles whenever it would be more than half full, so each hash
+    takes 16 to 32 bytes, against about 100 in a Python set of ints. Slots
+    holding 0 are empty, so a hash of 0 is stored as 1.
+    """
+    
+    def __init__(self, table=None, size=0):
+        self.table = np.zeros(16, dtype=np.uint64) if table is None else table
+        self.size = size
+    
+    def __len__(self):
+        return self.size
+    
+    def _insert(self, hashes):
+        """Insert distinct non-zero hashes; True where a hash was not already present."""
+        mask = np.uint64(len(self.table) - 1)
+        slots = hashes & mask
+        new = np.zeros(len(hashes), dtype=bool)
+        pending = np.arange(len(hashes))
+        while len(pending):
+            current = self.table[slots[pending]]
+            empty = current == 0
+            # Hashes racing for the same empty slot: the first takes it, the rest probe on next round
+            claimants = pending[empty]
+            if len(claimants):
+                _, first = np.unique(slots[claimants], return_index=True)
+                winners = claimants[first]
+                self.table[slots[winners]] = hashes[winners]
+                new[winners] = True
+            occupied = pending[~empty & (current != hashes[pending])]
+            slots[occupied] = (slots[occupied] + np.uint64(1)) & mask
+            pending = pending[(current != hashes[pending]) & ~new[pending]]
+        return new
+    
+    def _grow(self):
+        present = self.table[self.table != 0]
+        self.table = np.zeros(len(self.table) * 2, dtype=np.uint64)
+        self._insert(present)
+    
+    def add_hashes(self, hashes):
+        """Add hashes and return a mask that is True where a hash was new.
+        
+        A hash repeated within hashes is new only at its first occurrence.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64).copy()
+        hashes[hashes == 0] = 1
+        unique, first = np.unique(hashes, return_index=True)
+        while (self.size + len(unique)) * 2 > len(self.table):
+            self._grow()
+        inserted = self._insert(unique)
+        self.size += int(inserted.sum())
+        new = np.zeros(len(hashes), dtype=bool)
+        new[first[inserted]] = True
+        return new
+
+# Universal hashing modulo a Mersenne prime keeps a * h + b within 64 bits for 32-bit h
+MERSENNE_PRIME = (1 << 31) - 1
+
+class MinHash:
+    """MinHash signatures of token sets, one minimum per random universal hash.
+    
+    The fraction of equal positions in two signatures estimates the Jaccard
+    similarity of the sets.
+    """
+    
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+    
+    def signatures(self, token_hashes, set_starts):
+        """Signatures of consecutive non-empty sets as a (sets, num_perm) uint32 array.
+        
+        token_hashes holds the 64-bit hashes of every set's tokens back to
+        back and set_starts the position where each set begins.
+        """
+        low_bits = (np.asarray(token_hashes, dtype=np.uint64) & np.uint64(0xFFFFFFFF))[:, None]
+        values = (low_bits * self.a + self.b) % np.uint64(MERSENNE_PRIME)
+        return np.minimum.reduceat(values, set_starts, axis=0).astype(np.uint32)
+
+def lsh_parameters(threshold, num_perm):
+    """(bands, rows) with bands * rows == num_perm whose candidate threshold is closest to threshold.
+    
+    Sets become candidates with probability 1 - (1 - J**rows)**bands at
+    Jaccard similarity J, which rises steeply around (1 / bands)**(1 / rows).
+    """
+    divisors = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    bands = min(divisors, key=lambda bands: abs((1 / bands) ** (bands / num_perm) - threshold))
+    return bands, num_perm // bands
+
+def band_keys(signatures, bands, rows):
+    """A 64-bit key per band of each signature, as a (sets, bands) array; bands never share keys."""
+    banded = signatures[:, :bands * rows].astype(np.uint64).reshape(len(signatures), bands, rows)
+    keys = np.broadcast_to(np.arange(bands, dtype=np.uint64), (len(signatures), bands))
+    for row in range(rows):
+        keys = splitmix64(keys ^ banded[:, :, row])
+    return keys
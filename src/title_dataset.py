@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# Per-title token ids in CSR form with scores, and vectorized title-embedding pooling
+
+import os
+import warnings
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        VOCAB_BIN_PATH, WORD2VEC_CHECKPOINT_PATH, TITLE_DATASET_PATH, TITLE_FEATURES_PATH,
+        CHUNK_SIZE, POOL_BLOCK_TITLES, ensure_directories
+    )
+    from src.vocab import load_vocab
+    from src.token_ids import token_id_dtype
+    from src.download.hacker_news_io import hacker_news_dataset_path, iter_hacker_news_chunks
+    from src.download.get_hacker_news_titles import clean_titles
+    from src.instrumentation import instrumented, increment
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        VOCAB_BIN_PATH, WORD2VEC_CHECKPOINT_PATH, TITLE_DATASET_PATH, TITLE_FEATURES_PATH,
+        CHUNK_SIZE, POOL_BLOCK_TITLES, ensure_directories
+    )
+    from vocab import load_vocab
+    from token_ids import token_id_dtype
+    from download.hacker_news_io import hacker_news_dataset_path, iter_hacker_news_chunks
+    from download.get_hacker_news_titles import clean_titles
+    from instrumentation import instrumented, increment
+
+TITLE_COLUMNS = ['item_id', 'title', 'score', 'time', 'author_id']
+
+def time_to_seconds(times):
+    """Unix seconds as int64 from integer or timestamp times; missing times become -1."""
+    import pandas as pd
+    
+    if pd.api.types.is_numeric_dtype(times):
+        return times.fillna(-1).astype(np.int64).to_numpy()
+    parsed = pd.to_datetime(times, utc=True, errors='coerce')
+    seconds = (parsed - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+    return seconds.fillna(-1).astype(np.int64).to_numpy()
+
+class TitleDataset:
+    """Cleaned titles as token ids in CSR form, with one row of metadata per title.
+    
+    The ids of title i are ids[offsets[i]:offsets[i + 1]], encoded with the
+    binary vocabulary; out-of-vocabulary tokens are kept as unk_id. Scores
+    are float32 with NaN where missing, times are Unix seconds (-1 where
+    missing) and author_id indexes authors (-1 where missing).
+    """
+    
+    def __init__(self, offsets, ids, score, time, author_id, item_id, authors, unk_id):
+        self.offsets = offsets
+        self.ids = ids
+        self.score = score
+        self.time = time
+        self.author_id = author_id
+        self.item_id = item_id
+        self.authors = authors
+        self.unk_id = unk_id
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def lengths(self):
+        return np.diff(self.offsets)
+    
+    def title_ids(self, index):
+        return self.ids[self.offsets[index]:self.offsets[index + 1]]
+    
+    def save(self, path=TITLE_DATASET_PATH):
+        np.savez(path, offsets=self.offsets, ids=self.ids, score=self.score, time=self.time,
+                 author_id=self.author_id, item_id=self.item_id, authors=self.authors, unk_id=self.unk_id)
+        print(f"Title dataset saved to {path} ({len(self):,} titles, {len(self.ids):,} tokens)")
+        return path
+
+def load_title_dataset(path=TITLE_DATASET_PATH):
+    """Load a title dataset saved by build_title_dataset."""
+    with np.load(path) as data:
+        return TitleDataset(data["offsets"], data["ids"], data["score"], data["time"], data["author_id"],
+                            data["item_id"], data["authors"], int(data["unk_id"]))
+
+@instrumented()
+def build_title_dataset(path=TITLE_DATASET_PATH, vocab_path=VOCAB_BIN_PATH, dataset_path=None,
+                        chunk_size=CHUNK_SIZE):
+    """Encode every non-empty cleaned title of the Hacker News dump, keeping its metadata.
+    
+    Titles are cleaned as for hacker_news_titles.txt but deliberately not
+    deduplicated: each repost of a title has its own score, so every one is
+    kept with its own token ids, score, time and author.
+    """
+    ensure_directories()
+    
+    import pandas as pd
+    
+    dataset_path = dataset_path or hacker_news_dataset_path()
+    if not os.path.exists(dataset_path):
+        print(f"Error: Hacker News dataset not found at {dataset_path}")
+        return
+    
+    vocab = load_vocab(vocab_path)
+    dtype = token_id_dtype(len(vocab))
+    author_index = {}
+    parts = {name: [] for name in ("lengths", "ids", "score", "time", "author_id", "item_id")}
+    
+    for chunk in iter_hacker_news_chunks(columns=TITLE_COLUMNS, path=dataset_path, chunk_size=chunk_size):
+        titles = clean_titles(chunk['title'])
+        chunk = chunk[(titles != "").to_numpy()]
+        tokens = [title.split() for title in titles[titles != ""].tolist()]
+        
+        parts["lengths"].append(np.fromiter((len(title) for title in tokens), dtype=np.int64, count=len(tokens)))
+        parts["ids"].append(vocab.encode([token for title in tokens for token in title], dtype=dtype))
+        parts["score"].append(pd.to_numeric(chunk['score'], errors='coerce').to_numpy(dtype=np.float32))
+        parts["time"].append(time_to_seconds(chunk['time']))
+        parts["item_id"].append(chunk['item_id'].to_numpy(dtype=np.int64))
+        # Authors get ids in order of first appearance across chunks
+        parts["author_id"].append(np.fromiter(
+            (author_index.setdefault(author, len(author_index)) if isinstance(author, str) else -1
+             for author in chunk['author_id'].tolist()),
+            dtype=np.int32, count=len(chunk)))
+        increment("titles", len(tokens))
+        increment("tokens", len(parts["ids"][-1]))
+        print(f"Encoded {sum(len(lengths) for lengths in parts['lengths']):,} titles so far...")
+    
+    lengths = np.concatenate(parts["lengths"]) if parts["lengths"] else np.zeros(0, dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    
+    def concatenate(name, dtype):
+        return np.concatenate(parts[name]) if parts[name] else np.zeros(0, dtype=dtype)
+    
+    dataset = TitleDataset(offsets, concatenate("ids", dtype), concatenate("score", np.float32),
+                           concatenate("time", np.int64), concatenate("author_id", np.int32),
+                           concatenate("item_id", np.int64), np.array(list(author_index), dtype=str),
+                           vocab.unk_id)
+    dataset.save(path)
+    return dataset
+
+def idf_weights(offsets, ids, vocab_size):
+    """Inverse document frequency log(N / df) of every id, treating each title as a document."""
+    num_titles = len(offsets) - 1
+    title_index = np.repeat(np.arange(num_titles, dtype=np.int64), np.diff(offsets))
+    # Each (title, id) pair counts once towards the id's document frequency. The
+    # keys are already ordered by title, which a stable (radix/merge) sort
+    # exploits, where np.unique's quicksort would not
+    pairs = np.sort(title_index * (vocab_size + 1) + ids.astype(np.int64), kind='stable')
+    first = np.ones(len(pairs), dtype=bool)
+    first[1:] = pairs[1:] != pairs[:-1]
+    df = np.bincount(pairs[first] % (vocab_size + 1), minlength=vocab_size + 1)
+    return np.log(max(num_titles, 1) / np.maximum(df, 1)).astype(np.float32)
+
+@instrumented()
+def pool_titles(offsets, ids, embeddings, weights=None, unk_id=None, block_titles=POOL_BLOCK_TITLES):
+    """Weighted mean of each title's token embeddings, as a (num_titles, dim) float32 array.
+    
+    weights gives a per-id weight, such as idf_weights() for TF-IDF pooling
+    (repeated tokens count once per occurrence, which is the tf part); None
+    gives a plain mean. unk_id tokens get weight zero, and titles without any
+    weighted tokens pool to zero.
+    
+    Each block of block_titles titles is one sparse (titles x vocab) CSR
+    matrix built straight from the offsets and ids, multiplied by the
+    embedding matrix. That is the reduceat over gathered token vectors
+    without materialising them, and about ten times faster.
+    """
+    import torch
+    
+    num_titles = len(offsets) - 1
+    pooled = np.zeros((num_titles, embeddings.shape[1]), dtype=np.float32)
+    matrix = torch.from_numpy(np.ascontiguousarray(embeddings, dtype=np.float32))
+    
+    increment("titles", num_titles)
+    increment("tokens", int(offsets[-1] - offsets[0]))
+    for start in range(0, num_titles, block_titles):
+        stop = min(start + block_titles, num_titles)
+        block_ids = ids[offsets[start]:offsets[stop]].astype(np.int64)
+        if len(block_ids) == 0:
+            continue
+        
+        token_weights = (np.ones(len(block_ids), dtype=np.float32) if weights is None
+                         else weights[block_ids].astype(np.float32))
+        if unk_id is not None:
+            token_weights[block_ids == unk_id] = 0.0
+        
+        block_offsets = offsets[start:stop + 1] - offsets[start]
+        with warnings.catch_warnings():
+            # torch warns that sparse CSR support is in beta on first use
+            warnings.simplefilter("ignore", UserWarning)
+            rows = torch.sparse_csr_tensor(torch.from_numpy(block_offsets), torch.from_numpy(block_ids),
+                                           torch.from_numpy(token_weights), size=(stop - start, len(matrix)),
+                                           check_invariants=False)
+        sums = (rows @ matrix).numpy()
+        
+        # reduceat needs start indices inside the array and gives the start
+        # element for empty segments, so those totals are zeroed
+        totals = np.add.reduceat(token_weights, np.minimum(block_offsets[:-1], len(block_ids) - 1))
+        totals[np.diff(block_offsets) == 0] = 0.0
+        
+        nonzero = totals > 0
+        pooled[start:stop][nonzero] = sums[nonzero] / totals[nonzero, None]
+    
+    return pooled
+
+def pool_dataset(dataset, embeddings, mode="mean", block_titles=POOL_BLOCK_TITLES):
+    """Mean or TF-IDF pooled title embeddings for a TitleDataset."""
+    if mode not in ("mean", "tfidf"):
+        raise ValueError(f"Unknown pooling mode: {mode}")
+    weights = idf_weights(dataset.offsets, dataset.ids, dataset.unk_id) if mode == "tfidf" else None
+    return pool_titles(dataset.offsets, dataset.ids, embeddings, weights, dataset.unk_id, block_titles)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the CSR title dataset and pool title embeddings")
+    parser.add_argument("--pool", choices=["mean", "tfidf"],
+                        help=f"Also pool the trained embeddings per title into {TITLE_FEATURES_PATH}")
+    args = parser.parse_args()
+    
+    dataset = build_title_dataset()
+    if dataset is not None and args.pool:
+        import torch
+        checkpoint = torch.load(WORD2VEC_CHECKPOINT_PATH, map_location="cpu")
+        features = pool_dataset(dataset, checkpoint["in_embed"].numpy(), mode=args.pool)
+        np.save(TITLE_FEATURES_PATH, features)
+        print(f"{args.pool} title embeddings saved to {TITLE_FEATURES_PATH} {features.shape}")
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# Sharded, memory-mappable title dataset for score regression, split by item id
+
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        VOCAB_BIN_PATH, TITLE_SHARDS_DIR, SHARD_TITLES, VALIDATION_FRACTION, TEST_FRACTION,
+        TITLE_BATCH_SIZE, SHUFFLE_BUFFER_TITLES, CHUNK_SIZE, ensure_directories
+    )
+    from src.vocab import load_vocab
+    from src.token_ids import token_id_dtype
+    from src.sketches import splitmix64
+    from src.title_dataset import time_to_seconds
+    from src.download.hacker_news_io import hacker_news_dataset_path, iter_hacker_news_chunks
+    from src.download.get_hacker_news_titles import clean_titles
+    from src.instrumentation import instrumented, increment
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        VOCAB_BIN_PATH, TITLE_SHARDS_DIR, SHARD_TITLES, VALIDATION_FRACTION, TEST_FRACTION,
+        TITLE_BATCH_SIZE, SHUFFLE_BUFFER_TITLES, CHUNK_SIZE, ensure_directories
+    )
+    from vocab import load_vocab
+    from token_ids import token_id_dtype
+    from sketches import splitmix64
+    from title_dataset import time_to_seconds
+    from download.hacker_news_io import hacker_news_dataset_path, iter_hacker_news_chunks
+    from download.get_hacker_news_titles import clean_titles
+    from instrumentation import instrumented, increment
+
+SHARD_COLUMNS = ['item_id', 'title', 'score', 'time', 'comment_count', 'user_karma']
+SPLITS = ("train", "validation", "test")
+
+# Per-title arrays stored next to the CSR offsets and ids, with their dtypes;
+# missing numbers are NaN, and missing times -1 as in the title dataset
+ROW_ARRAYS = {
+    "item_id": np.int64,
+    "score": np.float32,
+    "time": np.int64,
+    "comment_count": np.float32,
+    "user_karma": np.float32,
+}
+
+INDEX_NAME = "index.json"
+
+def split_of(item_ids, validation_fraction=VALIDATION_FRACTION, test_fraction=TEST_FRACTION):
+    """Split of each item id as an index into SPLITS.
+    
+    Ids are hashed to uniform values in [0, 1), so a story stays in its
+    split however the dump was extracted or extended, and the split needs
+    no state beyond the two fractions.
+    """
+    hashes = splitmix64(np.asarray(item_ids, dtype=np.int64).astype(np.uint64))
+    uniform = (hashes >> np.uint64(11)).astype(np.float64) / 2.0**53
+    return np.where(uniform < validation_fraction, 1,
+                    np.where(uniform < validation_fraction + test_fraction, 2, 0))
+
+def slice_rows(rows, start, stop):
+    """Titles start to stop of a dict of CSR offsets, ids and per-title arrays."""
+    offsets = rows["offsets"]
+    sliced = {name: values[start:stop] for name, values in rows.items() if name not in ("offsets", "ids")}
+    sliced["offsets"] = offsets[start:stop + 1] - offsets[start]
+    sliced["ids"] = rows["ids"][offsets[start]:offsets[stop]]
+    return sliced
+
+def take_rows(rows, index):
+    """The titles at index, in that order, gathered without a Python loop over titles."""
+    offsets = rows["offsets"]
+    lengths = offsets[1:][index] - offsets[:-1][index]
+    new_offsets = np.zeros(len(index) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    # Each gathered id's position in the source is its title's start plus its place in the title
+    source = np.repeat(offsets[:-1][index] - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    taken = {name: values[index] for name, values in rows.items() if name not in ("offsets", "ids")}
+    taken["offsets"] = new_offsets
+    taken["ids"] = rows["ids"][source]
+    return taken
+
+def concatenate_rows(parts):
+    """One dict of rows from several, in order."""
+    lengths = [np.diff(part["offsets"]) for part in parts]
+    offsets = np.zeros(sum(len(part) for part in lengths) + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(lengths), out=offsets[1:])
+    rows = {name: np.concatenate([part[name] for part in parts]) for name in parts[0] if name != "offsets"}
+    rows["offsets"] = offsets
+    return rows
+
+def num_rows(rows):
+    return len(rows["offsets"]) - 1
+
+class ShardWriter:
+    """Collects encoded titles per split and writes each shard_titles of them as one shard.
+    
+    A shard is a directory of .npy files, one per array, so every array can
+    be memory-mapped on its own. At most one shard's worth of titles per
+    split is held in memory.
+    """
+    
+    def __init__(self, directory, shard_titles=SHARD_TITLES):
+        self.directory = directory
+        self.shard_titles = shard_titles
+        self.pending = {split: [] for split in SPLITS}
+        self.pending_titles = {split: 0 for split in SPLITS}
+        self.shards = {split: [] for split in SPLITS}
+    
+    def add(self, split, rows):
+        if not num_rows(rows):
+            return
+        self.pending[split].append(rows)
+        self.pending_titles[split] += num_rows(rows)
+        if self.pending_titles[split] >= self.shard_titles:
+            self._flush(split, final=False)
+    
+    def _flush(self, split, final):
+        rows = concatenate_rows(self.pending[split])
+        start = 0
+        while num_rows(rows) - start >= self.shard_titles or (final and start < num_rows(rows)):
+            stop = min(start + self.shard_titles, num_rows(rows))
+            self._write(split, slice_rows(rows, start, stop))
+            start = stop
+        self.pending[split] = [slice_rows(rows, start, num_rows(rows))] if start < num_rows(rows) else []
+        self.pending_titles[split] = num_rows(rows) - start
+    
+    def _write(self, split, rows):
+        name = os.path.join(split, f"{len(self.shards[split]):05d}")
+        os.makedirs(os.path.join(self.directory, name))
+        for array_name, values in rows.items():
+            np.save(os.path.join(self.directory, name, f"{array_name}.npy"), values)
+        self.shards[split].append({"path": name, "titles": num_rows(rows), "tokens": len(rows["ids"])})
+    
+    def close(self):
+        """Write the last, partial shard of each split and return the shards written per split."""
+        for split in SPLITS:
+            if self.pending[split]:
+                self._flush(split, final=True)
+        return self.shards
+
+@instrumented()
+def build_title_shards(directory=TITLE_SHARDS_DIR, vocab_path=VOCAB_BIN_PATH, dataset_path=None,
+                       shard_titles=SHARD_TITLES, validation_fraction=VALIDATION_FRACTION,
+                       test_fraction=TEST_FRACTION, chunk_size=CHUNK_SIZE):
+    """Encode every non-empty cleaned title of the dump into train, validation and test shards.
+    
+    Titles are cleaned and encoded as for the title dataset, reposts
+    included, and each keeps its score, time, comment count and author
+    karma. Titles stay in dump order within a split; shuffling is left to
+    the reader. The shards are written next to directory and moved into
+    place when complete, with an index.json listing them.
+    """
+    ensure_directories()
+    
+    import pandas as pd
+    
+    dataset_path = dataset_path or hacker_news_dataset_path()
+    if not os.path.exists(dataset_path):
+        print(f"Error: Hacker News dataset not found at {dataset_path}")
+        return
+    
+    vocab = load_vocab(vocab_path)
+    dtype = token_id_dtype(len(vocab))
+    tmp_directory = f"{directory}.tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    writer = ShardWriter(tmp_directory, shard_titles)
+    total_titles = 0
+    
+    for chunk in iter_hacker_news_chunks(columns=SHARD_COLUMNS, path=dataset_path, chunk_size=chunk_size):
+        titles = clean_titles(chunk['title'])
+        chunk = chunk[(titles != "").to_numpy()]
+        tokens = [title.split() for title in titles[titles != ""].tolist()]
+        
+        lengths = np.fromiter((len(title) for title in tokens), dtype=np.int64, count=len(tokens))
+        rows = {
+            "offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            "ids": vocab.encode([token for title in tokens for token in title], dtype=dtype),
+            "item_id": chunk['item_id'].to_numpy(dtype=ROW_ARRAYS["item_id"]),
+            "time": time_to_seconds(chunk['time']),
+        }
+        for name in ("score", "comment_count", "user_karma"):
+            rows[name] = pd.to_numeric(chunk[name], errors='coerce').to_numpy(dtype=ROW_ARRAYS[name])
+        
+        splits = split_of(rows["item_id"], validation_fraction, test_fraction)
+        for split_index, split in enumerate(SPLITS):
+            writer.add(split, take_rows(rows, np.flatnonzero(splits == split_index)))
+        
+        total_titles += len(tokens)
+        increment("titles", len(tokens))
+        increment("tokens", len(rows["ids"]))
+        print(f"Sharded {total_titles:,} titles so far...")
+    
+    shards = writer.close()
+    index = {
+        "vocab_size": len(vocab),
+        "unk_id": vocab.unk_id,
+        "shard_titles": shard_titles,
+        "validation_fraction": validation_fraction,
+        "test_fraction": test_fraction,
+        "splits": shards,
+    }
+    with open(os.path.join(tmp_directory, INDEX_NAME), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(tmp_directory, directory)
+    for split in SPLITS:
+        print(f"{split}: {sum(shard['titles'] for shard in shards[split]):,} titles "
+              f"in {len(shards[split]):,} shards")
+    print(f"Title shards saved to {directory}")
+    return index
+
+def load_index(directory=TITLE_SHARDS_DIR):
+    """The index of a shard directory written by build_title_shards."""
+    with open(os.path.join(directory, INDEX_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_shard(directory, shard):
+    """Every array of one shard, memory-mapped."""
+    return {name: np.load(os.path.join(directory, shard["path"], f"{name}.npy"), mmap_mode='r')
+            for name in ("offsets", "ids", *ROW_ARRAYS)}
+
+def iter_blocks(directory, shards, block_titles):
+    """Read shards in order, as in-memory blocks of up to block_titles titles."""
+    for shard in shards:
+        rows = load_shard(directory, shard)
+        for start in range(0, shard["titles"], block_titles):
+            block = slice_rows(rows, start, min(start + block_titles, shard["titles"]))
+            yield {name: np.array(values) for name, values in block.items()}
+
+def iter_title_batches(directory=TITLE_SHARDS_DIR, split="train", batch_size=TITLE_BATCH_SIZE,
+                       buffer_titles=SHUFFLE_BUFFER_TITLES, shuffle=True, seed=0, epoch=0, part=0, num_parts=1):
+    """Yield batches of one split as dicts of CSR offsets and ids and per-title arrays.
+    
+    The split's shards are shuffled per epoch and dealt out to num_parts
+    readers (DataLoader workers times training processes), this being part
+    number part. Each reads its shards sequentially in blocks of half the
+    buffer into a shuffle buffer of buffer_titles titles: every time the
+    buffer fills, it is permuted and all but half of it emitted, so a title
+    can be held over several rounds and mixes with titles of later shards.
+    Memory stays at about 1.5 * buffer_titles titles. Without shuffle,
+    shards and titles are read in order. Only the last batch may be short.
+    """
+    shards = load_index(directory)["splits"][split]
+    order = np.random.default_rng([seed, epoch]).permutation(len(shards)) if shuffle else np.arange(len(shards))
+    rng = np.random.default_rng([seed, epoch, part])
+    keep = buffer_titles // 2 if shuffle else 0
+    block_titles = max(buffer_titles - keep, batch_size)
+    
+    pool = None
+    for block in iter_blocks(directory, [shards[i] for i in order[part::num_parts]], block_titles):
+        pool = block if pool is None else concatenate_rows([pool, block])
+        if shuffle:
+            if num_rows(pool) < buffer_titles:
+                continue
+            pool = take_rows(pool, rng.permutation(num_rows(pool)))
+        emit = (num_rows(pool) - keep) // batch_size * batch_size
+        for start in range(0, emit, batch_size):
+            yield slice_rows(pool, start, start + batch_size)
+        pool = slice_rows(pool, emit, num_rows(pool))
+    
+    if pool is not None and num_rows(pool):
+        if shuffle:
+            pool = take_rows(pool, rng.permutation(num_rows(pool)))
+        for start in range(0, num_rows(pool), batch_size):
+            yield slice_rows(pool, start, min(start + batch_size, num_rows(pool)))
+
+def verify_title_shards(directory=TITLE_SHARDS_DIR, num_parts=3, buffer_titles=SHUFFLE_BUFFER_TITLES):
+    """Check that shuffled parts read every title of each split once, with its split and token ids."""
+    index = load_index(directory)
+    for split_index, split in enumerate(SPLITS):
+        shards = [load_shard(directory, shard) for shard in index["splits"][split]]
+        expected = {}
+        for rows in shards:
+            for i, item_id in enumerate(rows["item_id"].tolist()):
+                expected[item_id] = rows["ids"][rows["offsets"][i]:rows["offsets"][i + 1]].tolist()
+        
+        seen = {}
+        for part in range(num_parts):
+            for batch in iter_title_batches(directory, split, buffer_titles=buffer_titles, part=part,
+                                            num_parts=num_parts):
+                for i, item_id in enumerate(batch["item_id"].tolist()):
+                    assert item_id not in seen, f"Item {item_id} read twice from the {split} split"
+                    seen[item_id] = batch["ids"][batch["offsets"][i]:batch["offsets"][i + 1]].tolist()
+        
+        assert seen == expected, f"The {split} split was not read back exactly"
+        splits = split_of(list(seen), index["validation_fraction"], index["test_fraction"])
+        assert (splits == split_index).all(), f"Items in the {split} split belong elsewhere"
+        print(f"{split}: {len(seen):,} titles read back once each by {num_parts} shuffled parts")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the title dataset as shuffle-ready shards")
+    parser.add_argument("--shard-titles", type=int, default=SHARD_TITLES, help="Titles per shard")
+    parser.add_argument("--verify", action="store_true",
+                        help="Only check that the existing shards read back completely when shuffled")
+    args = parser.parse_args()
+    
+    if args.verify:
+        verify_title_shards()
+    else:
+        build_title_shards(shard_titles=args.shard_titles)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# Binary token-id corpus written alongside tokens.txt
+
+import os
+import struct
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import TOKEN_IDS_PATH, MAX_VOCAB_SIZE
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import TOKEN_IDS_PATH, MAX_VOCAB_SIZE
+
+# Header: magic, version, id item size, vocab size, UNK id, number of tokens
+HEADER_FORMAT = "<8sIIIIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b"TOKIDS\0\0"
+VERSION = 1
+
+def token_id_dtype(max_vocab_size=MAX_VOCAB_SIZE):
+    """Smallest unsigned dtype holding every vocab id plus the reserved UNK id."""
+    return np.dtype(np.uint16) if max_vocab_size < 2**16 else np.dtype(np.uint32)
+
+def write_id_chunks(id_chunks, path=TOKEN_IDS_PATH, dtype=np.uint32, vocab_size=None, unk_id=None):
+    """Write id arrays as one flat token-id file and return the number of ids written.
+    
+    vocab_size defaults to the largest id plus one, and unk_id to vocab_size.
+    """
+    dtype = np.dtype(dtype)
+    num_tokens = 0
+    max_id = -1
+    
+    with open(path, 'wb') as f:
+        # Reserve space for the header, filled in once the token count is known
+        f.write(b"\0" * HEADER_SIZE)
+        
+        for ids in id_chunks:
+            ids = np.asarray(ids, dtype=dtype)
+            f.write(ids.tobytes())
+            num_tokens += len(ids)
+            if vocab_size is None and len(ids):
+                max_id = max(max_id, int(ids.max()))
+        
+        vocab_size = max_id + 1 if vocab_size is None else vocab_size
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, dtype.itemsize, vocab_size,
+                            vocab_size if unk_id is None else unk_id, num_tokens))
+    
+    return num_tokens
+
+def write_token_ids(token_chunks, vocab, path=TOKEN_IDS_PATH, max_vocab_size=MAX_VOCAB_SIZE):
+    """Encode lists of tokens with the vocabulary and write them as a flat id array.
+    
+    Tokens outside the vocabulary get the reserved UNK id, which is len(vocab).
+    Returns the number of tokens written.
+    """
+    dtype = token_id_dtype(max_vocab_size)
+    token_to_id = {token: entry["id"] for token, entry in vocab.items()}
+    unk_id = len(vocab)
+    
+    id_chunks = (np.fromiter((token_to_id.get(token, unk_id) for token in tokens), dtype=dtype, count=len(tokens))
+                 for tokens in token_chunks)
+    num_tokens = write_id_chunks(id_chunks, path, dtype, len(vocab), unk_id)
+    
+    print(f"Token ids saved to {path} ({num_tokens:,} tokens, {dtype.name})")
+    
+    return num_tokens
+
+def append_token_ids(ids, path=TOKEN_IDS_PATH, vocab_size=None, unk_id=None):
+    """Append an id array to a token-id file in place and update its header.
+    
+    The ids are written before the header's token count, so a file
+    interrupted part way still reads as its old contents. vocab_size and
+    unk_id keep their header values unless given. Returns the new token count.
+    """
+    header = read_token_ids_header(path)
+    dtype = header["dtype"]
+    num_tokens = header["num_tokens"] + len(ids)
+    
+    with open(path, 'r+b') as f:
+        f.seek(HEADER_SIZE + header["num_tokens"] * dtype.itemsize)
+        f.write(np.asarray(ids, dtype=dtype).tobytes())
+        f.truncate()
+        f.flush()
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, dtype.itemsize,
+                            header["vocab_size"] if vocab_size is None else vocab_size,
+                            header["unk_id"] if unk_id is None else unk_id, num_tokens))
+    
+    return num_tokens
+
+def patch_token_ids(positions, ids, path=TOKEN_IDS_PATH):
+    """Overwrite the ids at the given positions of a token-id file in place; returns how many."""
+    header = read_token_ids_header(path)
+    if len(positions) == 0:
+        return 0
+    stored = np.memmap(path, dtype=header["dtype"], mode='r+', offset=HEADER_SIZE, shape=(header["num_tokens"],))
+    stored[positions] = ids
+    stored.flush()
+    del stored
+    return len(positions)
+
+def truncate_token_ids(path, num_tokens, vocab_size=None, unk_id=None):
+    """Cut a token-id file back to its first num_tokens ids, as after an interrupted append."""
+    header = read_token_ids_header(path)
+    with open(path, 'r+b') as f:
+        f.truncate(HEADER_SIZE + num_tokens * header["dtype"].itemsize)
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, header["dtype"].itemsize,
+                            header["vocab_size"] if vocab_size is None else vocab_size,
+                            header["unk_id"] if unk_id is None else unk_id, num_tokens))
+    return num_tokens
+
+def read_token_ids_header(path=TOKEN_IDS_PATH):
+    """Read the header of a token-id file as a dict."""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    
+    if len(header) < HEADER_SIZE:
+        raise ValueError(f"{path} is too short to be a token-id file")
+    
+    magic, version, itemsize, vocab_size, unk_id, num_tokens = struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} token-id file")
+    
+    return {
+        "dtype": np.dtype(np.uint16) if itemsize == 2 else np.dtype(np.uint32),
+        "vocab_size": vocab_size,
+        "unk_id": unk_id,
+        "num_tokens": num_tokens,
+    }
+
+def load_token_ids(path=TOKEN_IDS_PATH):
+    """Open the token ids as a read-only, zero-copy memory-mapped array."""
+    header = read_token_ids_header(path)
+    
+    expected_size = HEADER_SIZE + header["num_tokens"] * header["dtype"].itemsize
+    if os.path.getsize(path) != expected_size:
+        raise ValueError(f"{path} has size {os.path.getsize(path)}, expected {expected_size}")
+    
+    if header["num_tokens"] == 0:
+        return np.zeros(0, dtype=header["dtype"])
+    
+    return np.memmap(path, dtype=header["dtype"], mode='r',
+                     offset=HEADER_SIZE, shape=(header["num_tokens"],))
+
+if __name__ == "__main__":
+    header = read_token_ids_header()
+    ids = load_token_ids()
+    print(f"Token ids at {TOKEN_IDS_PATH}: {header['num_tokens']:,} tokens, "
+          f"dtype {header['dtype'].name}, vocab size {header['vocab_size']:,}, UNK id {header['unk_id']}")
+    print(f"First ids: {ids[:20].tolist()}")
@@ -3,6 +3,7 @@
 
 import os
 import json
+import argparse
 from collections import Counter
 
 # Fix import issue by using relative import path
@@ -10,18 +11,34 @@ try:
     from src.config import (
         DATA_DIR, TEXT8_DATASET_PATH, HACKER_NEWS_TITLES_PATH, 
         COMBINED_DATASET_PATH, TOKENS_PATH, VOCAB_PATH,
-        MAX_VOCAB_SIZE, ensure_directories
+        MAX_VOCAB_SIZE, STREAM_CHUNK_SIZE, VOCAB_WORKERS, VOCAB_CAPACITY,
+        VOCAB_MIN_COUNT, VOCAB_JSON_EXPORT, ensure_directories
+    )
+    from src.token_ids import write_token_ids
+    from src.instrumentation import instrumented, increment
+    from src.vocab import save_vocab_binary
+    from src.sampling import save_sampling_tables
+    from src.counting import (
+        split_with_carry, count_tokens_parallel, merge_counts, report_approximate_counts
     )
 except ModuleNotFoundError:
     # When running as a script directly
     from config import (
         DATA_DIR, TEXT8_DATASET_PATH, HACKER_NEWS_TITLES_PATH, 
         COMBINED_DATASET_PATH, TOKENS_PATH, VOCAB_PATH,
-        MAX_VOCAB_SIZE, ensure_directories
+        MAX_VOCAB_SIZE, STREAM_CHUNK_SIZE, VOCAB_WORKERS, VOCAB_CAPACITY,
+        VOCAB_MIN_COUNT, VOCAB_JSON_EXPORT, ensure_directories
+    )
+    from token_ids import write_token_ids
+    from instrumentation import instrumented, increment
+    from vocab import save_vocab_binary
+    from sampling import save_sampling_tables
+    from counting import (
+        split_with_carry, count_tokens_parallel, merge_counts, report_approximate_counts
     )
 
-def combine_datasets():
-    """Combine text8 and Hacker News titles into a single dataset."""
+def check_inputs():
+    """Check that both input datasets exist."""
     if not os.path.exists(TEXT8_DATASET_PATH):
         print(f"Error: text8 dataset not found at {TEXT8_DATASET_PATH}")
         return False
@@ -30,6 +47,14 @@ def combine_datasets():
         print(f"Error: Hacker News titles not found at {HACKER_NEWS_TITLES_PATH}")
         return False
     
+    return True
+
+@instrumented()
+def combine_datasets():
+    """Combine text8 and Hacker News titles into a single dataset."""
+    if not check_inputs():
+        return False
+    
     print(f"Combining datasets from {TEXT8_DATASET_PATH} and {HACKER_NEWS_TITLES_PATH}")
     
     # Read the text8 dataset
@@ -49,16 +74,19 @@ def combine_datasets():
     
     print(f"Combined dataset saved to {COMBINED_DATASET_PATH}")
     print(f"Total size: {len(combined_data):,} characters")
+    increment("characters", len(combined_data))
     
     return combined_data
 
-def tokenize_and_build_vocab(text):
+@instrumented()
+def tokenize_and_build_vocab(text, min_count=VOCAB_MIN_COUNT, json_export=VOCAB_JSON_EXPORT):
     """Tokenize the text by whitespace and build vocabulary."""
     print("Tokenizing text and building vocabulary...")
     
     # Split by whitespace
     tokens = text.split()
     print(f"Total tokens: {len(tokens):,}")
+    increment("tokens", len(tokens))
     
     # Save all tokens to file
     with open(TOKENS_PATH, 'w', encoding='utf-8') as f:
@@ -68,24 +96,54 @@ def tokenize_and_build_vocab(text):
     
     # Count frequencies
     token_counts = Counter(tokens)
+    
+    vocab = build_vocab(token_counts, min_count, json_export)
+    
+    # Save the corpus as a flat array of token ids
+    write_token_ids([tokens], vocab)
+    
+    return vocab
+
+@instrumented()
+def build_vocab(token_counts, min_count=VOCAB_MIN_COUNT, json_export=VOCAB_JSON_EXPORT):
+    """Build the vocabulary from token counts and save it to file.
+    
+    The binary vocabulary is always written; vocab.json only if json_export is set.
+    """
     print(f"Unique tokens: {len(token_counts):,}")
     
+    # Drop rare tokens, keeping first-occurrence order for tie breaking
+    if min_count > 1:
+        token_counts = Counter({token: count for token, count in token_counts.items() if count >= min_count})
+        print(f"Tokens with at least {min_count:,} occurrences: {len(token_counts):,}")
+    
     # Limit vocabulary size to most frequent tokens
     vocab = {}
     for i, (token, count) in enumerate(token_counts.most_common(MAX_VOCAB_SIZE)):
         vocab[token] = {"id": i, "count": count}
     
     print(f"Final vocabulary size: {len(vocab):,}")
+    increment("unique_tokens", len(token_counts))
+    increment("vocab_size", len(vocab))
     
-    # Save vocabulary to file
-    with open(VOCAB_PATH, 'w', encoding='utf-8') as f:
-        json.dump(vocab, f, indent=2)
+    return save_vocab(vocab, json_export)
+
+def save_vocab(vocab, json_export=VOCAB_JSON_EXPORT):
+    """Save a {token: {"id", "count"}} vocabulary and its sampling tables, and print its statistics."""
+    # Save vocabulary to file, with the sampling tables training draws from
+    save_vocab_binary(vocab)
+    save_sampling_tables([entry["count"] for entry in vocab.values()])
     
-    print(f"Vocabulary saved to {VOCAB_PATH}")
+    if json_export:
+        with open(VOCAB_PATH, 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, indent=2)
+        
+        print(f"Vocabulary saved to {VOCAB_PATH}")
     
     # Print some statistics
     print("\nVocabulary statistics:")
-    counts = [count for token, count in token_counts.most_common(MAX_VOCAB_SIZE)]
+    # Ingestion keeps ids stable, so counts are not necessarily in id order
+    counts = sorted((entry["count"] for entry in vocab.values()), reverse=True)
     if counts:
         print(f"Most common token frequency: {counts[0]:,}")
         print(f"Least common token frequency in vocab: {counts[-1]:,}")
@@ -93,19 +151,128 @@ def tokenize_and_build_vocab(text):
     
     return vocab
 
-def tokeniser():
-    """Main function to combine datasets and tokenize."""
+def iter_token_chunks(paths, chunk_size=STREAM_CHUNK_SIZE, combined_file=None):
+    """Yield lists of whitespace-separated tokens from the files, one read at a time.
+    
+    Each file ends a token, matching the " " separator used by combine_datasets().
+    If combined_file is given, the raw text is also copied into it with that separator.
+    """
+    for file_num, path in enumerate(paths):
+        if combined_file is not None and file_num > 0:
+            combined_file.write(" ")
+        
+        carry = ""
+        with open(path, 'r', encoding='utf-8') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                
+                if combined_file is not None:
+                    combined_file.write(chunk)
+                
+                # A token at the end of the chunk may continue in the next read
+                tokens, carry = split_with_carry(carry, chunk)
+                
+                if tokens:
+                    yield tokens
+        
+        if carry:
+            yield [carry]
+
+@instrumented()
+def tokenize_and_build_vocab_streaming(paths, chunk_size=STREAM_CHUNK_SIZE, combined_path=COMBINED_DATASET_PATH,
+                                       workers=1, capacity=VOCAB_CAPACITY, min_count=VOCAB_MIN_COUNT,
+                                       json_export=VOCAB_JSON_EXPORT):
+    """Tokenize the files and build vocabulary without holding the corpus in memory.
+    
+    Writes the same combined dataset, tokens and vocabulary files as
+    combine_datasets() followed by tokenize_and_build_vocab(). With more than
+    one worker, counting runs on file shards in a process pool. With a
+    capacity, counts are approximate and memory scales with the capacity
+    rather than with the number of unique tokens.
+    """
+    print(f"Streaming tokenization of {', '.join(paths)} in chunks of {chunk_size:,} characters")
+    
+    if workers > 1:
+        token_counts, error_bound = count_tokens_parallel(paths, workers, chunk_size, capacity)
+    else:
+        token_counts, error_bound = Counter(), 0
+    total_tokens = 0
+    
+    with open(combined_path, 'w', encoding='utf-8') as combined_file, \
+            open(TOKENS_PATH, 'w', encoding='utf-8') as tokens_file:
+        for tokens in iter_token_chunks(paths, chunk_size, combined_file):
+            # Tokens are newline separated with no trailing newline
+            if total_tokens:
+                tokens_file.write("\n")
+            tokens_file.write("\n".join(tokens))
+            
+            if workers <= 1 and capacity:
+                error_bound += merge_counts(token_counts, Counter(tokens), capacity)
+            elif workers <= 1:
+                token_counts.update(tokens)
+            total_tokens += len(tokens)
+        
+        total_bytes = combined_file.tell()
+    
+    print(f"Combined dataset saved to {combined_path}")
+    print(f"Total size: {total_bytes:,} bytes")
+    print(f"Total tokens: {total_tokens:,}")
+    print(f"All tokens saved to {TOKENS_PATH}")
+    increment("bytes", total_bytes)
+    increment("tokens", total_tokens)
+    
+    if capacity:
+        report_approximate_counts(token_counts, error_bound, total_tokens, capacity)
+    
+    vocab = build_vocab(token_counts, min_count, json_export)
+    
+    # Ids are only known once counting is done, so encode in a second pass
+    write_token_ids(iter_token_chunks(paths, chunk_size), vocab)
+    
+    return vocab
+
+def tokeniser(streaming=False, workers=VOCAB_WORKERS, capacity=VOCAB_CAPACITY, min_count=VOCAB_MIN_COUNT,
+              json_export=VOCAB_JSON_EXPORT):
+    """Main function to combine datasets and tokenize.
+    
+    Counting with more than one worker or with an approximate capacity reads
+    the input files directly, so it always uses the streaming path.
+    """
     ensure_directories()
     
+    if streaming or workers > 1 or capacity:
+        if not check_inputs():
+            return
+        return tokenize_and_build_vocab_streaming([TEXT8_DATASET_PATH, HACKER_NEWS_TITLES_PATH],
+                                                  workers=workers, capacity=capacity, min_count=min_count,
+                                                  json_export=json_export)
+    
     # Combine datasets
     combined_data = combine_datasets()
     if not combined_data:
         return
     
     # Tokenize and build vocabulary
-    vocab = tokenize_and_build_vocab(combined_data)
+    vocab = tokenize_and_build_vocab(combined_data, min_count, json_export)
     
     return vocab
 
 if __name__ == "__main__":
-    tokeniser() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Combine and tokenize the datasets")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Process the inputs in fixed-size chunks with bounded memory")
+    parser.add_argument("--workers", type=int, default=VOCAB_WORKERS,
+                        help="Number of processes used to count tokens (implies --streaming when > 1)")
+    parser.add_argument("--capacity", type=int, default=VOCAB_CAPACITY,
+                        help="Keep approximate counts for at most this many tokens, 0 for exact (implies --streaming)")
+    parser.add_argument("--min-count", type=int, default=VOCAB_MIN_COUNT,
+                        help="Drop tokens that occur fewer times than this from the vocabulary")
+    parser.add_argument("--no-json", action="store_true",
+                        help="Only write the binary vocabulary, not vocab.json")
+    args = parser.parse_args()
+    
+    tokeniser(streaming=args.streaming, workers=args.workers,
+              capacity=args.capacity, min_count=args.min_count,
+              json_export=VOCAB_JSON_EXPORT and not args.no_json) 
\ No newline at end of file
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# Train word2vec embeddings on CPU with Hogwild updates across processes
+
+import os
+import time
+import argparse
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.multiprocessing as mp
+
+# Fix import issue by using relative import path
+try:
+    from src.config import (
+        TOKEN_IDS_PATH, SAMPLING_TABLES_PATH, WORD2VEC_CHECKPOINT_PATH, WINDOW_SIZE,
+        TRAIN_BATCH_SIZE, EMBEDDING_DIM, NEGATIVES, LEARNING_RATE, EPOCHS, TRAIN_WORKERS,
+        REPORT_INTERVAL, CHECKPOINT_INTERVAL, VOCAB_BIN_PATH, EMBEDDINGS_PATH, ensure_directories
+    )
+    from src.batches import Word2VecDataset
+    from src.embeddings import save_embeddings
+    from src.vocab import load_vocab
+    from src.sampling import load_sampling_tables
+    from src.token_ids import read_token_ids_header
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import (
+        TOKEN_IDS_PATH, SAMPLING_TABLES_PATH, WORD2VEC_CHECKPOINT_PATH, WINDOW_SIZE,
+        TRAIN_BATCH_SIZE, EMBEDDING_DIM, NEGATIVES, LEARNING_RATE, EPOCHS, TRAIN_WORKERS,
+        REPORT_INTERVAL, CHECKPOINT_INTERVAL, VOCAB_BIN_PATH, EMBEDDINGS_PATH, ensure_directories
+    )
+    from batches import Word2VecDataset
+    from embeddings import save_embeddings
+    from vocab import load_vocab
+    from sampling import load_sampling_tables
+    from token_ids import read_token_ids_header
+
+MIN_LEARNING_RATE_FRACTION = 1e-4  # word2vec never lets the rate reach zero
+
+class Word2Vec(nn.Module):
+    """Input and output embeddings trained with negative sampling.
+    
+    Row vocab_size is the unk/padding id; it stays zero in the input
+    embeddings so padded CBOW positions contribute nothing.
+    """
+    
+    def __init__(self, vocab_size, dim=EMBEDDING_DIM):
+        super().__init__()
+        self.vocab_size = vocab_size
+        self.dim = dim
+        self.in_embed = nn.Embedding(vocab_size + 1, dim, sparse=True, padding_idx=vocab_size)
+        self.out_embed = nn.Embedding(vocab_size + 1, dim, sparse=True)
+        with torch.no_grad():
+            # Same initialisation as the word2vec C tool
+            self.in_embed.weight.uniform_(-0.5 / dim, 0.5 / dim)
+            self.in_embed.weight[vocab_size].zero_()
+            self.out_embed.weight.zero_()
+    
+    def forward(self, inputs, targets, negatives):
+        """Summed negative-sampling loss of a batch.
+        
+        inputs is (batch,) center ids for skip-gram or (batch, 2 * window)
+        padded context ids for CBOW, whose vectors are averaged.
+        """
+        if inputs.dim() == 1:
+            hidden = self.in_embed(inputs)
+        else:
+            counts = (inputs != self.vocab_size).sum(dim=1, keepdim=True).clamp(min=1)
+            hidden = self.in_embed(inputs).sum(dim=1) / counts
+        
+        positive = (hidden * self.out_embed(targets)).sum(dim=1)
+        negative = torch.bmm(self.out_embed(negatives), hidden.unsqueeze(2)).squeeze(2)
+        # Summed rather than averaged so each example gets a word2vec-sized step
+        return -(F.logsigmoid(positive).sum() + F.logsigmoid(-negative).sum())
+
+def learning_rate(initial, words_done, total_words):
+    """Linearly decayed learning rate, as in word2vec."""
+    progress = min(words_done / max(total_words, 1), 1.0)
+    return initial * max(1.0 - progress, MIN_LEARNING_RATE_FRACTION)
+
+def save_checkpoint(model, words_done, settings, path=WORD2VEC_CHECKPOINT_PATH):
+    """Atomically save the embeddings and training progress."""
+    tmp_path = f"{path}.tmp"
+    torch.save({
+        "in_embed": model.in_embed.weight.detach().clone(),
+        "out_embed": model.out_embed.weight.detach().clone(),
+        "words_done": words_done,
+        "settings": settings,
+    }, tmp_path)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path=WORD2VEC_CHECKPOINT_PATH):
+    """Load a training checkpoint, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    return torch.load(path, map_location="cpu")
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+def train_worker(rank, model, words_done, loss_total, examples_total, settings, start_words):
+    """Train on this process's slice of every remaining epoch, updating the shared model in place."""
+    torch.set_num_threads(1)
+    torch.manual_seed(settings["seed"] + rank)
+    tables = load_sampling_tables(settings["sampling_path"])
+    negative_prob = torch.from_numpy(tables.alias_prob)
+    negative_alias = torch.from_numpy(tables.alias_index)
+    
+    num_tokens = settings["num_tokens"]
+    total_words = num_tokens * settings["epochs"]
+    optimizer = torch.optim.SGD(model.parameters(), lr=settings["learning_rate"])
+    
+    first_epoch = start_words // num_tokens
+    for epoch in range(first_epoch, settings["epochs"]):
+        dataset = Word2VecDataset(settings["path"], settings["sampling_path"], mode=settings["mode"],
+                                  window=settings["window"], batch_size=settings["batch_size"],
+                                  seed=settings["seed"], rank=rank, world_size=settings["workers"],
+                                  start_fraction=(start_words % num_tokens) / num_tokens if epoch == first_epoch else 0.0)
+        dataset.set_epoch(epoch)
+        
+        reported = 0
+        for inputs, targets in dataset:
+            # Alias-table draws, as in sample_alias but with torch tensors
+            columns = torch.randint(len(negative_prob), (len(targets), settings["negatives"]))
+            keep = torch.rand(columns.shape, dtype=negative_prob.dtype) < negative_prob[columns]
+            negatives = torch.where(keep, columns, negative_alias[columns])
+            
+            for group in optimizer.param_groups:
+                group["lr"] = learning_rate(settings["learning_rate"], words_done.value, total_words)
+            
+            optimizer.zero_grad(set_to_none=True)
+            loss = model(inputs, targets, negatives)
+            loss.backward()
+            optimizer.step()
+            
+            # Hogwild: no locks around the embeddings, only around the counters
+            with words_done.get_lock():
+                words_done.value += dataset.tokens_read - reported
+            reported = dataset.tokens_read
+            with loss_total.get_lock():
+                loss_total.value += loss.item()
+                examples_total.value += len(targets)
+
+def train(mode="skipgram", workers=TRAIN_WORKERS, epochs=EPOCHS, dim=EMBEDDING_DIM, window=WINDOW_SIZE,
+          negatives=NEGATIVES, lr=LEARNING_RATE, batch_size=TRAIN_BATCH_SIZE, resume=True,
+          path=TOKEN_IDS_PATH, sampling_path=SAMPLING_TABLES_PATH, checkpoint_path=WORD2VEC_CHECKPOINT_PATH,
+          report_interval=REPORT_INTERVAL, checkpoint_interval=CHECKPOINT_INTERVAL, seed=0,
+          vocab_path=VOCAB_BIN_PATH, embeddings_path=EMBEDDINGS_PATH):
+    """Train word2vec embeddings with one Hogwild process per core.
+    
+    Every process updates the same shared-memory embedding matrices without
+    locking, on its own slice of the corpus. Progress is measured in corpus
+    tokens, which drive the linear learning-rate decay, the words/sec and ETA
+    reports and the periodic checkpoints. With resume, training continues
+    from the checkpoint's token count, provided the settings match. The
+    final input embeddings are also exported to embeddings_path for serving.
+    """
+    ensure_directories()
+    
+    header = read_token_ids_header(path)
+    settings = {
+        "mode": mode, "workers": workers, "epochs": epochs, "dim": dim, "window": window,
+        "negatives": negatives, "learning_rate": lr, "batch_size": batch_size, "seed": seed,
+        "path": path, "sampling_path": sampling_path, "num_tokens": header["num_tokens"],
+        "vocab_size": header["vocab_size"],
+    }
+    total_words = header["num_tokens"] * epochs
+    if total_words == 0:
+        print(f"No tokens in {path}, nothing to train")
+        return None
+    
+    model = Word2Vec(header["vocab_size"], dim)
+    start_words = 0
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+    if checkpoint is not None:
+        # Only the settings that change the result must match
+        fixed = ("mode", "dim", "window", "negatives", "path", "num_tokens", "vocab_size")
+        changed = [key for key in fixed if checkpoint["settings"].get(key) != settings[key]]
+        if changed:
+            raise ValueError(f"Checkpoint {checkpoint_path} has different settings: {', '.join(changed)}; "
+                             f"delete it or pass --no-resume")
+        with torch.no_grad():
+            model.in_embed.weight.copy_(checkpoint["in_embed"])
+            model.out_embed.weight.copy_(checkpoint["out_embed"])
+        start_words = min(checkpoint["words_done"], total_words)
+        print(f"Resuming from {checkpoint_path} at {start_words:,} of {total_words:,} words")
+    
+    model.share_memory()
+    
+    words_done = mp.Value('q', start_words)
+    loss_total = mp.Value('d', 0.0)
+    examples_total = mp.Value('q', 0)
+    
+    print(f"Training {mode} with {workers} processes: {header['vocab_size']:,} words, {dim} dimensions, "
+          f"{epochs} epochs of {header['num_tokens']:,} tokens")
+    
+    processes = []
+    for rank in range(workers):
+        process = mp.Process(target=train_worker,
+                             args=(rank, model, words_done, loss_total, examples_total, settings, start_words),
+                             daemon=True)
+        process.start()
+        processes.append(process)
+    
+    start = last_report = last_checkpoint = time.time()
+    last_words = start_words
+    while any(process.is_alive() for process in processes):
+        time.sleep(min(report_interval, checkpoint_interval, 1.0))
+        now = time.time()
+        
+        if now - last_report >= report_interval:
+            with loss_total.get_lock():
+                loss, examples = loss_total.value, examples_total.value
+                loss_total.value, examples_total.value = 0.0, 0
+            done = words_done.value
+            words_per_sec = (done - last_words) / (now - last_report)
+            eta = (total_words - done) / words_per_sec if words_per_sec > 0 else float("inf")
+            print(f"{done / total_words * 100:5.1f}% | {words_per_sec:,.0f} words/sec | "
+                  f"loss {loss / max(examples, 1):.4f} | "
+                  f"lr {learning_rate(lr, done, total_words):.5f} | "
+                  f"ETA {_format_duration(eta) if eta != float('inf') else '?'}")
+            last_report, last_words = now, done
+        
+        if now - last_checkpoint >= checkpoint_interval:
+            save_checkpoint(model, words_done.value, settings, checkpoint_path)
+            last_checkpoint = now
+    
+    failed = [process.exitcode for process in processes if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"{len(failed)} training processes failed with exit codes {failed}")
+    
+    # Every token has been read, even if the counter lags behind by subsampled blocks
+    save_checkpoint(model, total_words, settings, checkpoint_path)
+    elapsed = time.time() - start
+    print(f"Trained {total_words - start_words:,} words in {_format_duration(elapsed)} "
+          f"({(total_words - start_words) / max(elapsed, 1e-9):,.0f} words/sec)")
+    print(f"Embeddings saved to {checkpoint_path}")
+    save_embeddings(model.in_embed.weight.detach().numpy(), load_vocab(vocab_path), embeddings_path)
+    
+    return model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train word2vec embeddings on the token-id corpus")
+    parser.add_argument("--mode", choices=["skipgram", "cbow"], default="skipgram")
+    parser.add_argument("--workers", type=int, default=TRAIN_WORKERS, help="Hogwild training processes")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="Embedding dimensions")
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE, help="Maximum context distance")
+    parser.add_argument("--negatives", type=int, default=NEGATIVES, help="Negative samples per example")
+    parser.add_argument("--lr", type=float, default=LEARNING_RATE, help="Initial learning rate")
+    parser.add_argument("--batch-size", type=int, default=TRAIN_BATCH_SIZE)
+    parser.add_argument("--no-resume", action="store_true", help="Start over, ignoring any checkpoint")
+    args = parser.parse_args()
+    
+    train(args.mode, args.workers, args.epochs, args.dim, args.window, args.negatives, args.lr,
+          args.batch_size, resume=not args.no_resume)
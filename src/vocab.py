@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# Compact, memory-mappable vocabulary format
+
+import os
+import mmap
+import json
+import zlib
+import struct
+import hashlib
+import argparse
+import numpy as np
+
+# Fix import issue by using relative import path
+try:
+    from src.config import VOCAB_PATH, VOCAB_BIN_PATH
+except ModuleNotFoundError:
+    # When running as a script directly
+    from config import VOCAB_PATH, VOCAB_BIN_PATH
+
+# Header: magic, version, number of tokens, hash slots, string table bytes
+HEADER_FORMAT = "<8sIIQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b"VOCABBIN"
+VERSION = 1
+EMPTY_SLOT = -1
+
+def _align(position, alignment=8):
+    return (position + alignment - 1) // alignment * alignment
+
+def _slot(token_bytes, mask):
+    # crc32 is stable across processes, unlike the built-in hash()
+    return zlib.crc32(token_bytes) & mask
+
+def _layout(num_tokens, num_slots):
+    """Byte offsets of the offsets, counts, hash index and string table sections."""
+    offsets_start = _align(HEADER_SIZE)
+    counts_start = offsets_start + (num_tokens + 1) * 8
+    index_start = counts_start + num_tokens * 8
+    strings_start = _align(index_start + num_slots * 4)
+    return offsets_start, counts_start, index_start, strings_start
+
+def _num_slots(num_tokens):
+    """Power of two slots with a load factor of at most one half."""
+    return 1 << max(num_tokens * 2 - 1, 1).bit_length()
+
+def _insert(index, encoded, first_id=0):
+    """Add tokens to an open-addressing hash index, numbering them from first_id."""
+    mask = len(index) - 1
+    for token_id, token_bytes in enumerate(encoded, first_id):
+        slot = _slot(token_bytes, mask)
+        while index[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        index[slot] = token_id
+
+def _write_vocab_file(path, offsets, counts, index, string_parts):
+    """Write the header and sections of a binary vocabulary."""
+    num_tokens = len(counts)
+    offsets_start, counts_start, index_start, strings_start = _layout(num_tokens, len(index))
+    with open(path, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, num_tokens, len(index), int(offsets[-1])))
+        for start, array in ((offsets_start, offsets), (counts_start, counts), (index_start, index)):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(array.tobytes())
+        f.write(b"\0" * (strings_start - f.tell()))
+        for part in string_parts:
+            f.write(part)
+
+def save_vocab_binary(vocab, path=VOCAB_BIN_PATH):
+    """Save a {token: {"id", "count"}} vocabulary in the binary format.
+    
+    The file holds a contiguous UTF-8 string table with offsets, a counts
+    array and an open-addressing hash index, all readable in place. It is
+    written next to path and renamed into place, as the previous one may
+    still be memory-mapped.
+    """
+    tokens = sorted(vocab, key=lambda token: vocab[token]["id"])
+    encoded = [token.encode('utf-8') for token in tokens]
+    num_tokens = len(tokens)
+    
+    offsets = np.zeros(num_tokens + 1, dtype=np.uint64)
+    np.cumsum([len(token_bytes) for token_bytes in encoded], out=offsets[1:])
+    counts = np.array([vocab[token]["count"] for token in tokens], dtype=np.uint64)
+    
+    index = np.full(_num_slots(num_tokens), EMPTY_SLOT, dtype=np.int32)
+    _insert(index, encoded)
+    tmp_path = f"{path}.tmp"
+    _write_vocab_file(tmp_path, offsets, counts, index, [b"".join(encoded)])
+    os.replace(tmp_path, path)
+    
+    print(f"Binary vocabulary saved to {path}")
+    
+    return path
+
+def extend_vocab_binary(path, tokens, counts, out_path):
+    """Write a binary vocabulary with tokens added after those of path, under the next ids, and new counts.
+    
+    counts has one entry per token of the result. The string table and
+    offsets are copied as they are, and so is the hash index while it stays
+    at most half full, so only the added tokens are hashed and the cost is
+    one copy of the file rather than a pass over every token in Python.
+    """
+    vocab = Vocab(path)
+    encoded = [token.encode('utf-8') for token in tokens]
+    num_tokens = len(vocab) + len(encoded)
+    if len(counts) != num_tokens:
+        raise ValueError(f"{len(counts):,} counts for {num_tokens:,} tokens")
+    
+    offsets = np.empty(num_tokens + 1, dtype=np.uint64)
+    offsets[:len(vocab) + 1] = vocab.offsets
+    np.cumsum([len(token_bytes) for token_bytes in encoded], out=offsets[len(vocab) + 1:])
+    offsets[len(vocab) + 1:] += vocab.offsets[-1]
+    
+    num_slots = _num_slots(num_tokens)
+    if num_slots == len(vocab._index):
+        index = vocab._index.copy()
+        _insert(index, encoded, len(vocab))
+    else:
+        # The index doubled, so every token is hashed again, which happens once per doubling
+        index = np.full(num_slots, EMPTY_SLOT, dtype=np.int32)
+        _insert(index, (bytes(vocab._token_bytes(token_id)) for token_id in range(len(vocab))))
+        _insert(index, encoded, len(vocab))
+    
+    _write_vocab_file(out_path, offsets, np.asarray(counts, dtype=np.uint64), index,
+                      [vocab._strings, b"".join(encoded)])
+    return out_path
+
+def set_vocab_counts(counts, path=VOCAB_BIN_PATH):
+    """Overwrite the counts of a binary vocabulary in place, leaving its tokens and ids as they are."""
+    with open(path, 'rb') as f:
+        _, _, num_tokens, num_slots, _ = struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+    if len(counts) != num_tokens:
+        raise ValueError(f"{len(counts):,} counts for a vocabulary of {num_tokens:,} tokens")
+    if num_tokens:
+        _, counts_start, _, _ = _layout(num_tokens, num_slots)
+        stored = np.memmap(path, dtype=np.uint64, mode='r+', offset=counts_start, shape=(num_tokens,))
+        stored[:] = counts
+        stored.flush()
+        del stored
+    return path
+
+class Vocab:
+    """Read-only vocabulary backed by a memory-mapped binary vocab file.
+    
+    Ids follow vocab.json, so 0 is the most frequent token after a full
+    build; ingestion keeps ids stable, so later they are only roughly in
+    count order. Tokens outside the vocabulary encode to unk_id, which is
+    len(vocab) as in tokens.bin.
+    """
+    
+    def __init__(self, path=VOCAB_BIN_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, num_tokens, num_slots, string_bytes = struct.unpack_from(HEADER_FORMAT, self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} binary vocabulary")
+        
+        offsets_start, counts_start, index_start, strings_start = _layout(num_tokens, num_slots)
+        self.offsets = np.frombuffer(self._mmap, dtype=np.uint64, count=num_tokens + 1, offset=offsets_start)
+        self.counts = np.frombuffer(self._mmap, dtype=np.uint64, count=num_tokens, offset=counts_start)
+        self._index = np.frombuffer(self._mmap, dtype=np.int32, count=num_slots, offset=index_start)
+        self._strings = memoryview(self._mmap)[strings_start:strings_start + string_bytes]
+        self._mask = num_slots - 1
+        self.unk_id = num_tokens
+    
+    def __len__(self):
+        return self.unk_id
+    
+    def __contains__(self, token):
+        return self.token_to_id(token) != self.unk_id
+    
+    def _token_bytes(self, token_id):
+        return self._strings[int(self.offsets[token_id]):int(self.offsets[token_id + 1])]
+    
+    def token_to_id(self, token):
+        """Look up a token's id, or unk_id if it is not in the vocabulary."""
+        token_bytes = token.encode('utf-8')
+        slot = _slot(token_bytes, self._mask)
+        while True:
+            token_id = int(self._index[slot])
+            if token_id == EMPTY_SLOT:
+                return self.unk_id
+            if self._token_bytes(token_id) == token_bytes:
+                return token_id
+            slot = (slot + 1) & self._mask
+    
+    def id_to_token(self, token_id):
+        """Look up the token for an id."""
+        if not 0 <= token_id < self.unk_id:
+            raise IndexError(f"Token id {token_id} out of range for vocabulary of size {self.unk_id}")
+        return bytes(self._token_bytes(token_id)).decode('utf-8')
+    
+    def encode(self, tokens, dtype=np.uint32):
+        """Encode a list of tokens into an id array, looking up each distinct token once."""
+        ids = {token: self.token_to_id(token) for token in dict.fromkeys(tokens)}
+        return np.fromiter((ids[token] for token in tokens), dtype=dtype, count=len(tokens))
+    
+    def decode(self, ids):
+        """Decode an id array back into tokens, skipping unk_id."""
+        return [self.id_to_token(int(token_id)) for token_id in ids if token_id != self.unk_id]
+    
+    def token_hash(self):
+        """64-bit hash of the tokens in id order, which changes whenever any token's id would.
+        
+        Counts are left out, so files aligned with the ids, such as exported
+        embeddings, stay valid when only counts change.
+        """
+        digest = hashlib.blake2b(self.offsets.tobytes(), digest_size=8)
+        digest.update(self._strings)
+        return int.from_bytes(digest.digest(), 'little')
+    
+    def tokens(self):
+        """All tokens in id order."""
+        return [self.id_to_token(token_id) for token_id in range(self.unk_id)]
+    
+    def to_dict(self):
+        """The vocabulary as a {token: {"id", "count"}} dict, as in vocab.json."""
+        return {token: {"id": token_id, "count": int(count)}
+                for token_id, (token, count) in enumerate(zip(self.tokens(), self.counts))}
+    
+    def export_json(self, path=VOCAB_PATH):
+        """Export the vocabulary in the vocab.json format."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"Vocabulary exported to {path}")
+        return path
+
+def load_vocab(path=VOCAB_BIN_PATH):
+    """Open the binary vocabulary."""
+    return Vocab(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between vocab.json and the binary vocabulary")
+    parser.add_argument("--from-json", action="store_true", help=f"Build {VOCAB_BIN_PATH} from {VOCAB_PATH}")
+    parser.add_argument("--to-json", action="store_true", help=f"Export {VOCAB_BIN_PATH} to {VOCAB_PATH}")
+    args = parser.parse_args()
+    
+    if args.from_json:
+        with open(VOCAB_PATH, 'r', encoding='utf-8') as f:
+            save_vocab_binary(json.load(f))
+    
+    vocab = load_vocab()
+    print(f"Vocabulary at {VOCAB_BIN_PATH}: {len(vocab):,} tokens, {os.path.getsize(VOCAB_BIN_PATH):,} bytes")
+    if len(vocab):
+        print(f"Most common token: {vocab.id_to_token(0)} ({int(vocab.counts[0]):,} occurrences)")
+    
+    if args.to_json:
+        vocab.export_json()